@@ -0,0 +1,566 @@
+"""
+Fake Servers - Local stand-ins for the Anthropic Messages API and the GitHub REST/GraphQL APIs
+Lets benchmarks exercise the real client code paths without network access or credentials
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+FAKE_MODEL = "claude-sonnet-4-benchmark"
+FAKE_OWNER = "bench-user"
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _send_json(self, status: int, payload, headers: Dict = None):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _FakeServer:
+    """Runs a handler class on an ephemeral local port in a daemon thread"""
+
+    def __init__(self, handler_cls):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Anthropic
+# ---------------------------------------------------------------------------
+
+class _AnthropicHandler(_QuietHandler):
+    def do_GET(self):
+        fake = self.server.fake
+        fake.count_request()
+        if urlparse(self.path).path == "/v1/models":
+            model = {"id": FAKE_MODEL, "type": "model", "display_name": "Benchmark Sonnet",
+                     "created_at": "2025-01-01T00:00:00Z"}
+            self._send_json(200, {"data": [model], "has_more": False,
+                                  "first_id": FAKE_MODEL, "last_id": FAKE_MODEL})
+            return
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+    def do_POST(self):
+        fake = self.server.fake
+        fake.count_request()
+        if urlparse(self.path).path != "/v1/messages":
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+        request = self._read_json()
+        messages = request.get("messages", [])
+        prefill = ""
+        if messages and messages[-1]["role"] == "assistant":
+            prefill = messages[-1]["content"]
+            messages = messages[:-1]
+        prompt = "".join(
+            m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])
+            for m in messages
+        )
+
+        failure = fake.take_failure()
+        if failure is not None and failure[0] != "stream":
+            _, status, error_type = failure
+            self._send_json(status, {"type": "error", "error": {"type": error_type, "message": "Injected failure"}},
+                            {"retry-after": 0})
+            return
+        cut_at = failure[1] if failure is not None else None
+        text = fake.respond(prompt, prefill)
+        input_tokens = max(1, len(prompt) // fake.chars_per_token)
+        output_tokens = max(1, len(text) // fake.chars_per_token)
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "msg_benchmark", "type": "message", "role": "assistant", "model": request.get("model"),
+                "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(name: str, data: Dict):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+
+        event("message_start", {"type": "message_start", "message": {
+            "id": "msg_benchmark", "type": "message", "role": "assistant", "model": request.get("model"),
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": 1}}})
+        event("content_block_start", {"type": "content_block_start", "index": 0,
+                                      "content_block": {"type": "text", "text": ""}})
+        if fake.first_token_delay_s:
+            time.sleep(fake.first_token_delay_s)
+
+        # Replay the text at the configured rate, a few tokens per delta like the real API
+        chunk_chars = fake.tokens_per_chunk * fake.chars_per_token
+        delay = fake.tokens_per_chunk / fake.tokens_per_second if fake.tokens_per_second else 0
+        for start in range(0, len(text), chunk_chars):
+            if cut_at is not None and start >= cut_at:
+                # Overloaded mid-generation, as the real API reports it
+                event("error", {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+                self.wfile.flush()
+                return
+            event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": text[start:start + chunk_chars]}})
+            if delay:
+                self.wfile.flush()
+                time.sleep(delay)
+
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta",
+                                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": output_tokens}})
+        event("message_stop", {"type": "message_stop"})
+        self.wfile.flush()
+
+
+class FakeAnthropicServer(_FakeServer):
+    """
+    Streaming Messages API stand-in
+
+    Args:
+        responder: Maps the prompt text to the response text to replay
+        tokens_per_second: Output rate; 0 streams as fast as possible
+        first_token_delay_s: Delay before the first content delta
+    """
+
+    def __init__(self, responder: Callable[[str], str] = None, tokens_per_second: float = 0,
+                 first_token_delay_s: float = 0.0, tokens_per_chunk: int = 4, chars_per_token: int = 4):
+        super().__init__(_AnthropicHandler)
+        self.responder = responder or (lambda prompt: "")
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay_s = first_token_delay_s
+        self.tokens_per_chunk = tokens_per_chunk
+        self.chars_per_token = chars_per_token
+        self._inflight = {}
+        self._failures = []
+        self._failure_lock = threading.Lock()
+
+    def respond(self, prompt: str, prefill: str = "") -> str:
+        """Response text for a prompt; a prefilled request continues the earlier response"""
+        if prefill and prompt in self._inflight:
+            full_text = self._inflight[prompt]
+            return full_text[len(prefill):] if full_text.startswith(prefill) else full_text
+        text = self.responder(prompt)
+        self._inflight[prompt] = text
+        return text
+
+    def fail_next(self, count: int = 1, status: int = 529, error_type: str = "overloaded_error"):
+        """Reject the next `count` requests with an HTTP error"""
+        with self._failure_lock:
+            self._failures.extend([("http", status, error_type)] * count)
+
+    def cut_next_stream(self, after_chars: int):
+        """Send an overloaded error event after `after_chars` characters of the next stream"""
+        with self._failure_lock:
+            self._failures.append(("stream", after_chars))
+
+    def take_failure(self) -> Optional[tuple]:
+        with self._failure_lock:
+            return self._failures.pop(0) if self._failures else None
+
+
+# ---------------------------------------------------------------------------
+# GitHub
+# ---------------------------------------------------------------------------
+
+def _sha(kind: str, payload) -> str:
+    data = payload if isinstance(payload, bytes) else json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(f"{kind} {len(data)}\0".encode("utf-8") + data).hexdigest()
+
+
+class _Repo:
+    """In-memory git object store for one repository"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.blobs = {}     # sha -> bytes
+        self.trees = {}     # sha -> {path: entry} (flat, full paths)
+        self.commits = {}   # sha -> commit dict
+        self.refs = {}      # "heads/main" -> sha
+        self.pulls = []
+        self.created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def add_blob(self, content: bytes) -> str:
+        sha = _sha("blob", content)
+        self.blobs[sha] = content
+        return sha
+
+    def add_tree(self, entries: Dict[str, Dict]) -> str:
+        sha = _sha("tree", sorted((p, e["sha"]) for p, e in entries.items()))
+        self.trees[sha] = entries
+        return sha
+
+    def add_commit(self, message: str, tree_sha: str, parents: list) -> str:
+        date = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        commit = {"message": message, "tree": tree_sha, "parents": parents, "date": date}
+        sha = _sha("commit", {**commit, "n": len(self.commits)})
+        self.commits[sha] = commit
+        return sha
+
+    def history(self, head: str):
+        """Commits reachable from head along first parents, newest first"""
+        while head:
+            yield head, self.commits[head]
+            parents = self.commits[head]["parents"]
+            head = parents[0] if parents else None
+
+
+class _GitHubHandler(_QuietHandler):
+
+    # -- routing ------------------------------------------------------------
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        fake = self.server.fake
+        fake.count_request()
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = parse_qs(parsed.query)
+        body = self._read_json() if method in ("POST", "PATCH") else {}
+        if fake.latency_s:
+            time.sleep(fake.latency_s)
+
+        injected = fake.take_failure()
+        if injected is not None:
+            status, headers = injected
+            self._send_json(status, {"message": "Injected failure"}, headers)
+            return
+
+        try:
+            with fake.lock:
+                status, payload = self._route(method, path, query, body)
+        except KeyError as e:
+            status, payload = 404, {"message": f"Not Found: {e}"}
+        self._send_json(status, payload, fake.rate_limit_headers())
+
+    def _route(self, method: str, path: str, query: Dict, body: Dict):
+        fake = self.server.fake
+        if path == "/graphql" and method == "POST":
+            return 200, fake.graphql(body["query"])
+        if path == "/user" and method == "GET":
+            return 200, fake.user_json()
+        if path == "/user/repos":
+            if method == "GET":
+                return 200, [fake.repo_json(r) for r in fake.repos.values()]
+            return fake.create_repo(body)
+
+        match = re.match(rf"^/repos/{FAKE_OWNER}/([^/]+)(/.*)?$", path)
+        if not match:
+            return 404, {"message": "Not Found"}
+        repo = fake.repos[match.group(1)]
+        rest = match.group(2) or ""
+
+        if rest == "":
+            if method == "DELETE":
+                del fake.repos[repo.name]
+                return 204, None
+            return 200, fake.repo_json(repo)
+        if rest.startswith("/git/ref/") or (rest.startswith("/git/refs/") and method != "POST"):
+            ref = rest.split("/", 3)[3]
+            if method == "PATCH":
+                repo.refs[ref] = body["sha"]
+            return 200, fake.ref_json(repo, ref)
+        if rest == "/git/refs" and method == "POST":
+            ref = body["ref"][len("refs/"):]
+            if ref in repo.refs:
+                return 422, {"message": "Reference already exists"}
+            repo.refs[ref] = body["sha"]
+            return 201, fake.ref_json(repo, ref)
+        if rest == "/git/blobs" and method == "POST":
+            sha = repo.add_blob(body["content"].encode("utf-8"))
+            return 201, {"sha": sha, "url": f"{fake.repo_url(repo)}/git/blobs/{sha}"}
+        if rest == "/git/trees" and method == "POST":
+            return 201, fake.create_tree(repo, body)
+        if rest.startswith("/git/trees/"):
+            tree_ish = rest[len("/git/trees/"):]
+            return 200, fake.tree_json(repo, fake.resolve_tree(repo, tree_ish), recursive="recursive" in query)
+        if rest == "/git/commits" and method == "POST":
+            sha = repo.add_commit(body["message"], body["tree"], body.get("parents", []))
+            return 201, fake.commit_json(repo, sha)
+        if rest.startswith("/git/commits/"):
+            return 200, fake.commit_json(repo, rest[len("/git/commits/"):])
+        if rest == "/commits":
+            head = repo.refs.get("heads/main") or repo.refs.get("heads/master")
+            per_page = int(query.get("per_page", ["30"])[0])
+            return 200, [fake.repo_commit_json(repo, sha) for sha, _ in list(repo.history(head))[:per_page]]
+        if rest.startswith("/compare/"):
+            base, head = rest[len("/compare/"):].split("...", 1)
+            return 200, fake.compare_json(repo, base, head)
+        if rest == "/pulls" and method == "POST":
+            number = len(repo.pulls) + 1
+            repo.pulls.append(body)
+            return 201, {"number": number, "title": body.get("title"), "state": "open",
+                         "url": f"{fake.repo_url(repo)}/pulls/{number}",
+                         "html_url": f"https://github.com/{FAKE_OWNER}/{repo.name}/pull/{number}"}
+        return 404, {"message": "Not Found"}
+
+
+class FakeGitHubServer(_FakeServer):
+    """
+    GitHub REST stand-in covering repos, git blobs/trees/commits/refs, commits, compare
+    and pulls, plus the GraphQL repository/defaultBranchRef/history/tree shape used for
+    change detection
+
+    Args:
+        latency_s: Artificial per-request latency to model network round trips
+        rate_limit: Core rate limit reported through X-RateLimit-* headers
+    """
+
+    def __init__(self, latency_s: float = 0.0, rate_limit: int = 5000):
+        super().__init__(_GitHubHandler)
+        self.latency_s = latency_s
+        self.rate_limit = rate_limit
+        self.repos: Dict[str, _Repo] = {}
+        self.lock = threading.Lock()
+        self._failures = []
+        self._failure_lock = threading.Lock()
+
+    # -- failure injection ----------------------------------------------------
+
+    def fail_next(self, count: int = 1, status: int = 502, headers: Dict = None):
+        """Answer the next `count` requests with an error status"""
+        with self._failure_lock:
+            self._failures.extend([(status, headers or {})] * count)
+
+    def take_failure(self) -> Optional[tuple]:
+        with self._failure_lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def rate_limit_headers(self) -> Dict:
+        remaining = max(0, self.rate_limit - self.request_count)
+        return {
+            "X-RateLimit-Limit": self.rate_limit,
+            "X-RateLimit-Remaining": remaining,
+            "X-RateLimit-Reset": int(time.time()) + 3600,
+            "X-RateLimit-Resource": "core"
+        }
+
+    # -- state helpers ----------------------------------------------------------
+
+    def repo_url(self, repo: _Repo) -> str:
+        return f"{self.base_url}/repos/{FAKE_OWNER}/{repo.name}"
+
+    def user_json(self) -> Dict:
+        return {"login": FAKE_OWNER, "id": 1, "type": "User", "url": f"{self.base_url}/users/{FAKE_OWNER}"}
+
+    def repo_json(self, repo: _Repo) -> Dict:
+        return {
+            "id": abs(hash(repo.name)) % 10 ** 8, "name": repo.name,
+            "full_name": f"{FAKE_OWNER}/{repo.name}", "owner": self.user_json(),
+            "private": True, "description": repo.description, "default_branch": "main",
+            "url": self.repo_url(repo), "html_url": f"https://github.com/{FAKE_OWNER}/{repo.name}",
+            "created_at": repo.created_at
+        }
+
+    def create_repo(self, body: Dict):
+        name = body["name"]
+        if name in self.repos:
+            return 422, {"message": "Repository creation failed.",
+                         "errors": [{"resource": "Repository", "field": "name",
+                                     "message": "name already exists on this account"}]}
+        repo = _Repo(name, body.get("description", ""))
+        if body.get("auto_init"):
+            readme = f"# {name}\n\n{repo.description}\n".encode("utf-8")
+            blob = repo.add_blob(readme)
+            tree = repo.add_tree({"README.md": {"mode": "100644", "type": "blob", "sha": blob, "size": len(readme)}})
+            repo.refs["heads/main"] = repo.add_commit("Initial commit", tree, [])
+        self.repos[name] = repo
+        return 201, self.repo_json(repo)
+
+    def ref_json(self, repo: _Repo, ref: str) -> Dict:
+        sha = repo.refs[ref]
+        return {"ref": f"refs/{ref}", "url": f"{self.repo_url(repo)}/git/refs/{ref}",
+                "object": {"sha": sha, "type": "commit", "url": f"{self.repo_url(repo)}/git/commits/{sha}"}}
+
+    def resolve_tree(self, repo: _Repo, tree_ish: str) -> str:
+        if tree_ish in repo.trees:
+            return tree_ish
+        commit_sha = repo.refs.get(f"heads/{tree_ish}", tree_ish)
+        return repo.commits[commit_sha]["tree"]
+
+    def create_tree(self, repo: _Repo, body: Dict) -> Dict:
+        entries = dict(repo.trees[body["base_tree"]]) if body.get("base_tree") else {}
+        for item in body["tree"]:
+            if item.get("sha") is None and "content" not in item:
+                entries.pop(item["path"], None)
+                continue
+            if "content" in item:
+                content = item["content"].encode("utf-8")
+                sha = repo.add_blob(content)
+            else:
+                sha = item["sha"]
+                content = repo.blobs.get(sha, b"")
+            entries[item["path"]] = {"mode": item["mode"], "type": item["type"], "sha": sha, "size": len(content)}
+        return self.tree_json(repo, repo.add_tree(entries), recursive=False)
+
+    def tree_json(self, repo: _Repo, sha: str, recursive: bool) -> Dict:
+        entries = repo.trees[sha]
+        items = []
+        if recursive:
+            folders = set()
+            for path in entries:
+                parts = path.split("/")[:-1]
+                folders.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+            items.extend({"path": f, "mode": "040000", "type": "tree", "sha": _sha("tree", f)} for f in sorted(folders))
+            paths = entries
+        else:
+            paths = {p: e for p, e in entries.items() if "/" not in p}
+        for path, entry in paths.items():
+            items.append({"path": path, "mode": entry["mode"], "type": entry["type"], "sha": entry["sha"],
+                          "size": entry["size"], "url": f"{self.repo_url(repo)}/git/blobs/{entry['sha']}"})
+        return {"sha": sha, "url": f"{self.repo_url(repo)}/git/trees/{sha}", "tree": items, "truncated": False}
+
+    def commit_json(self, repo: _Repo, sha: str) -> Dict:
+        commit = repo.commits[sha]
+        person = {"name": FAKE_OWNER, "email": f"{FAKE_OWNER}@example.com", "date": commit["date"]}
+        return {
+            "sha": sha, "url": f"{self.repo_url(repo)}/git/commits/{sha}", "message": commit["message"],
+            "author": person, "committer": person,
+            "tree": {"sha": commit["tree"], "url": f"{self.repo_url(repo)}/git/trees/{commit['tree']}"},
+            "parents": [{"sha": p, "url": f"{self.repo_url(repo)}/git/commits/{p}"} for p in commit["parents"]]
+        }
+
+    def repo_commit_json(self, repo: _Repo, sha: str) -> Dict:
+        git_commit = self.commit_json(repo, sha)
+        return {"sha": sha, "url": f"{self.repo_url(repo)}/commits/{sha}",
+                "html_url": f"https://github.com/{FAKE_OWNER}/{repo.name}/commit/{sha}",
+                "commit": git_commit, "parents": git_commit["parents"]}
+
+    def compare_json(self, repo: _Repo, base: str, head: str) -> Dict:
+        head = repo.refs.get(f"heads/{head}", head)
+        ahead = []
+        for sha, _ in repo.history(head):
+            if sha == base:
+                break
+            ahead.append(sha)
+        else:
+            if base not in repo.commits:
+                raise KeyError(base)
+        return {"status": "ahead" if ahead else "identical", "ahead_by": len(ahead), "behind_by": 0,
+                "total_commits": len(ahead), "commits": [self.repo_commit_json(repo, sha) for sha in reversed(ahead)],
+                "url": f"{self.repo_url(repo)}/compare/{base}...{head}"}
+
+    # -- GraphQL ------------------------------------------------------------------
+
+    def _graphql_entries(self, repo: _Repo, entries: Dict[str, Dict], prefix: str, depth: int) -> list:
+        """Nested TreeEntry list for the folder at prefix, expanded depth levels"""
+        children, folders = [], {}
+        for path, entry in entries.items():
+            if not path.startswith(prefix):
+                continue
+            name, _, rest = path[len(prefix):].partition("/")
+            if rest:
+                folders.setdefault(name, {})[rest] = entry
+            else:
+                children.append({"path": prefix + name, "type": "blob", "oid": entry["sha"], "size": entry["size"]})
+        for name, sub_entries in folders.items():
+            node = {"path": prefix + name, "type": "tree", "oid": repo.add_tree(sub_entries), "size": 0}
+            if depth > 1:
+                node["object"] = {"entries": self._graphql_entries(repo, entries, f"{prefix}{name}/", depth - 1)}
+            children.append(node)
+        return children
+
+    def graphql(self, query: str) -> Dict:
+        """Answer the aliased repository queries built by tools.remote_state"""
+        data, errors = {}, []
+        history_size = int(re.search(r"history\(first: (\d+)\)", query).group(1))
+        blocks = re.split(r"(?=\br\d+: repository\()", query)
+        for block in blocks:
+            match = re.match(r'r(\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\)', block)
+            if not match:
+                continue
+            alias, name = f"r{match.group(1)}", match.group(3)
+            repo = self.repos.get(name)
+            if repo is None or match.group(2) != FAKE_OWNER:
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias],
+                               "message": f"Could not resolve to a Repository with the name '{name}'."})
+                continue
+            head = repo.refs.get("heads/main")
+            if head is None:
+                data[alias] = {"defaultBranchRef": None}
+                continue
+            commit = repo.commits[head]
+            tree = {"oid": commit["tree"]}
+            # Each "entries {" opens one more level of the nested tree selection
+            depth = block.count("entries {")
+            if depth:
+                tree["entries"] = self._graphql_entries(repo, repo.trees[commit["tree"]], "", depth)
+            nodes = []
+            for sha, item in list(repo.history(head))[:history_size]:
+                nodes.append({"oid": sha, "message": item["message"], "committedDate": item["date"],
+                              "url": f"https://github.com/{FAKE_OWNER}/{repo.name}/commit/{sha}",
+                              "author": {"name": FAKE_OWNER, "date": item["date"]}})
+            data[alias] = {"defaultBranchRef": {"name": "main", "target": {
+                "oid": head, "tree": tree, "history": {"nodes": nodes}}}}
+        payload = {"data": data}
+        if errors:
+            payload["errors"] = errors
+        return payload
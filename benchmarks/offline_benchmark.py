@@ -0,0 +1,341 @@
+"""
+Offline Benchmark - Times generate/commit/update/detect and the project database at scale
+Runs against local fake Anthropic and GitHub servers, so no credentials or network are needed
+Usage: python -m benchmarks.offline_benchmark [--scales 10,1000,10000] [--runs N] [--push-backend api|git]
+       [--output results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks.fake_servers import FakeAnthropicServer, FakeGitHubServer
+
+SCENARIOS = ("generate_scaffold", "commit_project", "update_project", "detect_changes", "project_db")
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "median_s": round(statistics.median(samples), 4),
+        "min_s": round(min(samples), 4),
+        "max_s": round(max(samples), 4),
+        "runs": len(samples)
+    }
+
+
+# ---------------------------------------------------------------------------
+# Synthetic model responses (used when no recording is given)
+# ---------------------------------------------------------------------------
+
+def _file_path(index: int) -> str:
+    # Spread files over nested folders the way real scaffolds are laid out
+    return f"src/module_{index // 100:03d}/part_{index // 10 % 10}/file_{index:05d}.py"
+
+
+def _file_content(index: int, revision: int = 0) -> str:
+    return (
+        f'"""Generated module {index} (revision {revision})"""\n\n'
+        f"def handler_{index}(value):\n"
+        f"    return value * {index + revision}\n"
+    )
+
+
+def synthetic_scaffold(project_name: str, file_count: int) -> str:
+    files = {_file_path(i): _file_content(i) for i in range(file_count)}
+    folders = sorted({os.path.dirname(p) for p in files})
+    return json.dumps({
+        "project_name": project_name,
+        "description": f"Benchmark project with {file_count} files",
+        "structure": {"folders": folders, "files": files}
+    })
+
+
+def synthetic_update(file_count: int, change_count: int) -> str:
+    changes = [{"path": _file_path(i), "action": "modify", "content": _file_content(i, revision=1)}
+               for i in range(min(change_count, file_count))]
+    changes.append({"path": "docs/CHANGES.md", "action": "add", "content": "# Changes\n"})
+    return json.dumps({"changes": changes, "summary": f"Benchmark update of {len(changes)} files"})
+
+
+class ScriptedResponder:
+    """Returns the queued response for each Messages API call"""
+
+    def __init__(self):
+        self.queue = []
+
+    def push(self, text: str):
+        self.queue.append(text)
+
+    def __call__(self, prompt: str) -> str:
+        return self.queue.pop(0) if self.queue else "{}"
+
+
+# ---------------------------------------------------------------------------
+# Harness
+# ---------------------------------------------------------------------------
+
+class OfflineBench:
+    """Wires the real tools to the fake servers inside a throwaway HOME"""
+
+    def __init__(self, home: str, anthropic: FakeAnthropicServer, github: FakeGitHubServer,
+                 responder: ScriptedResponder, recording: str = None, git_remotes: str = None):
+        self.home = home
+        self.git_remotes = git_remotes
+        self.anthropic = anthropic
+        self.github = github
+        self.responder = responder
+        self.recording = recording
+        self.scaffold_dir = os.path.join(home, "projects")
+        os.makedirs(self.scaffold_dir, exist_ok=True)
+
+        from tools.scaffold_generator import ProjectScaffold
+        import tools.scaffold_generator as scaffold_module
+
+        # Keep generated projects and the prompt inside the benchmark HOME
+        prompt_file = os.path.join(home, "scaffoldPrompt.md")
+        with open(prompt_file, "w", encoding="utf-8") as f:
+            f.write("Return the project scaffold as JSON.")
+        scaffold_module.SCAFFOLD_DIRECTORY = self.scaffold_dir
+        scaffold_module.SCAFFOLD_PROMPT_FILE = prompt_file
+
+        self.scaffold = ProjectScaffold()
+        self.source_control = self.scaffold.source_control
+
+    def _counts(self) -> tuple:
+        return self.anthropic.request_count, self.github.request_count
+
+    def _timed(self, fn) -> dict:
+        anthropic_before, github_before = self._counts()
+        start = time.perf_counter()
+        # The tools print progress per file; keep it out of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn()
+        elapsed = time.perf_counter() - start
+        anthropic_after, github_after = self._counts()
+        return {
+            "seconds": elapsed,
+            "anthropic_requests": anthropic_after - anthropic_before,
+            "github_requests": github_after - github_before,
+            "result": result
+        }
+
+    def _bare_remote(self, name: str):
+        """With the git push backend, create the file:// remote the project will push to"""
+        if self.git_remotes:
+            subprocess.run(["git", "init", "--quiet", "--bare", os.path.join(self.git_remotes, f"{name}.git")],
+                           check=True)
+
+    def _write_project(self, name: str, file_count: int) -> str:
+        root = os.path.join(self.scaffold_dir, name)
+        for i in range(file_count):
+            path = os.path.join(root, _file_path(i))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(_file_content(i))
+        return root
+
+    def _committed_project(self, file_count: int) -> str:
+        name = f"bench-{file_count}-{uuid.uuid4().hex[:8]}"
+        self._bare_remote(name)
+        root = self._write_project(name, file_count)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = self.source_control.commit_project(root, name, "benchmark project")
+        if result["status"] != "success":
+            raise RuntimeError(f"Setup commit failed: {result['message']}")
+        return name
+
+    # -- scenarios -------------------------------------------------------------
+
+    def generate_scaffold(self, file_count: int) -> dict:
+        name = f"gen-{file_count}-{uuid.uuid4().hex[:8]}"
+        self._bare_remote(name)
+        if self.recording:
+            with open(self.recording, "r", encoding="utf-8") as f:
+                recorded = json.load(f)
+            recorded["project_name"] = name
+            self.responder.push(json.dumps(recorded))
+        else:
+            self.responder.push(synthetic_scaffold(name, file_count))
+        return self._timed(lambda: self.scaffold.generate_scaffold(f"benchmark project {name}"))
+
+    def commit_project(self, file_count: int) -> dict:
+        name = f"commit-{file_count}-{uuid.uuid4().hex[:8]}"
+        self._bare_remote(name)
+        root = self._write_project(name, file_count)
+        return self._timed(lambda: self.source_control.commit_project(root, name, "benchmark project"))
+
+    def update_project(self, file_count: int) -> dict:
+        name = self._committed_project(file_count)
+        root = os.path.join(self.scaffold_dir, name)
+        self.responder.push(synthetic_update(file_count, max(1, file_count // 10)))
+        return self._timed(lambda: self.source_control.update_project(root, name, "benchmark update"))
+
+    def detect_changes(self, file_count: int) -> dict:
+        name = self._committed_project(file_count)
+        root = os.path.join(self.scaffold_dir, name)
+        # Touch a handful of files so the comparison has something to report
+        for i in random.sample(range(file_count), min(5, file_count)):
+            with open(os.path.join(root, _file_path(i)), "a", encoding="utf-8") as f:
+                f.write("# edited\n")
+        return self._timed(lambda: self.source_control.change_detector.detect_changes(name))
+
+    def project_db(self, project_count: int) -> dict:
+        from tools.project_db import ProjectDatabase
+
+        db_path = os.path.join(self.home, f"projects_db_{project_count}_{uuid.uuid4().hex[:8]}.json")
+        # Seed directly; inserting one at a time would dominate the measurement
+        now = datetime.now().isoformat()
+        projects = [{
+            "uuid": str(uuid.uuid4()), "name": f"project-{i}", "repo_name": f"project-{i}",
+            "local_path": f"/tmp/project-{i}", "description": f"Seeded project {i}",
+            "repo_url": f"https://github.com/bench-user/project-{i}",
+            "created_at": now, "updated_at": now, "status": "active",
+            "metadata": {"commit_sha": uuid.uuid4().hex, "files_count": 10}
+        } for i in range(project_count)]
+        with open(db_path, "w", encoding="utf-8") as f:
+            json.dump({"projects": projects, "version": "1.0"}, f)
+
+        db = ProjectDatabase(db_path)
+        lookups = [f"project-{random.randrange(project_count)}" for _ in range(100)]
+
+        def workload():
+            timings = {}
+            start = time.perf_counter()
+            for repo_name in lookups:
+                db.get_project_by_repo(repo_name)
+            timings["get_project_by_repo_x100_s"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            db.list_active_projects()
+            timings["list_active_projects_s"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            db.search_projects("project-1")
+            timings["search_projects_s"] = time.perf_counter() - start
+
+            # The first search builds the index; later ones only look it up
+            start = time.perf_counter()
+            for repo_name in lookups:
+                db.search_projects(f"seeded {repo_name}", limit=10)
+            timings["search_projects_indexed_x100_s"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(10):
+                db.add_project(f"new-{i}", f"new-{i}", f"/tmp/new-{i}")
+            timings["add_project_x10_s"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for repo_name in lookups[:10]:
+                project = db.get_project_by_repo(repo_name)
+                db.update_project(project["uuid"], {"description": "updated"})
+            timings["update_project_x10_s"] = time.perf_counter() - start
+            return timings
+
+        return self._timed(workload)
+
+
+def run(scales: list, scenarios: list, runs: int, tokens_per_second: float,
+        github_latency_s: float, recording: str = None, push_backend: str = "api") -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        os.environ.setdefault("LOG_FOLDER", os.path.join(home, "logs"))
+        os.environ["DARTINBOT_TRACE_FILE"] = "off"
+        os.environ["GITHUB_ACCESS_TOKEN"] = "benchmark-token"
+        os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+        os.environ["DARTINBOT_PUSH_BACKEND"] = push_backend
+        git_remotes = None
+        if push_backend == "git":
+            # Pushes go to local bare repositories; the fake GitHub server still serves the API calls
+            git_remotes = os.path.join(home, "remotes")
+            os.makedirs(git_remotes)
+            os.environ["DARTINBOT_GIT_REMOTE_URL"] = f"file://{git_remotes}/{{repo}}.git"
+
+        responder = ScriptedResponder()
+        with FakeAnthropicServer(responder, tokens_per_second=tokens_per_second) as anthropic, \
+                FakeGitHubServer(latency_s=github_latency_s) as github:
+            os.environ["ANTHROPIC_BASE_URL"] = anthropic.base_url
+            os.environ["GITHUB_API_URL"] = github.base_url
+
+            import lib.claude_details as claude_details
+            if not claude_details.ANTHROPIC_API_KEY:
+                claude_details.ANTHROPIC_API_KEY = os.environ["ANTHROPIC_API_KEY"]
+
+            bench = OfflineBench(home, anthropic, github, responder, recording, git_remotes)
+            for scenario in scenarios:
+                results[scenario] = {}
+                for scale in scales:
+                    samples = [getattr(bench, scenario)(scale) for _ in range(runs)]
+                    entry = summarize([s["seconds"] for s in samples])
+                    entry["anthropic_requests"] = samples[-1]["anthropic_requests"]
+                    entry["github_requests"] = samples[-1]["github_requests"]
+                    if isinstance(samples[-1]["result"], dict) and "status" in samples[-1]["result"]:
+                        entry["status"] = samples[-1]["result"]["status"]
+                    if scenario == "project_db":
+                        entry["operations"] = {
+                            k: round(statistics.median(s["result"][k] for s in samples), 5)
+                            for k in samples[-1]["result"]
+                        }
+                    results[scenario][str(scale)] = entry
+                    print(f"{scenario} @ {scale}: {entry['median_s']}s", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against fake Anthropic and GitHub servers")
+    parser.add_argument("--scales", default="10,1000,10000",
+                        help="comma separated file (or project) counts")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--runs", type=int, default=3, help="repetitions per scenario and scale")
+    parser.add_argument("--tokens-per-second", type=float, default=0,
+                        help="fake model output rate; 0 streams as fast as possible")
+    parser.add_argument("--github-latency", type=float, default=0.0,
+                        help="artificial seconds of latency per GitHub request")
+    parser.add_argument("--push-backend", choices=("api", "git"), default="api",
+                        help="commit through the Git Database API or push to local bare repos over git")
+    parser.add_argument("--recording", help="recorded scaffold JSON to replay instead of synthetic output")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for lookups and edits")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scales = [int(s) for s in args.scales.split(",") if s]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {
+        "benchmark": "offline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {
+            "runs": args.runs,
+            "tokens_per_second": args.tokens_per_second,
+            "github_latency_s": args.github_latency,
+            "recording": args.recording,
+            "push_backend": args.push_backend,
+            "seed": args.seed
+        },
+        "scenarios": run(scales, scenarios, args.runs, args.tokens_per_second,
+                         args.github_latency, args.recording, args.push_backend)
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
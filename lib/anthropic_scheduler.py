@@ -0,0 +1,359 @@
+"""
+Anthropic Scheduler - Central dispatch for Claude generations
+Priority-ordered concurrency slots, a tokens-per-minute budget, and overload retries that honour retry-after
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+import anthropic
+
+from lib.metrics import get_registry
+from lib.tracing import current_span
+
+# Lower value is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("dartinbot_anthropic_priority", default=INTERACTIVE)
+
+# Error types the API sends on overload, both as HTTP errors and as mid-stream error events
+RETRYABLE_ERROR_TYPES = {"overloaded_error", "rate_limit_error", "api_error"}
+
+ANTHROPIC_RETRIES = get_registry().counter(
+    "dartinbot_anthropic_retries_total", "Anthropic request retries, by reason")
+ANTHROPIC_QUEUE_SECONDS = get_registry().counter(
+    "dartinbot_anthropic_queue_seconds_total", "Seconds Anthropic requests waited for a slot or token budget, by priority")
+
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """Run Anthropic requests made in this context at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PrioritySlots:
+    """Counting semaphore that hands free slots to the highest priority waiter first"""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._in_use = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def enter(self, priority: int, admit: Callable[[], Tuple[Any, float]] = None) -> Any:
+        """
+        Wait for a slot, highest priority first
+
+        Args:
+            priority: Lower is served first
+            admit: Further condition checked once this waiter is first in line
+                with a slot free; returns (value, 0) to proceed or (None, seconds)
+                to wait. The waiter stays first in line meanwhile, so nothing of
+                lower priority overtakes it, while a higher priority arrival does.
+
+        Returns:
+            admit's value (None without admit)
+        """
+        entry = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, entry)
+            while True:
+                if self._waiters[0] == entry and self._in_use < self.slots:
+                    if admit is None:
+                        value = None
+                        break
+                    value, wait = admit()
+                    if value is not None:
+                        break
+                    self._condition.wait(timeout=wait)
+                else:
+                    self._condition.wait()
+            heapq.heappop(self._waiters)
+            self._in_use += 1
+            # The next waiter may also fit
+            self._condition.notify_all()
+        return value
+
+    def leave(self):
+        """Give a slot back"""
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify_all()
+
+    def wake(self):
+        """Let waiters re-check their admit condition (e.g. budget was freed)"""
+        with self._condition:
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def acquire(self, priority: int, admit: Callable[[], Tuple[Any, float]] = None):
+        value = self.enter(priority, admit)
+        try:
+            yield value
+        finally:
+            self.leave()
+
+
+class Reservation:
+    """Tokens held against the per-minute budget for one request attempt"""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.timestamp = time.monotonic()
+
+    def record_usage(self, tokens: int):
+        """Replace the estimate with what the API reported"""
+        self.tokens = tokens
+
+
+class TokenBudget:
+    """Sliding one-minute window of tokens used; tokens_per_minute <= 0 disables it"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._ledger = deque()
+        self._lock = threading.Lock()
+
+    def _used(self, now: float) -> int:
+        while self._ledger and now - self._ledger[0].timestamp >= 60:
+            self._ledger.popleft()
+        return sum(r.tokens for r in self._ledger)
+
+    def try_reserve(self, tokens: int) -> Tuple[Optional[Reservation], float]:
+        """
+        Hold tokens if the window has room
+
+        Returns:
+            (reservation, 0), or (None, seconds until the oldest entry leaves the window)
+        """
+        reservation = Reservation(tokens)
+        if self.tokens_per_minute <= 0:
+            return reservation, 0.0
+        with self._lock:
+            now = time.monotonic()
+            # A single request larger than the budget still runs, just alone
+            if not self._ledger or self._used(now) + tokens <= self.tokens_per_minute:
+                reservation.timestamp = now
+                self._ledger.append(reservation)
+                return reservation, 0.0
+            return None, max(0.05, 60 - (now - self._ledger[0].timestamp))
+
+
+class AnthropicScheduler:
+    """
+    Coordinates every Claude request in the process: tool generations
+    (run) and chat completions (run_async, stream_async)
+
+    Args:
+        max_concurrency: Generations in flight at once
+        tokens_per_minute: Input+output token budget per minute (0 disables)
+        max_retries: Retries after the first attempt
+        base_delay: First backoff step in seconds
+        max_delay: Backoff ceiling in seconds
+    """
+
+    def __init__(self, max_concurrency: int = None, tokens_per_minute: int = None, max_retries: int = None,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_concurrency = max_concurrency or int(os.getenv("DARTINBOT_ANTHROPIC_CONCURRENCY", "2"))
+        if tokens_per_minute is None:
+            tokens_per_minute = int(os.getenv("DARTINBOT_ANTHROPIC_TPM", "0"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("DARTINBOT_ANTHROPIC_MAX_RETRIES", "5"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.slots = PrioritySlots(self.max_concurrency)
+        self.budget = TokenBudget(tokens_per_minute)
+
+    def classify(self, error: Exception) -> Optional[tuple]:
+        """
+        Decide whether an error is worth retrying
+
+        Returns:
+            (reason, retry-after seconds or 0) or None to give up
+        """
+        # Semantic Kernel wraps SDK errors in its own exception types
+        if not isinstance(error, anthropic.AnthropicError) and isinstance(error.__cause__, anthropic.AnthropicError):
+            error = error.__cause__
+        if isinstance(error, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+            return ("connection", 0.0)
+        if not isinstance(error, anthropic.APIStatusError):
+            return None
+
+        retry_after = 0.0
+        response = getattr(error, "response", None)
+        if response is not None and response.status_code != 200:
+            try:
+                retry_after = float(response.headers.get("retry-after") or 0)
+            except ValueError:
+                retry_after = 0.0
+
+        body = error.body if isinstance(error.body, dict) else {}
+        error_type = (body.get("error") or {}).get("type")
+        if error.status_code == 429:
+            return ("rate_limit", retry_after)
+        if error.status_code == 529 or error_type == "overloaded_error":
+            return ("overloaded", retry_after)
+        if error.status_code >= 500 or error_type in RETRYABLE_ERROR_TYPES:
+            return ("server_error", retry_after)
+        return None
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def run(self, attempt_fn: Callable[[Reservation], Any], estimated_tokens: int) -> Any:
+        """
+        Run a generation under the slot, budget and retry policy
+
+        Args:
+            attempt_fn: Makes one request; receives the reservation so it can
+                record actual usage. It is called again on retryable errors and
+                may resume from whatever it already received.
+            estimated_tokens: Tokens to hold against the budget until usage is known
+
+        Returns:
+            Whatever attempt_fn returns; the last error is raised when retries run out
+        """
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            # Budget is waited for in priority order too, so background work cannot starve chat
+            with self.slots.acquire(priority, lambda: self.budget.try_reserve(estimated_tokens)) as reservation:
+                waited = time.perf_counter() - queued_at
+                if waited > 0.001:
+                    ANTHROPIC_QUEUE_SECONDS.inc(waited, priority="background" if priority else "interactive")
+                try:
+                    return attempt_fn(reservation)
+                except Exception as e:
+                    verdict = self.classify(e)
+                    if verdict is None or attempt >= self.max_retries:
+                        raise
+                    reason, retry_after = verdict
+                finally:
+                    # The reservation now holds actual usage; waiters may fit
+                    self.slots.wake()
+
+            time.sleep(self._retry_delay(attempt, reason, retry_after))
+            attempt += 1
+
+    async def run_async(self, attempt_fn: Callable[[Reservation], Awaitable[Any]], estimated_tokens: int,
+                        priority: int = None) -> Any:
+        """
+        run() for coroutines: waits for a slot and budget without blocking the event loop
+
+        Args:
+            attempt_fn: Coroutine function making one request (see run)
+            estimated_tokens: Tokens to hold against the budget until usage is known
+            priority: Overrides the context's request_priority
+
+        Returns:
+            Whatever attempt_fn returns; the last error is raised when retries run out
+        """
+        priority = _priority.get() if priority is None else priority
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            reservation = await self._enter_async(priority, estimated_tokens)
+            try:
+                waited = time.perf_counter() - queued_at
+                if waited > 0.001:
+                    ANTHROPIC_QUEUE_SECONDS.inc(waited, priority="background" if priority else "interactive")
+                try:
+                    return await attempt_fn(reservation)
+                except Exception as e:
+                    verdict = self.classify(e)
+                    if verdict is None or attempt >= self.max_retries:
+                        raise
+                    reason, retry_after = verdict
+            finally:
+                self.slots.leave()
+
+            await asyncio.sleep(self._retry_delay(attempt, reason, retry_after))
+            attempt += 1
+
+    async def stream_async(self, attempt_fn: Callable[[Reservation], AsyncIterator], estimated_tokens: int,
+                           priority: int = None) -> AsyncIterator:
+        """
+        Yield from a streaming request while holding its slot
+
+        An attempt is retried only if it failed before yielding anything;
+        what was already passed on cannot be taken back.
+
+        Args:
+            attempt_fn: Returns an async iterator making one request (see run)
+            estimated_tokens: Tokens to hold against the budget until usage is known
+            priority: Overrides the context's request_priority
+        """
+        priority = _priority.get() if priority is None else priority
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            reservation = await self._enter_async(priority, estimated_tokens)
+            delivered = False
+            try:
+                waited = time.perf_counter() - queued_at
+                if waited > 0.001:
+                    ANTHROPIC_QUEUE_SECONDS.inc(waited, priority="background" if priority else "interactive")
+                try:
+                    async for item in attempt_fn(reservation):
+                        delivered = True
+                        yield item
+                    return
+                except Exception as e:
+                    verdict = self.classify(e)
+                    if verdict is None or attempt >= self.max_retries or delivered:
+                        raise
+                    reason, retry_after = verdict
+            finally:
+                self.slots.leave()
+
+            await asyncio.sleep(self._retry_delay(attempt, reason, retry_after))
+            attempt += 1
+
+    async def _enter_async(self, priority: int, estimated_tokens: int) -> Reservation:
+        """Wait for a slot and budget in a worker thread; a cancelled wait gives its slot back"""
+        waiting = asyncio.ensure_future(asyncio.to_thread(
+            self.slots.enter, priority, lambda: self.budget.try_reserve(estimated_tokens)))
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            waiting.add_done_callback(lambda f: f.cancelled() or f.exception() or self.slots.leave())
+            raise
+
+    def _retry_delay(self, attempt: int, reason: str, retry_after: float) -> float:
+        """Backoff before the next attempt, recorded on metrics and the current span"""
+        delay = max(retry_after, self.backoff(attempt))
+        ANTHROPIC_RETRIES.inc(reason=reason)
+        span = current_span()
+        if span is not None:
+            span.add_event("retry", attempt=attempt + 1, reason=reason, delay_s=round(delay, 3))
+        return delay
+
+
+# Global instance for easy access
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_anthropic_scheduler() -> AnthropicScheduler:
+    """Get the global Anthropic scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AnthropicScheduler()
+    return _scheduler
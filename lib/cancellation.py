@@ -0,0 +1,54 @@
+"""
+Cancellation - Cooperative cancellation for work running in worker threads
+A job binds a cancel token to its context; long operations check it between phases
+"""
+import contextlib
+import contextvars
+import threading
+from typing import Iterator, Optional
+
+_token: contextvars.ContextVar = contextvars.ContextVar("dartinbot_cancel_token", default=None)
+
+
+class Cancelled(BaseException):
+    """
+    Raised by check_cancelled once the current job was asked to stop
+
+    A BaseException, like asyncio.CancelledError, so the broad
+    `except Exception` error handling in the tools does not turn a
+    cancellation into an ordinary failure message.
+    """
+
+
+def check_cancelled(phase: str = ""):
+    """
+    Stop here if the job running in this context was cancelled
+
+    A no-op outside a job. Call it before steps with side effects that
+    cannot be undone (creating a repository, committing, opening a PR).
+
+    Args:
+        phase: Step about to start, for the error message
+    """
+    token = _token.get()
+    if token is not None and token.is_set():
+        raise Cancelled(f"Cancelled before {phase}" if phase else "Cancelled")
+
+
+@contextlib.contextmanager
+def cancel_token(token: Optional[threading.Event]) -> Iterator[None]:
+    """
+    Bind a cancel token to this context
+
+    Worker threads started with asyncio.to_thread or contextvars.copy_context
+    see the same token.
+
+    Usage:
+        with cancel_token(event):
+            await asyncio.to_thread(handler, **params)
+    """
+    reset = _token.set(token)
+    try:
+        yield
+    finally:
+        _token.reset(reset)
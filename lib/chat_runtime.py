@@ -0,0 +1,219 @@
+"""
+Chat Runtime - Kernel construction and the per-turn chat pipeline
+Shared by the CLI loop and the HTTP/WebSocket server; heavy imports stay inside the functions
+"""
+import time
+from typing import Callable, Dict, Optional
+
+from lib.model_router import get_model_router
+from lib.progress import function_progress_filter, listening
+
+
+def build_kernel(model: str = None) -> Dict:
+    """
+    Build the kernel, chat service and execution settings
+
+    One kernel serves any number of sessions: plugins are constructed on
+    their first call and then shared, so their GitHub and Anthropic clients
+    (and connection pools) are reused across sessions.
+
+    Args:
+        model: Claude model id (default: the "chat" route of the model router)
+
+    Returns:
+        Dict with kernel, chat_completion, settings and model
+    """
+    from anthropic import AsyncAnthropic
+    from semantic_kernel import Kernel
+    from semantic_kernel.connectors.ai.anthropic import AnthropicChatPromptExecutionSettings
+    from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+
+    from tools.get_time import Time
+    from tools.app_info import AppName
+    from tools.source_control import ProjectSourceControl
+    from tools.scaffold_generator import ProjectScaffold
+    from tools.background_jobs import BackgroundJobs
+    from lib.claude_details import AnthropicDetails
+    from lib.lazy_plugin import lazy_plugin
+    from lib.scheduled_chat import ScheduledAnthropicChatCompletion
+
+    anthropic_details = AnthropicDetails()
+    if not model:
+        model = anthropic_details.model_for("chat")
+    kernel = Kernel()
+
+    # Add the AI service. Its requests go through the Anthropic scheduler at
+    # interactive priority, which owns retries, so the SDK's own retry loop is off
+    kernel.add_service(
+        ScheduledAnthropicChatCompletion(
+            ai_model_id=model,
+            async_client=AsyncAnthropic(api_key=anthropic_details.API_KEY, max_retries=0),
+            service_id="chat"
+        )
+    )
+
+    # Add plugins with unique names; plugins that create API clients, loggers
+    # or open the project database are only constructed on their first call
+    kernel.add_plugin(Time, "TimeTools")
+    kernel.add_plugin(AppName(), "AppInfo")
+    kernel.add_plugin(lazy_plugin(ProjectSourceControl), "ProjectSourceControl")
+    kernel.add_plugin(lazy_plugin(ProjectScaffold), "ScaffoldGenerator")
+    kernel.add_plugin(lazy_plugin(BackgroundJobs), "BackgroundJobs")
+    # Report tool calls as they start and finish
+    kernel.add_filter("function_invocation", function_progress_filter)
+
+    # Enable function calling in the settings
+    settings = AnthropicChatPromptExecutionSettings(
+        function_choice_behavior=FunctionChoiceBehavior.Auto(),
+        max_tokens=4096
+    )
+
+    return {
+        "kernel": kernel,
+        # Get the chat completion service from the kernel
+        "chat_completion": kernel.get_service(service_id="chat"),
+        "settings": settings,
+        "model": model
+    }
+
+
+def load_history(session, resume: bool):
+    """Token-budgeted history for a session, restored from disk when resuming"""
+    from lib.history_manager import HistoryManager
+
+    # Token-budgeted history: old turns are folded into a summary
+    history_manager = HistoryManager()
+    if resume:
+        state = session.load()
+        history_manager.restore(state["summary"], state["messages"])
+    return history_manager
+
+
+def build_chat_runtime(session, resume: bool) -> Dict:
+    """
+    Build the kernel, chat service and history for a session.
+    Runs in a worker thread while the first prompt is already on screen, so
+    the heavy imports (semantic_kernel, anthropic, PyGithub) live in here.
+    """
+    # Reuse the model resolved when the session started instead of listing models again
+    runtime = build_kernel(session.meta.get("model"))
+    if session.meta.get("model") != runtime["model"]:
+        session.set_meta(model=runtime["model"])
+    runtime["history_manager"] = load_history(session, resume)
+    return runtime
+
+
+async def stream_reply(runtime: Dict, history_manager, on_text: Callable[[str], None]) -> str:
+    """
+    Run one turn with token streaming and auto function calling
+
+    Args:
+        runtime: Kernel, chat service and settings from build_kernel
+        history_manager: The session's history, ending with the user message
+        on_text: Called with each piece of text as it arrives
+
+    Returns:
+        The assistant's final reply (text after the last tool call)
+    """
+    from semantic_kernel.contents.function_call_content import FunctionCallContent
+
+    start = time.perf_counter()
+    reply = []
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    async for chunk in runtime["chat_completion"].get_streaming_chat_message_content(
+        chat_history=history_manager.history,
+        settings=runtime["settings"],
+        kernel=runtime["kernel"],
+    ):
+        if chunk is None:
+            continue
+        _add_usage(usage, (chunk.metadata or {}).get("usage"))
+        # Text before a tool call is narration; the reply is what comes after the last one
+        if any(isinstance(item, FunctionCallContent) for item in chunk.items):
+            reply = []
+        text = chunk.content or ""
+        reply.append(text)
+        if text:
+            await _deliver(on_text, text)
+    # Wall time of the whole turn, tool calls included
+    get_model_router().record("chat", runtime["model"], time.perf_counter() - start,
+                              usage["input_tokens"], usage["output_tokens"])
+    return "".join(reply).strip()
+
+
+async def complete_reply(runtime: Dict, history_manager, on_text: Callable[[str], None]) -> str:
+    """Run one turn without streaming; on_text gets the whole reply once it is complete"""
+    start = time.perf_counter()
+    # Use get_chat_message_content with kernel to enable auto function calling
+    response = await runtime["chat_completion"].get_chat_message_content(
+        chat_history=history_manager.history,
+        settings=runtime["settings"],
+        kernel=runtime["kernel"],
+    )
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    _add_usage(usage, (response.metadata or {}).get("usage"))
+    get_model_router().record("chat", runtime["model"], time.perf_counter() - start,
+                              usage["input_tokens"], usage["output_tokens"])
+    response_text = str(response).strip()
+    if response_text:
+        await _deliver(on_text, response_text)
+    return response_text
+
+
+def _add_usage(totals: Dict, usage):
+    """Add token usage from chat message metadata (a dict when streaming, an SDK object otherwise)"""
+    if usage is None:
+        return
+    for key in totals:
+        value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+        totals[key] += value or 0
+
+
+async def _deliver(callback: Callable, value):
+    """Call a sync or async callback; an async one can hold the stream back (backpressure)"""
+    result = callback(value)
+    if hasattr(result, "__await__"):
+        await result
+
+
+async def run_turn(runtime: Dict, history_manager, session, user_input: str,
+                   on_text: Callable[[str], None], on_progress: Optional[Callable[[Dict], None]] = None,
+                   stream: bool = True) -> str:
+    """
+    One chat turn: record the user message, keep the history in budget,
+    run the model with tools and record the reply
+
+    Args:
+        runtime: Kernel, chat service and settings from build_kernel
+        history_manager: The session's history
+        session: The session's ChatSession (persistence)
+        user_input: The user's message
+        on_text: Receives reply text as it arrives; may be async to apply backpressure
+        on_progress: Receives progress events from tools run in this turn
+        stream: Stream tokens instead of waiting for the complete reply
+
+    Returns:
+        The assistant's reply
+    """
+    history_manager.add_user_message(user_input)
+    session.record_message("user", user_input)
+
+    # Keep the prompt within the token budget before making request
+    summary_before = history_manager.summary
+    history_manager.compact()
+    if history_manager.summary != summary_before:
+        session.checkpoint(history_manager.summary, history_manager.export_messages())
+
+    with listening(on_progress):
+        if stream:
+            response_text = await stream_reply(runtime, history_manager, on_text)
+        else:
+            response_text = await complete_reply(runtime, history_manager, on_text)
+
+    # Drop empty/oversized tool messages appended during the turn
+    history_manager.sync()
+    history_manager.add_assistant_message(response_text)
+    session.record_message("assistant", response_text)
+    if session.needs_checkpoint:
+        session.checkpoint(history_manager.summary, history_manager.export_messages())
+    return response_text
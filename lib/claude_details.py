@@ -1,6 +1,31 @@
+import anthropic
 from anthropic import Anthropic
 
 from lib.CONSTANTS import ANTHROPIC_API_KEY
+from lib.anthropic_scheduler import get_anthropic_scheduler
+from lib.model_router import MODEL_ROUTE_FALLBACKS, get_model_router, model_family
+from lib.tracing import span
+from lib.metrics import ANTHROPIC_REQUESTS, ANTHROPIC_TOKENS
+
+# Shortest prompt prefix the API caches, per model family (tokens)
+CACHE_MIN_TOKENS = {"haiku": 2048}
+DEFAULT_CACHE_MIN_TOKENS = 1024
+
+
+def cacheable(model: str, prefix: str) -> bool:
+    """Whether a prompt prefix is long enough for the model to cache it (about 4 chars per token)"""
+    return bool(prefix) and len(prefix) // 4 >= CACHE_MIN_TOKENS.get(model_family(model), DEFAULT_CACHE_MIN_TOKENS)
+
+
+def _should_fall_back(error: Exception) -> bool:
+    """
+    Try the route's next model when this one is unavailable, or still
+    overloaded once the scheduler's retries ran out
+    """
+    if isinstance(error, anthropic.NotFoundError):
+        return True
+    verdict = get_anthropic_scheduler().classify(error)
+    return verdict is not None and verdict[0] in ("overloaded", "server_error")
 
 class AnthropicDetails:
         """
@@ -15,10 +40,135 @@ class AnthropicDetails:
               )
         
         def claude_sonnet_latest(self, ) -> str:
-            client = self.anthropic_client()
-            latest_model = client.models.list()
-            claude_sonnet_models = []
-            for model in latest_model:
-                if 'claude-sonnet' in model.id:
-                    claude_sonnet_models.append(model.id)
-            return str(claude_sonnet_models[0])
\ No newline at end of file
+            # Model listing is a network round trip; the router lists once per process
+            return get_model_router().latest("sonnet")
+
+        def model_for(self, task: str) -> str:
+            """First choice model for a task (see lib.model_router)"""
+            return get_model_router().resolve(task)[0]
+
+        def stream_text(self, prompt: str, max_tokens: int = 64000, client: Anthropic = None,
+                        task: str = "update", cache_prefix: str = None) -> str:
+            """
+            Stream a single-turn completion and return the full text.
+            The model comes from the task's route; if it is unavailable or
+            stays overloaded, the route's next model is tried.
+
+            cache_prefix is sent before prompt with a prompt-cache breakpoint,
+            so requests sharing it (e.g. a batch update) reuse the cached
+            prefix instead of paying for it again. A prefix shorter than the
+            model's cache minimum is sent as plain text in front of prompt.
+            """
+            # The scheduler owns retries, so the SDK's own retry loop is off
+            client = (client or self.anthropic_client()).with_options(max_retries=0)
+            router = get_model_router()
+            models = router.resolve(task)
+            for index, model in enumerate(models):
+                try:
+                    return self._stream_model(client, model, prompt, max_tokens, task, cache_prefix)
+                except Exception as e:
+                    if index == len(models) - 1 or not _should_fall_back(e):
+                        raise
+                    MODEL_ROUTE_FALLBACKS.inc(route=task, model=model)
+
+        def warm_prompt_cache(self, cache_prefix: str, client: Anthropic = None, task: str = "update") -> bool:
+            """
+            Write a prompt prefix to the cache with a one-token request, so
+            requests started together afterwards all read it instead of each
+            writing their own copy
+
+            Returns:
+                True if the route's model caches the prefix (and it was sent)
+            """
+            if not cacheable(self.model_for(task), cache_prefix):
+                return False
+            self.stream_text("Reply with OK.", max_tokens=1, client=client, task=task, cache_prefix=cache_prefix)
+            return True
+
+        def _stream_model(self, client: Anthropic, model: str, prompt: str, max_tokens: int, task: str,
+                          cache_prefix: str = None) -> str:
+            """
+            One model's generation through the Anthropic scheduler; if the
+            stream is cut by an overload error, the retry continues from the
+            text already received. Records time-to-first-token and output
+            tokens/sec on a span.
+            """
+            chunks = []
+            usage = {"input_tokens": 0, "output_tokens": 0, "cache_read": 0, "cache_write": 0}
+            if not cache_prefix:
+                content = prompt
+            elif cacheable(model, cache_prefix):
+                content = [
+                    {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+                    {"type": "text", "text": prompt},
+                ]
+            else:
+                content = cache_prefix + "\n" + prompt
+
+            with span("anthropic.messages.stream", model=model, route=task, max_tokens=max_tokens) as s:
+                first_token_s = None
+
+                def attempt(reservation) -> str:
+                    nonlocal first_token_s
+                    messages = [{"role": "user", "content": content}]
+                    # Resume a cut-off generation by prefilling what was already streamed
+                    prefill = "".join(chunks).rstrip()
+                    if prefill:
+                        del chunks[:]
+                        chunks.append(prefill)
+                        messages.append({"role": "assistant", "content": prefill})
+                        s.add_event("resume", chars=len(prefill))
+
+                    attempt_usage = {"input_tokens": 0, "output_tokens": 0}
+                    try:
+                        # Stream is required for large responses
+                        response = client.messages.create(
+                            model=model,
+                            max_tokens=max_tokens,
+                            stream=True,
+                            messages=messages
+                        )
+
+                        # Collect the full response text from streaming chunks
+                        with response as stream:
+                            for event in stream:
+                                if event.type == "content_block_delta":
+                                    if hasattr(event.delta, "text"):
+                                        if first_token_s is None:
+                                            first_token_s = s.elapsed_s
+                                            s.add_event("first_token")
+                                        chunks.append(event.delta.text)
+                                elif event.type == "message_start":
+                                    attempt_usage["input_tokens"] = event.message.usage.input_tokens
+                                    usage["cache_read"] += getattr(event.message.usage, "cache_read_input_tokens", 0) or 0
+                                    usage["cache_write"] += getattr(event.message.usage, "cache_creation_input_tokens", 0) or 0
+                                elif event.type == "message_delta":
+                                    attempt_usage["output_tokens"] = event.usage.output_tokens
+                                    s.set_attribute("stop_reason", event.delta.stop_reason)
+                    finally:
+                        usage["input_tokens"] += attempt_usage["input_tokens"]
+                        usage["output_tokens"] += attempt_usage["output_tokens"]
+                        # An attempt rejected before message_start used nothing; don't hold its estimate
+                        reservation.record_usage(attempt_usage["input_tokens"] + attempt_usage["output_tokens"])
+                    return "".join(chunks)
+
+                # Hold the prompt plus a typical generation against the per-minute budget
+                estimated_tokens = (len(prompt) + len(cache_prefix or "")) // 4 + min(max_tokens, 8192)
+                text = get_anthropic_scheduler().run(attempt, estimated_tokens)
+
+                output_tokens = usage["output_tokens"]
+                s.set_attributes(input_tokens=usage["input_tokens"], output_tokens=output_tokens)
+                ANTHROPIC_TOKENS.inc(usage["input_tokens"], direction="input", model=model)
+                ANTHROPIC_TOKENS.inc(output_tokens, direction="output", model=model)
+                if cache_prefix:
+                    ANTHROPIC_TOKENS.inc(usage["cache_read"], direction="cache_read", model=model)
+                    ANTHROPIC_TOKENS.inc(usage["cache_write"], direction="cache_write", model=model)
+                    s.set_attributes(cache_read_tokens=usage["cache_read"], cache_write_tokens=usage["cache_write"])
+                ANTHROPIC_REQUESTS.inc(stop_reason=s.attributes.get("stop_reason") or "unknown")
+                get_model_router().record(task, model, s.elapsed_s, usage["input_tokens"], output_tokens)
+                if first_token_s is not None:
+                    s.set_attribute("time_to_first_token_s", round(first_token_s, 3))
+                    generation_s = s.elapsed_s - first_token_s
+                    if generation_s > 0 and output_tokens:
+                        s.set_attribute("tokens_per_s", round(output_tokens / generation_s, 1))
+                return text
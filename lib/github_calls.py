@@ -0,0 +1,43 @@
+"""
+GitHub Calls - Single call-through point for PyGithub requests
+Every GitHub API call made by the tools goes through github_call so it is paced, retried, traced and counted uniformly
+"""
+import time
+from typing import Any, Callable
+
+from lib.github_scheduler import get_github_scheduler
+from lib.metrics import GITHUB_CALL_SECONDS, GITHUB_CALLS, GITHUB_RATE_LIMIT_REMAINING
+from lib.tracing import span
+
+
+def _record_rate_limit(fn: Callable[..., Any]):
+    """Read the rate limit PyGithub parsed from the last response headers; no extra request"""
+    requester = getattr(getattr(fn, "__self__", None), "requester", None)
+    remaining, limit = getattr(requester, "rate_limiting", (-1, -1))
+    if limit >= 0:
+        GITHUB_RATE_LIMIT_REMAINING.set(remaining)
+
+
+def github_call(operation: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Invoke a PyGithub method through the GitHub scheduler inside a "github.<operation>" span
+
+    Args:
+        operation: Short operation name (e.g. "create_git_tree")
+        fn: Bound PyGithub method to call
+        *args, **kwargs: Passed through to fn
+
+    Returns:
+        Whatever fn returns
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(f"github.{operation}"):
+            result = get_github_scheduler().run(operation, fn, *args, **kwargs)
+        outcome = "ok"
+        return result
+    finally:
+        GITHUB_CALLS.inc(operation=operation, outcome=outcome)
+        GITHUB_CALL_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        _record_rate_limit(fn)
@@ -0,0 +1,243 @@
+"""
+GitHub Scheduler - Pacing, concurrency cap and retries for GitHub API calls
+Token buckets follow the X-RateLimit-* headers; transient failures are retried with jittered backoff
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from github import GithubException
+
+from lib.metrics import get_registry
+from lib.tracing import current_span
+
+# Safe to repeat: reads, content-addressed git objects and setting a ref to a fixed sha
+IDEMPOTENT_OPERATIONS = {
+    "get_user", "get_repo", "get_repos", "get_git_ref", "get_git_commit", "get_git_tree", "get_commits",
+    "graphql", "compare",
+    "create_git_blob", "create_git_tree", "create_git_commit", "update_ref", "delete_repo"
+}
+# Deletes safe to repeat: a 404 after an attempt that may have gone through means it did
+DELETE_OPERATIONS = {"delete_repo"}
+# Content-creating requests count against GitHub's secondary write limits
+WRITE_OPERATIONS = {
+    "create_repo", "create_git_blob", "create_git_tree", "create_git_commit", "create_git_ref",
+    "update_ref", "create_pull", "delete_repo"
+}
+
+GITHUB_RETRIES = get_registry().counter(
+    "dartinbot_github_retries_total", "GitHub call retries, by operation and reason")
+GITHUB_THROTTLE_SECONDS = get_registry().counter(
+    "dartinbot_github_throttle_seconds_total", "Seconds GitHub calls waited for pacing or backoff")
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate can be retuned on the fly"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def block_until(self, deadline: float):
+        """Hold every caller until a monotonic deadline (e.g. rate limit reset)"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, deadline)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> float:
+        """Take one token, sleeping as needed; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate if self.rate > 0 else 1.0
+            time.sleep(delay)
+            waited += delay
+
+
+def _header(headers: Optional[Dict], name: str) -> Optional[str]:
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class GitHubScheduler:
+    """
+    Runs GitHub calls under a concurrency cap and two token buckets (all
+    requests, content-creating writes), retrying transient failures
+
+    Args:
+        max_concurrency: Calls allowed in flight at once
+        max_retries: Retries after the first attempt
+        base_delay: First backoff step in seconds
+        max_delay: Backoff ceiling in seconds
+        max_rate: Ceiling for the header-derived request rate (requests/s)
+        write_rate: Sustained rate for content-creating requests (requests/s)
+        secondary_wait: Wait after a secondary rate limit without Retry-After
+        reserve_fraction: Below this share of the hourly quota, pace to what is left
+    """
+
+    def __init__(self, max_concurrency: int = None, max_retries: int = None, base_delay: float = 1.0,
+                 max_delay: float = 60.0, max_rate: float = 20.0, write_rate: float = 80 / 60,
+                 secondary_wait: float = 60.0, reserve_fraction: float = 0.2):
+        self.max_concurrency = max_concurrency or int(os.getenv("DARTINBOT_GITHUB_CONCURRENCY", "4"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("DARTINBOT_GITHUB_MAX_RETRIES", "4"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_rate = max_rate
+        self.secondary_wait = secondary_wait
+        self.reserve_fraction = reserve_fraction
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.requests = TokenBucket(rate=max_rate, capacity=max_rate)
+        # GitHub allows ~80 content-creating requests a minute; allow a short burst
+        self.writes = TokenBucket(rate=write_rate, capacity=5)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _observe_rate_limit(self, remaining: int, limit: int, reset_epoch: float):
+        """
+        Run at full speed while the quota is healthy; once it drops into the
+        reserve, spread what is left evenly over the rest of the window
+        """
+        if remaining < 0:
+            return
+        seconds_left = max(1.0, reset_epoch - time.time())
+        if remaining == 0:
+            self.requests.block_until(time.monotonic() + seconds_left)
+        elif limit > 0 and remaining < limit * self.reserve_fraction:
+            self.requests.set_rate(min(self.max_rate, max(remaining / seconds_left, 0.05)))
+        elif self.requests.rate != self.max_rate:
+            self.requests.set_rate(self.max_rate)
+
+    def _observe_requester(self, fn: Callable[..., Any]):
+        owner = getattr(fn, "__self__", None)
+        # Bound PyGithub objects carry a requester; raw requester calls (GraphQL) are bound to it
+        requester = getattr(owner, "requester", None) or (owner if hasattr(owner, "rate_limiting") else None)
+        if requester is None:
+            return
+        remaining, limit = getattr(requester, "rate_limiting", (-1, -1))
+        if limit >= 0:
+            self._observe_rate_limit(remaining, limit, getattr(requester, "rate_limiting_resettime", 0))
+
+    def classify(self, error: Exception) -> Optional[tuple]:
+        """
+        Decide whether an error is retryable
+
+        Returns:
+            (reason, minimum wait seconds, safe for non-idempotent calls) or None to give up
+        """
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return ("connection", 0.0, False)
+        if not isinstance(error, GithubException):
+            return None
+
+        status = error.status
+        headers = error.headers or {}
+        message = str(error.data or "").lower()
+        retry_after = _header(headers, "retry-after")
+        remaining = _header(headers, "x-ratelimit-remaining")
+
+        if status in (403, 429):
+            # A rate-limited request was rejected, not executed, so any call may repeat it
+            if retry_after is not None:
+                return ("secondary_rate_limit", float(retry_after), True)
+            if remaining == "0":
+                reset = float(_header(headers, "x-ratelimit-reset") or time.time() + 60)
+                self._observe_rate_limit(0, 0, reset)
+                return ("rate_limit", max(0.0, reset - time.time()), True)
+            if "secondary rate limit" in message or "abuse" in message:
+                return ("secondary_rate_limit", self.secondary_wait, True)
+            return None
+        if status >= 500:
+            return ("server_error", 0.0, False)
+        return None
+
+    def run(self, operation: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call fn under the scheduler's pacing and retry policy
+
+        Args:
+            operation: Operation name; decides idempotency and write pacing
+            fn: Bound PyGithub method
+            *args, **kwargs: Passed through to fn
+
+        Returns:
+            Whatever fn returns (None for a retried delete that found the
+            target already gone); the last error is raised when retries run out
+        """
+        idempotent = operation in IDEMPOTENT_OPERATIONS
+        attempt = 0
+        maybe_applied = False  # an earlier attempt failed after reaching GitHub
+        while True:
+            waited = self.requests.acquire()
+            if operation in WRITE_OPERATIONS:
+                waited += self.writes.acquire()
+            if waited:
+                GITHUB_THROTTLE_SECONDS.inc(waited, reason="pacing")
+
+            with self._slots:
+                try:
+                    result = fn(*args, **kwargs)
+                    self._observe_requester(fn)
+                    return result
+                except Exception as e:
+                    self._observe_requester(fn)
+                    if (maybe_applied and operation in DELETE_OPERATIONS
+                            and isinstance(e, GithubException) and e.status == 404):
+                        return None
+                    verdict = self.classify(e)
+                    if verdict is None or attempt >= self.max_retries:
+                        raise
+                    reason, min_wait, safe_for_all = verdict
+                    if not (idempotent or safe_for_all):
+                        raise
+                    maybe_applied = maybe_applied or not safe_for_all
+
+            delay = max(min_wait, self.backoff(attempt))
+            attempt += 1
+            GITHUB_RETRIES.inc(operation=operation, reason=reason)
+            GITHUB_THROTTLE_SECONDS.inc(delay, reason=reason)
+            span = current_span()
+            if span is not None:
+                span.add_event("retry", attempt=attempt, reason=reason, delay_s=round(delay, 3))
+            time.sleep(delay)
+
+
+# Global instance for easy access
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_github_scheduler() -> GitHubScheduler:
+    """Get the global GitHub scheduler shared by every thread and job"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = GitHubScheduler()
+    return _scheduler
@@ -0,0 +1,239 @@
+"""
+History Manager - Bounded, token-aware ChatHistory for the chat loop
+Keeps per-turn prompt size flat by truncating tool output and folding old turns into a summary
+"""
+import os
+from typing import Callable, Dict, List, Optional
+
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+# Rough heuristic for Claude tokenization; avoids a tokenizer round trip per message
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "Summary of earlier conversation:"
+
+
+def estimate_tokens(message: ChatMessageContent) -> int:
+    """Estimate the prompt tokens a message will cost"""
+    chars = len(message.content or "")
+    for item in message.items:
+        if isinstance(item, FunctionResultContent):
+            chars += len(str(item.result))
+        elif isinstance(item, FunctionCallContent):
+            chars += len(item.name or "") + len(str(item.arguments or ""))
+    return chars // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """Keep the head and tail of a long text, eliding the middle"""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n... [{len(text) - max_chars} characters truncated] ...\n{text[-tail:]}"
+
+
+def summarize_messages(messages: List[ChatMessageContent], max_chars: int = 300) -> str:
+    """
+    Cheap extractive summary of messages: one clipped line per message
+
+    Args:
+        messages: Messages being folded out of the history
+        max_chars: Maximum characters kept per message
+
+    Returns:
+        Summary text
+    """
+    lines = []
+    for message in messages:
+        text = " ".join((message.content or "").split())
+        if not text:
+            continue
+        if len(text) > max_chars:
+            text = text[:max_chars] + "..."
+        lines.append(f"- {message.role.value}: {text}")
+    return "\n".join(lines)
+
+
+class HistoryManager:
+    """Wraps a ChatHistory and keeps it within a token budget"""
+
+    def __init__(self, history: ChatHistory = None, token_budget: int = None,
+                 keep_recent: int = 6, max_tool_chars: int = None,
+                 max_summary_chars: int = 6000,
+                 summarizer: Optional[Callable[[List[ChatMessageContent]], str]] = None):
+        """
+        Initialize the history manager
+
+        Args:
+            history: Existing ChatHistory to manage (a new one is created if None)
+            token_budget: Maximum estimated prompt tokens (default: DARTINBOT_HISTORY_TOKEN_BUDGET or 24000)
+            keep_recent: Minimum number of recent messages never folded into the summary
+            max_tool_chars: Maximum characters kept per tool result (default: DARTINBOT_TOOL_OUTPUT_CHARS or 4000)
+            max_summary_chars: Maximum characters kept in the running summary
+            summarizer: Callable turning folded messages into summary text (default: extractive)
+        """
+        self.history = history if history is not None else ChatHistory()
+        self.token_budget = token_budget or int(os.getenv("DARTINBOT_HISTORY_TOKEN_BUDGET", "24000"))
+        self.keep_recent = keep_recent
+        self.max_tool_chars = max_tool_chars or int(os.getenv("DARTINBOT_TOOL_OUTPUT_CHARS", "4000"))
+        self.max_summary_chars = max_summary_chars
+        self.summarizer = summarizer or summarize_messages
+
+        self._summary = ""
+        self._has_summary_message = False
+        # Token estimate per message, parallel to history.messages
+        self._tokens: List[int] = []
+        self.total_tokens = 0
+        self.sync()
+
+    @property
+    def summary(self) -> str:
+        """Rolling summary of the turns folded out of the history"""
+        return self._summary
+
+    def restore(self, summary: str, messages: List[Dict]):
+        """
+        Load a saved summary and messages into the history
+
+        Args:
+            summary: Rolling summary text
+            messages: List of {"role", "content"} dicts, oldest first
+        """
+        restored = []
+        if summary:
+            restored.append(ChatMessageContent(role=AuthorRole.SYSTEM, content=f"{SUMMARY_HEADER}\n{summary}"))
+        for message in messages:
+            restored.append(ChatMessageContent(role=AuthorRole(message["role"]), content=message["content"]))
+
+        self._summary = summary or ""
+        self._has_summary_message = bool(summary)
+        self.history.messages[:] = restored
+        self._tokens = []
+        self.total_tokens = 0
+        self.sync()
+
+    def export_messages(self) -> List[Dict]:
+        """Text messages in the history (excluding the summary) as {"role", "content"} dicts"""
+        start = 1 if self._has_summary_message else 0
+        return [
+            {"role": message.role.value, "content": message.content}
+            for message in self.history.messages[start:]
+            if message.role in (AuthorRole.USER, AuthorRole.ASSISTANT) and not self._is_empty(message)
+        ]
+
+    def add_user_message(self, text: str):
+        """Append a user message (empty text is ignored)"""
+        if text and text.strip():
+            self.history.add_user_message(text)
+            self._track_last()
+
+    def add_assistant_message(self, text: str):
+        """Append an assistant message (empty text is ignored)"""
+        if text and text.strip():
+            self.history.add_assistant_message(text)
+            self._track_last()
+
+    def _track_last(self):
+        tokens = estimate_tokens(self.history.messages[-1])
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def _is_empty(self, message: ChatMessageContent) -> bool:
+        return not (message.content and str(message.content).strip())
+
+    @staticmethod
+    def _has_function_items(message: ChatMessageContent) -> bool:
+        """Tool calls and results carry no text but must stay paired in the history"""
+        return any(isinstance(item, (FunctionCallContent, FunctionResultContent)) for item in message.items)
+
+    def sync(self):
+        """
+        Account for messages appended outside the manager (e.g. by kernel
+        function calling). Only the new tail is inspected: messages with
+        neither text nor tool calls/results are dropped, and long tool
+        results are truncated. A tool_use must never lose its tool_result,
+        or the next request is rejected.
+        """
+        messages = self.history.messages
+        known = len(self._tokens)
+        if len(messages) < known:
+            # History was replaced wholesale, recount from scratch
+            self._tokens = []
+            self.total_tokens = 0
+            known = 0
+        if len(messages) == known:
+            return
+
+        kept = []
+        for message in messages[known:]:
+            if self._is_empty(message) and not self._has_function_items(message):
+                continue
+            for item in message.items:
+                if isinstance(item, FunctionResultContent):
+                    result = str(item.result)
+                    if len(result) > self.max_tool_chars:
+                        item.result = truncate_text(result, self.max_tool_chars)
+            kept.append(message)
+        messages[known:] = kept
+
+        for message in kept:
+            tokens = estimate_tokens(message)
+            self._tokens.append(tokens)
+            self.total_tokens += tokens
+
+    def compact(self):
+        """Fold the oldest turns into the summary until the history fits the budget"""
+        self.sync()
+        if self.total_tokens <= self.token_budget:
+            return
+
+        messages = self.history.messages
+        start = 1 if self._has_summary_message else 0
+        fold_end = start
+        remaining = self.total_tokens
+        last_foldable = len(messages) - self.keep_recent
+
+        while fold_end < last_foldable and remaining > self.token_budget:
+            remaining -= self._tokens[fold_end]
+            fold_end += 1
+        # Never leave an assistant/tool message first: fold up to the next user turn
+        while fold_end < len(messages) - 1 and messages[fold_end].role != AuthorRole.USER:
+            remaining -= self._tokens[fold_end]
+            fold_end += 1
+
+        if fold_end == start:
+            return
+
+        folded = messages[start:fold_end]
+        addition = self.summarizer(folded)
+        summary = f"{self._summary}\n{addition}".strip() if addition else self._summary
+        if len(summary) > self.max_summary_chars:
+            # Oldest summary lines go first
+            summary = summary[-self.max_summary_chars:].split("\n", 1)[-1]
+        self._summary = summary
+
+        summary_message = ChatMessageContent(
+            role=AuthorRole.SYSTEM,
+            content=f"{SUMMARY_HEADER}\n{summary}"
+        )
+        summary_tokens = estimate_tokens(summary_message)
+
+        if self._has_summary_message:
+            del messages[1:fold_end]
+            self.total_tokens = remaining - self._tokens[0] + summary_tokens
+            del self._tokens[1:fold_end]
+            messages[0] = summary_message
+            self._tokens[0] = summary_tokens
+        else:
+            del messages[:fold_end]
+            del self._tokens[:fold_end]
+            messages.insert(0, summary_message)
+            self._tokens.insert(0, summary_tokens)
+            self.total_tokens = remaining + summary_tokens
+            self._has_summary_message = True
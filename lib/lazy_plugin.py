@@ -0,0 +1,78 @@
+"""
+Lazy Plugin - Register kernel functions without constructing the plugin object
+The heavy object (API clients, loggers, database) is built on the first function call
+"""
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict
+
+from lib.tool_pool import run_blocking
+
+
+class LazyInstance:
+    """Thread-safe, build-once holder for an expensive object"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+
+def lazy_plugin(plugin_class: type, factory: Callable[[], Any] = None) -> Dict[str, Callable]:
+    """
+    Build a kernel plugin from a class without instantiating it
+
+    The kernel function metadata (name, description, parameters) is read
+    from the decorated methods on the class, so Kernel.add_plugin sees the
+    same functions as it would for an instance.
+
+    Plain (def) kernel functions are treated as blocking: they run on the
+    shared tool pool, so several tool calls in one turn overlap and the
+    event loop keeps streaming. Keep async kernel functions for work that
+    really is non-blocking.
+
+    Args:
+        plugin_class: Class whose methods are decorated with @kernel_function
+        factory: Callable that builds the instance (default: plugin_class())
+
+    Returns:
+        Dict of function name -> proxy, accepted by Kernel.add_plugin
+    """
+    holder = LazyInstance(factory or plugin_class)
+    functions = {}
+
+    for name, member in inspect.getmembers(plugin_class, inspect.isfunction):
+        if not getattr(member, "__kernel_function__", False):
+            continue
+        functions[name] = _make_proxy(holder, name, member)
+
+    return functions
+
+
+def _make_proxy(holder: LazyInstance, name: str, member: Callable) -> Callable:
+    """Create a proxy that resolves the instance and calls the bound method"""
+    if inspect.iscoroutinefunction(member):
+        @functools.wraps(member)
+        async def proxy(*args, **kwargs):
+            return await getattr(holder.get(), name)(*args, **kwargs)
+    else:
+        @functools.wraps(member)
+        async def proxy(*args, **kwargs):
+            # Building the instance is blocking too, so it happens on the pool as well
+            return await run_blocking(lambda: getattr(holder.get(), name)(*args, **kwargs))
+
+    # Drop the wrapped signature so callers never see a dangling 'self'
+    del proxy.__wrapped__
+    return proxy
@@ -1,9 +1,39 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
 import json
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+# Size-based rotation and batching defaults, overridable per deployment
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+
 
 class JsonFormatter(logging.Formatter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_second = None
+        self._cached_timestamp = ""
+
+    def formatTime(self, record, datefmt=None):
+        # Records arrive in bursts; only re-render the timestamp once per second
+        if datefmt is None:
+            second = int(record.created)
+            if second != self._cached_second:
+                self._cached_second = second
+                self._cached_timestamp = time.strftime(self.default_time_format, self.converter(record.created))
+            return self.default_msec_format % (self._cached_timestamp, record.msecs)
+        return super().formatTime(record, datefmt)
+
     def format(self, record):
         log_record = {
             "timestamp": self.formatTime(record, self.datefmt),
@@ -12,20 +42,167 @@ class JsonFormatter(logging.Formatter):
             "logger": record.name,
         }
         # Optionally add more fields from record if needed
+        if orjson is not None:
+            return orjson.dumps(log_record).decode("utf-8")
         return json.dumps(log_record)
 
 
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-rotated file handler that leaves flushing to the queue listener,
+    so a burst of records costs one flush instead of one per record
+    """
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding="utf-8"):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self._size = os.path.getsize(filename) if os.path.exists(filename) else 0
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            size = len(msg.encode(self.encoding or "utf-8"))
+            if self.maxBytes > 0 and self._size + size > self.maxBytes and self._size > 0:
+                self.doRollover()
+                self._size = 0
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._size += size
+        except Exception:
+            self.handleError(record)
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Drains the log queue in batches and flushes each handler once per batch"""
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            record = self.dequeue(True)
+            batch = [record]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    continue
+                self.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+            if stop:
+                break
+
+
+class FastQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that skips the default format-and-copy in prepare();
+    the caller only resolves the message, the listener does the rest
+    """
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging._defaultFormatter.formatException(record.exc_info)
+            record.msg = f"{record.msg}\n{record.exc_text}"
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class _RoutingHandler(logging.Handler):
+    """Sends each record to the file handler of the logger that produced it"""
+
+    def __init__(self):
+        super().__init__()
+        self.targets = {}
+
+    def handle(self, record):
+        target = self.targets.get(record.name)
+        if target is not None:
+            target.handle(record)
+        return True
+
+    def flush(self):
+        for target in list(self.targets.values()):
+            target.flush()
+
+    def close(self):
+        for target in list(self.targets.values()):
+            target.close()
+        super().close()
+
+
+_log_queue = queue.SimpleQueue()
+_router = _RoutingHandler()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+    """Start the background writer thread once per process"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = BatchingQueueListener(_log_queue, _router, respect_handler_level=False)
+            _listener.start()
+            atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            _router.flush()
+
+
+def _configured_level(logName: str) -> int:
+    """
+    Resolve the level for a logger from LOG_LEVELS ("name=LEVEL,name2=LEVEL")
+    falling back to LOG_LEVEL (default INFO)
+    """
+    overrides = {}
+    for entry in os.getenv("LOG_LEVELS", "").split(","):
+        if "=" in entry:
+            name, level = entry.split("=", 1)
+            overrides[name.strip()] = level.strip().upper()
+    level = overrides.get(logName, os.getenv("LOG_LEVEL", "INFO").upper())
+    return logging.getLevelName(level) if isinstance(logging.getLevelName(level), int) else logging.INFO
+
+
 def logClient(logName: str) -> logging.Logger:
     log_directory = os.getenv("LOG_FOLDER")
     log_dir = os.path.join(os.path.dirname(__file__), str(log_directory))
     os.makedirs(log_dir, exist_ok=True)
     log_path = os.path.join(log_dir, f"{logName}.log")
     logger = logging.getLogger(f"{logName}.log")
-    logger.setLevel(logging.INFO)
+    logger.setLevel(_configured_level(logName))
     # Prevent adding multiple handlers if logger is called multiple times
     if not logger.handlers:
-        file_handler = logging.FileHandler(log_path)
+        file_handler = BatchedRotatingFileHandler(
+            log_path,
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT
+        )
         formatter = JsonFormatter()
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    return logger
\ No newline at end of file
+        _router.targets[logger.name] = file_handler
+        # The caller only enqueues; formatting and disk I/O happen on the listener thread
+        logger.addHandler(FastQueueHandler(_log_queue))
+        _start_listener()
+    return logger
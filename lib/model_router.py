@@ -0,0 +1,132 @@
+"""
+Model Router - Picks the Claude model for each kind of task, with fallbacks
+Each task can use its own model (e.g. a smaller one for a task that only needs it); generation tasks fall back along their route
+"""
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from lib.metrics import get_registry
+
+# Route per task: model families or full model ids, tried in order.
+# Override with DARTINBOT_MODEL_<TASK>, e.g. DARTINBOT_MODEL_CHAT=haiku
+DEFAULT_ROUTES = {
+    # The chat model picks tools, including destructive ones (delete_project_ai),
+    # so it defaults to Sonnet. A chat session is bound to the first model of
+    # the route: a turn that already ran tools cannot be replayed on another model
+    "chat": ["sonnet"],
+    "scaffold": ["sonnet"],
+    "update": ["sonnet"],
+    # Re-asks for malformed files re-emit file bodies, so they stay on the generation model
+    "repair": ["sonnet"],
+}
+FAMILIES = ("haiku", "sonnet", "opus")
+
+# Estimated USD per million (input, output) tokens, for the per-route cost metric
+PRICES = {
+    "haiku": (1.0, 5.0),
+    "sonnet": (3.0, 15.0),
+    "opus": (15.0, 75.0),
+}
+
+MODEL_ROUTE_SECONDS = get_registry().histogram(
+    "dartinbot_model_route_seconds", "Claude request latency in seconds, by route and model")
+MODEL_ROUTE_COST = get_registry().counter(
+    "dartinbot_model_route_cost_usd_total", "Estimated Claude spend in USD, by route and model")
+MODEL_ROUTE_FALLBACKS = get_registry().counter(
+    "dartinbot_model_route_fallbacks_total", "Requests that fell back to the next model of a route")
+
+
+def model_family(model: str) -> Optional[str]:
+    """haiku, sonnet or opus for a model id, or None if unknown"""
+    for family in FAMILIES:
+        if family in model:
+            return family
+    return None
+
+
+class ModelRouter:
+    """
+    Resolves a task to the concrete models to try, newest of each family first
+    """
+
+    def __init__(self, routes: Dict[str, List[str]] = None, list_models: Callable[[], List[str]] = None):
+        """
+        Initialize the router
+
+        Args:
+            routes: Task -> model families or ids (default: DEFAULT_ROUTES plus environment overrides)
+            list_models: Returns available model ids, newest first (default: the Anthropic models API)
+        """
+        self.routes = dict(DEFAULT_ROUTES)
+        for task in list(self.routes):
+            configured = os.getenv(f"DARTINBOT_MODEL_{task.upper()}")
+            if configured:
+                self.routes[task] = [m.strip() for m in configured.split(",") if m.strip()]
+        self.routes.update(routes or {})
+        self._list_models = list_models
+        self._available: Optional[List[str]] = None
+        self._lock = threading.Lock()
+
+    def available_models(self) -> List[str]:
+        """Model ids the API offers, newest first; listed once per process"""
+        if self._available is None:
+            with self._lock:
+                if self._available is None:
+                    if self._list_models is None:
+                        from lib.claude_details import AnthropicDetails
+                        client = AnthropicDetails().anthropic_client()
+                        self._available = [model.id for model in client.models.list()]
+                    else:
+                        self._available = list(self._list_models())
+        return self._available
+
+    def latest(self, family: str) -> Optional[str]:
+        """Newest available model of a family"""
+        return next((m for m in self.available_models() if f"claude-{family}" in m), None)
+
+    def resolve(self, task: str) -> List[str]:
+        """
+        Models to try for a task, in order
+
+        Family names resolve to the family's newest model and are skipped if
+        the API offers none; full model ids are used as given.
+
+        Raises:
+            ValueError: If the task has no route or no entry of it resolves
+        """
+        route = self.routes.get(task)
+        if route is None:
+            raise ValueError(f"No model route for task '{task}'")
+        models = []
+        for entry in route:
+            model = self.latest(entry) if entry in FAMILIES else entry
+            if model and model not in models:
+                models.append(model)
+        if not models:
+            raise ValueError(f"No available model for task '{task}' (route: {', '.join(route)})")
+        return models
+
+    def record(self, task: str, model: str, seconds: Optional[float], input_tokens: int = 0, output_tokens: int = 0):
+        """Record a request's latency (None if not measured) and estimated cost against its route"""
+        if seconds is not None:
+            MODEL_ROUTE_SECONDS.observe(seconds, route=task, model=model)
+        prices = PRICES.get(model_family(model) or "")
+        if prices and (input_tokens or output_tokens):
+            cost = (input_tokens * prices[0] + output_tokens * prices[1]) / 1_000_000
+            MODEL_ROUTE_COST.inc(cost, route=task, model=model)
+
+
+# Global instance for easy access
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Get the global model router"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
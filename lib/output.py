@@ -0,0 +1,64 @@
+"""
+Output - Context-local destination for what tools print
+Background jobs send their tools' console output to the job's log instead of over the chat prompt
+"""
+import contextlib
+import contextvars
+import sys
+import threading
+from typing import Iterator, TextIO
+
+_sink: contextvars.ContextVar = contextvars.ContextVar("dartinbot_output_sink", default=None)
+_install_lock = threading.Lock()
+
+
+class _ContextStdout:
+    """sys.stdout stand-in that writes to the current context's sink, else to the real stdout"""
+
+    def __init__(self, stdout: TextIO):
+        self._stdout = stdout
+
+    def write(self, text: str) -> int:
+        sink = _sink.get()
+        if sink is None:
+            return self._stdout.write(text)
+        try:
+            sink.write(text)
+        except Exception:
+            # Output capture must never fail the operation printing
+            pass
+        return len(text)
+
+    def flush(self):
+        sink = _sink.get()
+        (sink if sink is not None else self._stdout).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stdout, name)
+
+
+def _install():
+    """Put the context-aware stdout in place once per process"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ContextStdout):
+            sys.stdout = _ContextStdout(sys.stdout)
+
+
+@contextlib.contextmanager
+def redirected_output(sink: TextIO) -> Iterator[None]:
+    """
+    Send print() output from this context to sink
+
+    Worker threads started with asyncio.to_thread or contextvars.copy_context
+    inherit the redirection; other contexts keep printing to the terminal.
+
+    Usage:
+        with open(log_path, "a") as log, redirected_output(log):
+            await asyncio.to_thread(handler, **params)
+    """
+    _install()
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
@@ -0,0 +1,91 @@
+"""
+Progress - Live progress events from running kernel functions
+A listener is bound to the current context, so a chat turn only hears from its own tool calls
+"""
+import contextlib
+import contextvars
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+_listener: contextvars.ContextVar = contextvars.ContextVar("dartinbot_progress_listener", default=None)
+
+
+def emit(event: str, **fields):
+    """
+    Report a step of a running operation (e.g. files written, PR opened)
+
+    A no-op when nobody is listening. Listener errors are swallowed: progress
+    output must never fail the operation reporting it.
+
+    Args:
+        event: Event name
+        **fields: Event details
+    """
+    listener = _listener.get()
+    if listener is None:
+        return
+    try:
+        listener({"event": event, "time": time.time(), **fields})
+    except Exception as e:
+        print(f"Error reporting progress: {e}")
+
+
+@contextlib.contextmanager
+def listening(listener: Optional[Callable[[Dict], None]]) -> Iterator[None]:
+    """
+    Send progress events emitted in this context to listener
+
+    Worker threads started with asyncio.to_thread copy the context and so
+    report to the same listener. Pass None to mute an inherited listener.
+
+    Usage:
+        with listening(print):
+            await chat_completion.get_chat_message_content(...)
+    """
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+async def function_progress_filter(context, next):
+    """
+    Kernel function invocation filter reporting each tool call's start and end
+
+    Register with kernel.add_filter("function_invocation", function_progress_filter)
+    """
+    name = f"{context.function.plugin_name}.{context.function.name}" if context.function.plugin_name \
+        else context.function.name
+    emit("tool_started", function=name)
+    start = time.perf_counter()
+    try:
+        await next(context)
+    except Exception as e:
+        emit("tool_finished", function=name, duration_s=time.perf_counter() - start, error=str(e))
+        raise
+    emit("tool_finished", function=name, duration_s=time.perf_counter() - start)
+
+
+def describe(event: Dict) -> str:
+    """One line summary of a progress event for console output"""
+    name = event["event"]
+    if name == "tool_started":
+        return f"running {event['function']}..."
+    if name == "tool_finished":
+        status = "failed" if event.get("error") else "done"
+        return f"{event['function']} {status} ({event['duration_s']:.1f}s)"
+    if name == "files_written":
+        return f"wrote {event['count']} files in {event['project']}"
+    if name == "tree_created":
+        return f"created tree {event['sha'][:7]} for {event['repo']}"
+    if name == "commit_created":
+        return f"committed {event['sha'][:7]} to {event['repo']}:{event['branch']}"
+    if name == "pr_opened":
+        return f"opened PR #{event['number']}: {event['url']}"
+    if name == "batch_started":
+        return f"updating {event['total']} projects, {event['parallel']} at a time"
+    if name == "batch_progress":
+        return f"[{event['done']}/{event['total']}] {event['repo']} {event['status']}"
+    details = ", ".join(f"{k}={v}" for k, v in event.items() if k not in ("event", "time"))
+    return f"{name} {details}".strip()
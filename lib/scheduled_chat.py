@@ -0,0 +1,68 @@
+"""
+Scheduled Chat - Semantic Kernel's Anthropic chat service behind the Anthropic scheduler
+Every model request of a chat turn takes an interactive slot, holds its tokens against the per-minute budget and gets the scheduler's retries
+"""
+from typing import Any, AsyncGenerator, Dict, List
+
+from semantic_kernel.connectors.ai.anthropic import AnthropicChatCompletion
+
+from lib.anthropic_scheduler import INTERACTIVE, get_anthropic_scheduler
+
+
+def _estimate_tokens(settings) -> int:
+    """Request size (messages, system prompt, tools) at about 4 chars per token, plus the output cap"""
+    return len(str(settings.prepare_settings_dict())) // 4 + min(settings.max_tokens or 4096, 8192)
+
+
+def _usage_tokens(usage: Any) -> int:
+    """Input plus output tokens from chat message metadata (a dict when streaming, an SDK object otherwise)"""
+    if usage is None:
+        return 0
+    total = 0
+    for key in ("input_tokens", "output_tokens"):
+        value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+        total += value or 0
+    return total
+
+
+class ScheduledAnthropicChatCompletion(AnthropicChatCompletion):
+    """
+    AnthropicChatCompletion whose requests go through the Anthropic scheduler
+    at interactive priority
+
+    Only the model requests are scheduled, one at a time: tool calls made
+    between them during auto function calling do not hold a slot.
+    """
+
+    async def _send_chat_request(self, settings) -> List:
+        parent = super()._send_chat_request
+
+        async def attempt(reservation):
+            usage = 0
+            try:
+                contents = await parent(settings)
+                usage = sum(_usage_tokens((c.metadata or {}).get("usage")) for c in contents)
+                return contents
+            finally:
+                reservation.record_usage(usage)
+
+        return await get_anthropic_scheduler().run_async(attempt, _estimate_tokens(settings), priority=INTERACTIVE)
+
+    async def _send_chat_stream_request(self, settings, function_invoke_attempt: int = 0) -> AsyncGenerator:
+        parent = super()._send_chat_stream_request
+
+        async def attempt(reservation):
+            usage: Dict[str, int] = {"input_tokens": 0, "output_tokens": 0}
+            try:
+                async for chunks in parent(settings, function_invoke_attempt):
+                    for chunk in chunks:
+                        chunk_usage = (chunk.metadata or {}).get("usage") or {}
+                        for key in usage:
+                            usage[key] = max(usage[key], chunk_usage.get(key) or 0)
+                    yield chunks
+            finally:
+                reservation.record_usage(usage["input_tokens"] + usage["output_tokens"])
+
+        async for chunks in get_anthropic_scheduler().stream_async(attempt, _estimate_tokens(settings),
+                                                                   priority=INTERACTIVE):
+            yield chunks
@@ -0,0 +1,195 @@
+"""
+Session Store - Persistent chat sessions with append-only logs and compacted checkpoints
+Lets the CLI resume a long project conversation without rebuilding it from scratch
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+class ChatSession:
+    """
+    A single persisted conversation
+
+    State is the last checkpoint plus the events appended to the current
+    event log since then. Nothing is read from disk until load() is called,
+    and nothing is written until the first message: a session nobody
+    talked in leaves no directory behind.
+    """
+
+    def __init__(self, session_dir: str, session_id: str, checkpoint_every: int = 50):
+        self.session_dir = session_dir
+        self.session_id = session_id
+        self.checkpoint_every = checkpoint_every
+        self._checkpoint: Optional[Dict] = None
+        self._events_since_checkpoint = 0
+        self._pending: List[Dict] = []  # events held until the session directory exists
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.session_dir, CHECKPOINT_FILE)
+
+    @property
+    def exists(self) -> bool:
+        """Whether the session has been written to disk"""
+        return os.path.isdir(self.session_dir)
+
+    def _events_path(self, generation: int) -> str:
+        return os.path.join(self.session_dir, f"events-{generation}.jsonl")
+
+    def _read_checkpoint(self) -> Dict:
+        if self._checkpoint is None:
+            try:
+                with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                    self._checkpoint = json.load(f)
+            except FileNotFoundError:
+                self._checkpoint = {
+                    "session_id": self.session_id,
+                    "generation": 0,
+                    "summary": "",
+                    "messages": [],
+                    "meta": {},
+                    "created_at": datetime.now().isoformat()
+                }
+        return self._checkpoint
+
+    @property
+    def meta(self) -> Dict:
+        """Session metadata (e.g. resolved model id); cheap, reads only the checkpoint"""
+        return self._read_checkpoint()["meta"]
+
+    def set_meta(self, **values):
+        """Update session metadata and persist it immediately"""
+        self._read_checkpoint()["meta"].update(values)
+        self._append({"type": "meta", "values": values})
+
+    def _append(self, event: Dict):
+        """Append one event to the current event log (held in memory until the first message)"""
+        generation = self._read_checkpoint()["generation"]
+        event["ts"] = datetime.now().isoformat()
+        self._pending.append(event)
+        if event["type"] != "message" and not self.exists:
+            return
+        os.makedirs(self.session_dir, exist_ok=True)
+        with open(self._events_path(generation), 'a', encoding='utf-8') as f:
+            for pending in self._pending:
+                f.write(json.dumps(pending, ensure_ascii=False) + "\n")
+        self._events_since_checkpoint += len(self._pending)
+        self._pending = []
+
+    def record_message(self, role: str, content: str):
+        """Append a chat message to the session log"""
+        if content and content.strip():
+            self._append({"type": "message", "role": role, "content": content})
+
+    @property
+    def needs_checkpoint(self) -> bool:
+        return self._events_since_checkpoint >= self.checkpoint_every
+
+    def load(self) -> Dict:
+        """
+        Rebuild session state from the checkpoint and the events after it
+
+        Returns:
+            Dict with "summary", "messages" (list of {"role", "content"}) and "meta"
+        """
+        checkpoint = self._read_checkpoint()
+        summary = checkpoint["summary"]
+        messages = list(checkpoint["messages"])
+        meta = dict(checkpoint["meta"])
+
+        events_path = self._events_path(checkpoint["generation"])
+        if os.path.exists(events_path):
+            with open(events_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash; everything before it is intact
+                        continue
+                    if event["type"] == "message":
+                        messages.append({"role": event["role"], "content": event["content"]})
+                    elif event["type"] == "meta":
+                        meta.update(event["values"])
+
+        return {"summary": summary, "messages": messages, "meta": meta}
+
+    def checkpoint(self, summary: str, messages: List[Dict]):
+        """
+        Write a compacted checkpoint and start a fresh event log; does
+        nothing before the first message
+
+        Args:
+            summary: Rolling summary of folded turns
+            messages: Messages currently in the history ({"role", "content"})
+        """
+        if not self.exists:
+            return
+        checkpoint = self._read_checkpoint()
+        old_generation = checkpoint["generation"]
+        checkpoint.update({
+            "generation": old_generation + 1,
+            "summary": summary,
+            "messages": messages,
+            "updated_at": datetime.now().isoformat()
+        })
+
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+        # The old log is fully captured by the checkpoint now
+        old_events = self._events_path(old_generation)
+        if os.path.exists(old_events):
+            os.remove(old_events)
+        self._events_since_checkpoint = 0
+
+
+class SessionStore:
+    """Manages the sessions directory"""
+
+    def __init__(self, sessions_dir: str = None):
+        """
+        Initialize the session store
+
+        Args:
+            sessions_dir: Directory holding one folder per session. If None, uses default location.
+        """
+        if sessions_dir is None:
+            sessions_dir = Path.home() / "semantic" / ".dartinbot" / "sessions"
+        self.sessions_dir = str(sessions_dir)
+        os.makedirs(self.sessions_dir, exist_ok=True)
+
+    def create_session(self, session_id: str = None) -> ChatSession:
+        """
+        Create a new session (id defaults to a timestamp plus random suffix).
+        Its directory is written with the first message.
+        """
+        if session_id is None:
+            session_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        return ChatSession(os.path.join(self.sessions_dir, session_id), session_id)
+
+    def open_session(self, session_id: str, exact: bool = False) -> Optional[ChatSession]:
+        """Open an existing session by id (or unique id prefix, unless exact)"""
+        if exact:
+            if session_id not in self.list_sessions():
+                return None
+            return ChatSession(os.path.join(self.sessions_dir, session_id), session_id)
+        matches = [s for s in self.list_sessions() if s == session_id or s.startswith(session_id)]
+        if session_id in matches:
+            matches = [session_id]
+        if len(matches) != 1:
+            return None
+        return ChatSession(os.path.join(self.sessions_dir, matches[0]), matches[0])
+
+    def list_sessions(self) -> List[str]:
+        """List session ids, newest first"""
+        sessions = [d for d in os.listdir(self.sessions_dir)
+                    if os.path.isdir(os.path.join(self.sessions_dir, d))]
+        return sorted(sessions, reverse=True)
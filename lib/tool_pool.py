@@ -0,0 +1,84 @@
+"""
+Tool Pool - Shared thread pool for kernel functions that do blocking I/O
+Independent tool calls in one model turn overlap instead of queueing on the event loop
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from lib.metrics import get_registry
+
+TOOL_CALLS_IN_FLIGHT = get_registry().gauge(
+    "dartinbot_tool_calls_in_flight", "Blocking kernel function calls running on the tool pool")
+
+
+class ToolPool:
+    """
+    Thread pool for blocking kernel function bodies (PyGithub, file I/O, Claude streams)
+
+    The pool size bounds how many tool calls run at once; 1 runs them one
+    after another, as if they were called sequentially.
+    """
+
+    def __init__(self, workers: int = None):
+        """
+        Initialize the pool
+
+        Args:
+            workers: Tool calls run at once (default: DARTINBOT_TOOL_WORKERS or 8)
+        """
+        self.workers = max(1, workers or int(os.getenv("DARTINBOT_TOOL_WORKERS", "8")))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dartinbot-tool")
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _track(self, delta: int):
+        with self._lock:
+            self._in_flight += delta
+            TOOL_CALLS_IN_FLIGHT.set(self._in_flight)
+
+    def _call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        self._track(1)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._track(-1)
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and await its result
+
+        The caller's context (current span, progress listener, request
+        priority) is copied into the worker thread, as asyncio.to_thread does.
+        """
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, self._call, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls"""
+        self._executor.shutdown(wait=True)
+
+
+# Global instance for easy access
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_tool_pool() -> ToolPool:
+    """Get the global tool pool shared by every session"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ToolPool()
+    return _pool
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking callable on the shared tool pool"""
+    return await get_tool_pool().run(fn, *args, **kwargs)
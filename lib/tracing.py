@@ -0,0 +1,182 @@
+"""
+Tracing - Lightweight context-propagated spans exported as OTLP-shaped JSONL
+Answers "where did the time go" across generate, commit, update and change detection
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("dartinbot_current_span", default=None)
+
+
+def _trace_path() -> Optional[str]:
+    """Span output file; DARTINBOT_TRACE_FILE=off disables tracing"""
+    path = os.getenv("DARTINBOT_TRACE_FILE")
+    if path and path.lower() in ("off", "none", "0", "false"):
+        return None
+    if not path:
+        trace_dir = Path.home() / "semantic" / ".dartinbot" / "traces"
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        path = str(trace_dir / "spans.jsonl")
+    return path
+
+
+class SpanExporter:
+    """Buffers finished spans and appends them to a JSONL file"""
+
+    def __init__(self, path: Optional[str], flush_every: int = 64):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def export(self, span_record: Dict, is_root: bool):
+        if self.path is None:
+            return
+        with self._lock:
+            self._buffer.append(span_record)
+            # Flush whenever a whole trace has finished, or the buffer is large
+            if is_root or len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer or self.path is None:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(s, default=str) + "\n" for s in self._buffer))
+        except Exception as e:
+            print(f"Error writing spans: {e}")
+        self._buffer = []
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> SpanExporter:
+    """Get the global span exporter"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = SpanExporter(_trace_path())
+                atexit.register(_exporter.flush)
+    return _exporter
+
+
+class Span:
+    """A timed operation; use via the span() context manager"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any] = None):
+        parent = _current_span.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "OK"
+        self.error = None
+        self._start_ns = 0
+        self._start_perf = 0.0
+        self.duration_s = 0.0
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        """Record a point-in-time event (e.g. first token received)"""
+        self.events.append({
+            "name": name,
+            "timeUnixNano": time.time_ns(),
+            "attributes": attributes
+        })
+
+    @property
+    def elapsed_s(self) -> float:
+        """Seconds since the span started"""
+        return time.perf_counter() - self._start_perf
+
+    def __enter__(self):
+        self._start_ns = time.time_ns()
+        self._start_perf = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_s = time.perf_counter() - self._start_perf
+        if exc is not None:
+            self.status = "ERROR"
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        get_exporter().export(self.to_dict(), is_root=self.parent_span_id is None)
+        return False
+
+    def to_dict(self) -> Dict:
+        """Span in OTLP/JSON field naming, one object per line"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "startTimeUnixNano": self._start_ns,
+            "endTimeUnixNano": self._start_ns + int(self.duration_s * 1e9),
+            "durationMs": round(self.duration_s * 1000, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.error}
+        }
+
+
+def span(name: str, **attributes) -> Span:
+    """
+    Start a span; nests under the current span in this context
+
+    Usage:
+        with span("github.create_git_tree", files=len(elements)) as s:
+            ...
+            s.set_attribute("tree_sha", tree.sha)
+    """
+    return Span(name, attributes)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost active span, if any"""
+    return _current_span.get()
+
+
+def traced(name: str = None):
+    """Decorator that wraps a sync or async function in a span"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,101 +1,155 @@
 """
 Simple Semantic Kernel Chatbot with Anthropic integrations
 """
+import argparse
 import asyncio
 import os
+import threading
+import time
 
-from semantic_kernel import Kernel
-from semantic_kernel.contents.chat_history import ChatHistory
-from semantic_kernel.connectors.ai.anthropic import (
-    AnthropicChatCompletion,
-    AnthropicChatPromptExecutionSettings
-)
-from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-from semantic_kernel.core_plugins.time_plugin import TimePlugin
-
-from tools.get_time import Time
-from tools.app_info import AppName
-from tools.source_control import ProjectSourceControl
-from tools.scaffold_generator import ProjectScaffold
-from lib.claude_details import AnthropicDetails
-
-async def chat_with_ai() -> str:
-    anthropic_details = AnthropicDetails()
-    anthropc_model = anthropic_details.claude_sonnet_latest()
-    anthropic_api_key = anthropic_details.API_KEY
-    kernel = Kernel()
-    
-    # Add the AI service
-    kernel.add_service(
-        AnthropicChatCompletion(
-            ai_model_id=anthropc_model,
-            api_key=anthropic_api_key,
-            service_id="chat"
-        )
-    )
-    
-    # Add plugins with unique names (instantiate the classes with ())
-    kernel.add_plugin(Time, "TimeTools")
-    kernel.add_plugin(AppName(), "AppInfo")
-    kernel.add_plugin(ProjectSourceControl(), "ProjectSourceControl")
-    kernel.add_plugin(ProjectScaffold(), "ScaffoldGenerator")
-    
-    # Get the chat completion service from the kernel
-    chat_completion = kernel.get_service(service_id="chat")
-    
-    # Enable function calling in the settings
-    settings = AnthropicChatPromptExecutionSettings(
-        function_choice_behavior=FunctionChoiceBehavior.Auto(),
-        max_tokens=4096
+from tools.job_queue import FINISHED_STATES, get_job_queue
+from lib.session_store import SessionStore
+from lib.metrics import CHAT_FIRST_OUTPUT_SECONDS, get_registry, start_metrics_server
+from lib.progress import describe
+# build_chat_runtime is re-exported here for the startup benchmark
+from lib.chat_runtime import build_chat_runtime, run_turn
+
+class StreamPrinter:
+    """
+    Console output for one assistant turn: tokens are written as they
+    arrive, progress events from running tools go on their own lines
+    """
+
+    def __init__(self, started_at: float, mode: str):
+        self.started_at = started_at
+        self.mode = mode
+        self.first_output_s = None
+        self._prefixed = False
+        self._mid_line = False
+        self._lock = threading.Lock()
+
+    def _first_output(self):
+        if self.first_output_s is None:
+            self.first_output_s = time.perf_counter() - self.started_at
+            CHAT_FIRST_OUTPUT_SECONDS.observe(self.first_output_s, mode=self.mode)
+
+    def text(self, chunk: str):
+        """Write a piece of the assistant's reply"""
+        if not chunk:
+            return
+        with self._lock:
+            self._first_output()
+            if not self._prefixed:
+                print("Assistant: ", end="")
+                self._prefixed = True
+            print(chunk, end="", flush=True)
+            self._mid_line = not chunk.endswith("\n")
+
+    def progress(self, event: dict):
+        """Write a progress event; may be called from tool worker threads"""
+        with self._lock:
+            self._first_output()
+            if self._mid_line:
+                print()
+                self._mid_line = False
+            print(f"  [{describe(event)}]", flush=True)
+
+    def finish(self):
+        """End the turn's output"""
+        with self._lock:
+            if not self._prefixed:
+                self._first_output()
+                print("Assistant: [Task completed]")
+            elif self._mid_line:
+                print()
+            self._mid_line = False
+
+def streaming_enabled() -> bool:
+    """Token streaming is on unless DARTINBOT_STREAM=0"""
+    return os.getenv("DARTINBOT_STREAM", "1").lower() not in ("0", "false", "no", "off")
+
+async def chat_with_ai(resume: str = None, stream: bool = None) -> str:
+    if stream is None:
+        stream = streaming_enabled()
+
+    session_store = SessionStore()
+    if resume:
+        session = session_store.open_session(resume)
+        if session is None:
+            print(f"No unique session found matching: {resume}")
+            return
+        print(f"Resuming session: {session.session_id}")
+    else:
+        session = session_store.create_session()
+        print(f"Session: {session.session_id} (resume with --resume {session.session_id})")
+
+    # Build the kernel in the background; the prompt is shown right away
+    runtime_task = asyncio.ensure_future(
+        asyncio.to_thread(build_chat_runtime, session, bool(resume))
     )
-    
-    history = ChatHistory()
-    
-    def clean_history():
-        """Remove any messages with empty content from history"""
-        cleaned_messages = []
-        for msg in history.messages:
-            if msg.content and str(msg.content).strip():
-                cleaned_messages.append(msg)
-        history.messages = cleaned_messages
-    
+
+    metrics_server = start_metrics_server()
+    if metrics_server is not None:
+        host, port = metrics_server.server_address[:2]
+        print(f"Metrics: http://{host}:{port}/metrics")
+
+    job_queue = get_job_queue()
+    reported_jobs = {j["id"] for j in job_queue.list_jobs() if j["status"] in FINISHED_STATES}
+
+    def report_finished_jobs():
+        """Print background jobs that finished since the last prompt"""
+        for job in job_queue.list_jobs():
+            if job["status"] in FINISHED_STATES and job["id"] not in reported_jobs:
+                reported_jobs.add(job["id"])
+                print(f"[Job {job['id']} {job['status']}] {job['description']}")
+
     try:
         while True:
-            user_input = input("User: ")
+            report_finished_jobs()
+            # Read input in a thread so background jobs keep running
+            user_input = await asyncio.to_thread(input, "User: ")
             if user_input.lower() in ["exit", "quit"]:
                 break
-            
+
             # Skip empty input
             if not user_input.strip():
                 continue
-            
-            history.add_user_message(user_input)
-            
-            # Clean history before making request
-            clean_history()
-            
-            # Use get_chat_message_content with kernel to enable auto function calling
-            response = await chat_completion.get_chat_message_content(
-                chat_history=history,
-                settings=settings,
-                kernel=kernel,
-            )
-            
-            # Only add non-empty responses to history
-            response_text = str(response).strip()
-            if response_text:
-                print(f"Assistant: {response_text}")
-                history.add_assistant_message(response_text)
-            else:
-                print("Assistant: [Task completed]")
-            
-            # Clean history after response
-            clean_history()
+
+            # Dump metrics without a round trip to the model
+            if user_input.strip() == "/metrics":
+                print(get_registry().render())
+                continue
+
+            runtime = await runtime_task
+            printer = StreamPrinter(time.perf_counter(), "stream" if stream else "complete")
+            await run_turn(runtime, runtime["history_manager"], session, user_input,
+                           on_text=printer.text, on_progress=printer.progress, stream=stream)
+            printer.finish()
     except Exception as e:
         print(f"Issue starting Chatbot: {e}")
+    finally:
+        # Write a compacted snapshot of the conversation
+        if runtime_task.done() and not runtime_task.cancelled() and runtime_task.exception() is None:
+            history_manager = runtime_task.result()["history_manager"]
+            session.checkpoint(history_manager.summary, history_manager.export_messages())
+        if job_queue.list_jobs(include_finished=False):
+            print("Cancelling unfinished background jobs...")
+        await job_queue.shutdown()
 
 def main():
-    asyncio.run(chat_with_ai())
+    parser = argparse.ArgumentParser(description="Dartinbot - AI project scaffold chatbot")
+    parser.add_argument("--resume", metavar="SESSION", help="resume a saved chat session (id or id prefix)")
+    parser.add_argument("--list-sessions", action="store_true", help="list saved chat sessions and exit")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="print each reply once it is complete instead of streaming tokens")
+    args = parser.parse_args()
+
+    if args.list_sessions:
+        for session_id in SessionStore().list_sessions():
+            print(session_id)
+        return
+
+    asyncio.run(chat_with_ai(resume=args.resume, stream=False if args.no_stream else None))
 
 if __name__ == "__main__":
     main()
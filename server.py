@@ -0,0 +1,514 @@
+"""
+Dartinbot Server - Multi-user ASGI front-end with streaming replies over WebSocket and SSE
+One process serves many sessions: one shared kernel, one history per session
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Optional
+from urllib.parse import unquote
+
+from lib.chat_runtime import build_kernel, load_history, run_turn
+from lib.metrics import CHAT_FIRST_OUTPUT_SECONDS, get_registry
+from lib.session_store import SessionStore
+from tools.job_queue import get_job_queue
+
+# Largest request body accepted (chat messages, session requests)
+MAX_BODY_BYTES = 64 * 1024
+
+SERVER_SESSIONS = get_registry().gauge(
+    "dartinbot_server_sessions", "Chat sessions held in memory by the server")
+SERVER_TURNS = get_registry().gauge(
+    "dartinbot_server_turns", "Server chat turns, by state (running, waiting)")
+SERVER_REJECTED = get_registry().counter(
+    "dartinbot_server_rejected_total", "Server chat turns turned away, by reason")
+
+
+class TurnRejected(Exception):
+    """A turn could not be admitted; carries the HTTP status to answer with"""
+
+    def __init__(self, status: int, reason: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+class LiveSession:
+    """A session's persistence and history while it is held in memory"""
+
+    def __init__(self, session, history_manager):
+        self.session = session
+        self.history_manager = history_manager
+        self.busy = False
+        # Open WebSockets hold on to this object, so it must not be evicted and reloaded under them
+        self.connections = 0
+
+
+class Turn:
+    """
+    One running chat turn and its outbound event queue
+
+    Reply text waits for room in the queue, so a slow client slows the
+    model stream down instead of growing memory. Progress events are
+    dropped when the queue is full. The turn always runs to completion,
+    even if the client goes away, so the session history stays consistent.
+    """
+
+    def __init__(self, queue_size: int):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.started_at = time.perf_counter()
+        self.first_output_s = None
+        self.detached = False
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def _first_output(self):
+        if self.first_output_s is None:
+            self.first_output_s = time.perf_counter() - self.started_at
+            CHAT_FIRST_OUTPUT_SECONDS.observe(self.first_output_s, mode="server")
+
+    async def text(self, text: str):
+        """Reply text from the model stream"""
+        if self.detached:
+            return
+        self._first_output()
+        await self.queue.put({"type": "token", "text": text})
+
+    def progress(self, event: Dict):
+        """Progress event; tools may report from worker threads"""
+        self.loop.call_soon_threadsafe(self._offer, {"type": "progress", **event})
+
+    def _offer(self, item: Dict):
+        if self.detached:
+            return
+        self._first_output()
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def detach(self):
+        """The client is gone: stop queueing output and unblock the producer"""
+        self.detached = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def events(self) -> AsyncIterator[Dict]:
+        """Events as they arrive, ending with done or error"""
+        while True:
+            getter = asyncio.ensure_future(self.queue.get())
+            done, _ = await asyncio.wait({getter, self.task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            while not self.queue.empty():
+                yield self.queue.get_nowait()
+            break
+
+        error = self.task.exception()
+        if error is not None:
+            yield {"type": "error", "message": str(error)}
+        else:
+            yield {"type": "done", "reply": self.task.result(), "dropped_events": self.dropped}
+
+
+class ChatServer:
+    """
+    ASGI application serving chat sessions
+
+    Routes:
+        GET  /health                          Liveness and load
+        GET  /metrics                         Prometheus metrics
+        POST /sessions                        Create, or resume with {"session_id": ...}
+        POST /sessions/{id}/messages          Run a turn; SSE with Accept: text/event-stream, else JSON
+        WS   /sessions/{id}/ws                Send {"message": ...}, receive token/progress/done events
+
+    Backpressure: at most max_turns turns run at once and max_waiting wait
+    for a slot; beyond that turns are rejected with 503. A session runs one
+    turn at a time (409 while busy).
+    """
+
+    def __init__(self, store: SessionStore = None, max_turns: int = None, max_waiting: int = None,
+                 max_sessions: int = None, queue_size: int = None,
+                 runtime_factory: Callable[[], Dict] = None):
+        """
+        Initialize the server
+
+        Args:
+            store: Session persistence (default: ~/semantic/.dartinbot/server_sessions,
+                kept apart from the CLI's sessions)
+            max_turns: Turns running at once (default: DARTINBOT_SERVER_MAX_TURNS or 16)
+            max_waiting: Turns waiting for a slot before new ones are rejected
+                (default: DARTINBOT_SERVER_MAX_WAITING or 64)
+            max_sessions: Idle sessions kept in memory; older ones are checkpointed
+                and reloaded on their next turn (default: DARTINBOT_SERVER_MAX_SESSIONS or 256)
+            queue_size: Events buffered per streaming response (default: DARTINBOT_SERVER_QUEUE or 256)
+            runtime_factory: Builds the shared kernel runtime (default: build_kernel)
+        """
+        self.store = store or SessionStore(Path.home() / "semantic" / ".dartinbot" / "server_sessions")
+        self.max_turns = max_turns or int(os.getenv("DARTINBOT_SERVER_MAX_TURNS", "16"))
+        self.max_waiting = max_waiting if max_waiting is not None else int(os.getenv("DARTINBOT_SERVER_MAX_WAITING", "64"))
+        self.max_sessions = max_sessions or int(os.getenv("DARTINBOT_SERVER_MAX_SESSIONS", "256"))
+        self.queue_size = queue_size or int(os.getenv("DARTINBOT_SERVER_QUEUE", "256"))
+        self.runtime_factory = runtime_factory or build_kernel
+        self.sessions: "OrderedDict[str, LiveSession]" = OrderedDict()
+        # Sessions being loaded from disk, so concurrent requests share one load
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._runtime: Optional[Dict] = None
+        self._runtime_lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = 0
+        self._waiting = 0
+
+    # -- shared state ---------------------------------------------------------
+
+    async def runtime(self) -> Dict:
+        """The shared kernel runtime, built once in a worker thread"""
+        if self._runtime is None:
+            if self._runtime_lock is None:
+                self._runtime_lock = asyncio.Lock()
+            async with self._runtime_lock:
+                if self._runtime is None:
+                    self._runtime = await asyncio.to_thread(self.runtime_factory)
+        return self._runtime
+
+    async def open_session(self, session_id: str = None, create: bool = False) -> Optional[LiveSession]:
+        """
+        Get a session into memory
+
+        Session ids are the only credential a client has, so they are random
+        and must be given in full (no prefix matching).
+
+        Args:
+            session_id: Session id
+            create: Create a new session (session_id is ignored)
+
+        Returns:
+            The live session, or None if no session has this id
+        """
+        if create:
+            return await self._load(self.store.create_session(secrets.token_hex(16)), resume=False)
+
+        live = self.sessions.get(session_id)
+        if live is not None:
+            self.sessions.move_to_end(session_id)
+            return live
+        loading = self._loading.get(session_id)
+        if loading is None:
+            session = self.store.open_session(session_id, exact=True)
+            if session is None:
+                return None
+            loading = asyncio.ensure_future(self._load(session, resume=True))
+            self._loading[session_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(session_id, None))
+        # Shielded: a client going away must not cancel a load other requests wait for
+        return await asyncio.shield(loading)
+
+    async def _load(self, session, resume: bool) -> LiveSession:
+        history_manager = await asyncio.to_thread(load_history, session, resume)
+        live = self.sessions.get(session.session_id)
+        if live is None:
+            live = LiveSession(session, history_manager)
+            self.sessions[session.session_id] = live
+            self._evict()
+        return live
+
+    def _evict(self):
+        """Checkpoint and drop the least recently used idle sessions without an open WebSocket"""
+        # The most recently used session is the one being opened: never drop it from under its caller
+        for session_id in list(self.sessions)[:-1]:
+            if len(self.sessions) <= self.max_sessions:
+                break
+            live = self.sessions[session_id]
+            if live.busy or live.connections:
+                continue
+            live.session.checkpoint(live.history_manager.summary, live.history_manager.export_messages())
+            del self.sessions[session_id]
+        SERVER_SESSIONS.set(len(self.sessions))
+
+    def _publish_load(self):
+        SERVER_TURNS.set(self._running, state="running")
+        SERVER_TURNS.set(self._waiting, state="waiting")
+
+    # -- turns ----------------------------------------------------------------
+
+    async def start_turn(self, live: LiveSession, message: str, stream: bool = True) -> Turn:
+        """
+        Admit and start a turn
+
+        Raises:
+            TurnRejected: The session already has a turn running, or the server is saturated
+        """
+        if live.busy:
+            SERVER_REJECTED.inc(reason="session_busy")
+            raise TurnRejected(409, "session_busy", "A turn is already running in this session")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_turns)
+        if self._running + self._waiting >= self.max_turns + self.max_waiting:
+            SERVER_REJECTED.inc(reason="overloaded")
+            raise TurnRejected(503, "overloaded", "Server is at capacity, retry shortly")
+
+        live.busy = True
+        self._waiting += 1
+        self._publish_load()
+        turn = Turn(self.queue_size)
+        turn.task = asyncio.ensure_future(self._run_turn(live, turn, message, stream))
+        return turn
+
+    async def _run_turn(self, live: LiveSession, turn: Turn, message: str, stream: bool) -> str:
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            live.busy = False
+            raise
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        self._publish_load()
+        try:
+            runtime = await self.runtime()
+            if live.session.meta.get("model") != runtime["model"]:
+                live.session.set_meta(model=runtime["model"])
+            return await run_turn(runtime, live.history_manager, live.session, message,
+                                  on_text=turn.text, on_progress=turn.progress, stream=stream)
+        finally:
+            self._running -= 1
+            self._slots.release()
+            self._publish_load()
+            live.busy = False
+
+    async def shutdown(self):
+        """Checkpoint every session in memory and stop background jobs"""
+        for live in self.sessions.values():
+            live.session.checkpoint(live.history_manager.summary, live.history_manager.export_messages())
+        await get_job_queue().shutdown()
+
+    # -- ASGI -----------------------------------------------------------------
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Warm the kernel so the first turn does not pay for the imports
+                asyncio.ensure_future(self.runtime())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _route(self, path: str) -> tuple:
+        """Split /sessions/{id}/{action} into (session id, action)"""
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if len(parts) == 3 and parts[0] == "sessions":
+            return parts[1], parts[2]
+        return None, None
+
+    async def _http(self, scope: Dict, receive: Callable, send: Callable):
+        method, path = scope["method"], scope["path"]
+        if method == "GET" and path == "/health":
+            await _send_json(send, 200, {
+                "status": "ok", "sessions": len(self.sessions),
+                "running": self._running, "waiting": self._waiting
+            })
+            return
+        if method == "GET" and path == "/metrics":
+            await _send_body(send, 200, get_registry().render().encode("utf-8"),
+                             "text/plain; version=0.0.4; charset=utf-8")
+            return
+        if method != "POST":
+            await _send_json(send, 404, {"error": "Not found"})
+            return
+
+        try:
+            body = await _read_json(receive)
+        except ValueError as e:
+            await _send_json(send, 400, {"error": str(e)})
+            return
+
+        if path == "/sessions":
+            resume = body.get("session_id")
+            live = await self.open_session(resume, create=not resume)
+            if live is None:
+                await _send_json(send, 404, {"error": f"No session found with id: {resume}"})
+                return
+            await _send_json(send, 200 if resume else 201, {"session_id": live.session.session_id})
+            return
+
+        session_id, action = self._route(path)
+        if action != "messages":
+            await _send_json(send, 404, {"error": "Not found"})
+            return
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            await _send_json(send, 400, {"error": "'message' must be a non-empty string"})
+            return
+        live = await self.open_session(session_id)
+        if live is None:
+            await _send_json(send, 404, {"error": f"No session found with id: {session_id}"})
+            return
+        try:
+            turn = await self.start_turn(live, message, stream=bool(body.get("stream", True)))
+        except TurnRejected as e:
+            headers = [(b"retry-after", b"1")] if e.status == 503 else []
+            await _send_json(send, e.status, {"error": str(e), "reason": e.reason}, headers)
+            return
+
+        accept = dict(scope.get("headers") or []).get(b"accept", b"").decode("latin-1")
+        if "text/event-stream" in accept:
+            await self._send_sse(turn, send)
+        else:
+            # Plain JSON: wait for the whole turn, return the reply with the progress seen
+            progress, final = [], None
+            async for event in turn.events():
+                if event["type"] == "progress":
+                    progress.append(event)
+                elif event["type"] in ("done", "error"):
+                    final = event
+            status = 200 if final["type"] == "done" else 500
+            await _send_json(send, status, {**final, "progress": progress})
+
+    async def _send_sse(self, turn: Turn, send: Callable):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+        })
+        try:
+            async for event in turn.events():
+                data = json.dumps(event, ensure_ascii=False)
+                await send({
+                    "type": "http.response.body",
+                    "body": f"event: {event['type']}\ndata: {data}\n\n".encode("utf-8"),
+                    "more_body": True
+                })
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            # Client went away mid-stream; the turn finishes on its own
+            turn.detach()
+
+    async def _websocket(self, scope: Dict, receive: Callable, send: Callable):
+        session_id, action = self._route(scope["path"])
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        live = await self.open_session(session_id) if action == "ws" else None
+        if live is None:
+            await send({"type": "websocket.close", "code": 4404})
+            return
+        live.connections += 1
+        try:
+            await send({"type": "websocket.accept"})
+            await _send_ws(send, {"type": "session", "session_id": live.session.session_id})
+            await self._websocket_turns(live, receive, send)
+        finally:
+            live.connections -= 1
+            self._evict()
+
+    async def _websocket_turns(self, live: LiveSession, receive: Callable, send: Callable):
+        """Run the turns a WebSocket client sends until it disconnects"""
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            try:
+                request = json.loads(message.get("text") or message.get("bytes") or "")
+                text = request["message"]
+                if not isinstance(text, str) or not text.strip():
+                    raise ValueError
+            except (ValueError, KeyError, TypeError):
+                await _send_ws(send, {"type": "error", "message": "Expected {\"message\": \"...\"}"})
+                continue
+            try:
+                turn = await self.start_turn(live, text, stream=bool(request.get("stream", True)))
+            except TurnRejected as e:
+                await _send_ws(send, {"type": "error", "status": e.status, "reason": e.reason, "message": str(e)})
+                continue
+            try:
+                async for event in turn.events():
+                    await _send_ws(send, event)
+            except OSError:
+                turn.detach()
+                return
+
+
+async def _read_json(receive: Callable) -> Dict:
+    """Read a JSON object request body (empty body -> {})"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ValueError("Client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError(f"Request body larger than {MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    raw = b"".join(chunks)
+    if not raw.strip():
+        return {}
+    try:
+        body = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from None
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    return body
+
+
+async def _send_body(send: Callable, status: int, body: bytes, content_type: str, headers: list = ()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode("latin-1")),
+                    (b"content-length", str(len(body)).encode("latin-1")), *headers]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send: Callable, status: int, payload: Dict, headers: list = ()):
+    await _send_body(send, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                     "application/json", headers)
+
+
+async def _send_ws(send: Callable, payload: Dict):
+    await send({"type": "websocket.send", "text": json.dumps(payload, ensure_ascii=False)})
+
+
+# ASGI entry point: uvicorn server:app
+app = ChatServer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dartinbot - multi-user chat server")
+    parser.add_argument("--host", default=os.getenv("DARTINBOT_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DARTINBOT_SERVER_PORT", "8000")))
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("Server mode needs an ASGI server: pip install uvicorn")
+        return
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+from semantic_kernel.functions import kernel_function
+
+from lib.anthropic_scheduler import BACKGROUND, request_priority
+from lib.lazy_plugin import LazyInstance
+from lib.log_client import logClient
+from tools.job_queue import FINISHED_STATES, get_job_queue
+from tools.scaffold_generator import ProjectScaffold
+from tools.source_control import ProjectSourceControl
+
+class BackgroundJobs:
+    """
+    Runs scaffold generation and project updates in the background
+    so the chat can continue while they finish
+    """
+    def __init__(self, ):
+        self.logger = logClient(__name__)
+        self.job_queue = get_job_queue()
+        # Clients are built by the first job that needs them and then shared
+        self.scaffolder = LazyInstance(ProjectScaffold)
+        self.source_control = LazyInstance(ProjectSourceControl)
+        self.job_queue.register_handler("scaffold", self._run_scaffold)
+        self.job_queue.register_handler("update", self._run_update)
+        self.job_queue.register_handler("batch_update", self._run_batch_update)
+
+    def _run_scaffold(self, query: str) -> str:
+        # Background generations yield Claude capacity to interactive requests
+        with request_priority(BACKGROUND):
+            return self.scaffolder.get().generate_scaffold(query)
+
+    def _run_update(self, repo_name: str, user_query: str) -> str:
+        with request_priority(BACKGROUND):
+            return self.source_control.get().run_project_update(repo_name, user_query)
+
+    def _run_batch_update(self, user_query: str, selector: str) -> str:
+        with request_priority(BACKGROUND):
+            return self.source_control.get().run_batch_update(user_query, selector)
+
+    def _format_job(self, job: dict) -> str:
+        summary = f"**Job {job['id']}** ({job['kind']}) - {job['status']}\n"
+        summary += f"  - Task: {job['description']}\n"
+        summary += f"  - Created: {job['created_at']}\n"
+        if job.get('started_at'):
+            summary += f"  - Started: {job['started_at']}\n"
+        if job.get('cancel_requested') and job['status'] not in FINISHED_STATES:
+            summary += "  - Cancellation requested; stops before its next commit or PR\n"
+        if job.get('finished_at'):
+            summary += f"  - Finished: {job['finished_at']}\n"
+        if job.get('error'):
+            summary += f"  - Error: {job['error']}\n"
+        if job.get('log_path'):
+            summary += f"  - Output: {job['log_path']}\n"
+        if job.get('result'):
+            summary += f"  - Result: {str(job['result']).strip()}\n"
+        return summary
+
+    @kernel_function(
+            description="Start generating a new project scaffold (and committing it to GitHub) as a background job. Returns a job ID immediately so the conversation can continue. Prefer this over generate_scaffold."
+    )
+    async def start_scaffold_job(self, query: str) -> str:
+        """Queue scaffold generation and return the job ID"""
+        logger = self.logger
+        job_id = self.job_queue.submit(
+            "scaffold",
+            {"query": query},
+            description=f"Generate scaffold: {query[:80]}"
+        )
+        logger.info(f"Queued scaffold job {job_id}")
+        return f"Started scaffold generation as background job **{job_id}**. Use get_job_status to check progress."
+
+    @kernel_function(
+            description="Start an AI update of an existing project (changes, feature branch and pull request) as a background job. Returns a job ID immediately so the conversation can continue. Prefer this over update_project_ai."
+    )
+    async def start_update_job(self, repo_name: str, user_query: str) -> str:
+        """Queue a project update and return the job ID"""
+        logger = self.logger
+        job_id = self.job_queue.submit(
+            "update",
+            {"repo_name": repo_name, "user_query": user_query},
+            description=f"Update {repo_name}: {user_query[:80]}"
+        )
+        logger.info(f"Queued update job {job_id} for {repo_name}")
+        return f"Started update of '{repo_name}' as background job **{job_id}**. Use get_job_status to check progress."
+
+    @kernel_function(
+            description="Start the same AI update on many projects (a pull request per project) as one background job. selector is 'all', comma-separated repository names or globs, or 'search:<query>'. Returns a job ID immediately; the job result lists every PR URL and failure."
+    )
+    async def start_batch_update_job(self, user_query: str, selector: str = "all") -> str:
+        """Queue a batch update and return the job ID"""
+        logger = self.logger
+        job_id = self.job_queue.submit(
+            "batch_update",
+            {"user_query": user_query, "selector": selector},
+            description=f"Batch update {selector}: {user_query[:80]}"
+        )
+        logger.info(f"Queued batch update job {job_id} for {selector}")
+        return f"Started batch update of '{selector}' as background job **{job_id}**. Use get_job_status to check progress."
+
+    @kernel_function(
+            description="Get the status and result of a background job by job ID"
+    )
+    async def get_job_status(self, job_id: str) -> str:
+        """Report the state of a single job"""
+        job = self.job_queue.get_job(job_id)
+        if job is None:
+            return f"No job found with ID: {job_id}"
+        return self._format_job(job)
+
+    @kernel_function(
+            description="List background jobs. Set active_only to true to show only queued and running jobs."
+    )
+    async def list_jobs(self, active_only: bool = False) -> str:
+        """List known jobs"""
+        jobs = self.job_queue.list_jobs(include_finished=not active_only)
+        if not jobs:
+            return "No background jobs found."
+        return f"{len(jobs)} job(s):\n\n" + "\n".join(self._format_job(j) for j in jobs[:20])
+
+    @kernel_function(
+            description="Cancel a queued or running background job by job ID"
+    )
+    async def cancel_job(self, job_id: str) -> str:
+        """Cancel a job"""
+        logger = self.logger
+        job = self.job_queue.get_job(job_id)
+        if job is None:
+            return f"No job found with ID: {job_id}"
+        if job["status"] in FINISHED_STATES:
+            return f"Job {job['id']} already finished with status: {job['status']}"
+        if not self.job_queue.cancel(job["id"]):
+            return f"Could not cancel job {job['id']}"
+        if job["status"] in FINISHED_STATES:
+            logger.info(f"Cancelled job {job['id']}")
+            return f"Cancelled job {job['id']}"
+        logger.info(f"Requested cancellation of running job {job['id']}")
+        return (f"Cancellation requested for job {job['id']}. It is still running and stops before its "
+                f"next commit or pull request; use get_job_status to see when it has stopped.")
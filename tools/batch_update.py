@@ -0,0 +1,203 @@
+"""
+Batch Update - Apply one update request to many projects at once
+Projects are updated side by side with bounded concurrency and reported together: a PR URL per project or the reason it failed
+"""
+import contextvars
+import fnmatch
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+from lib.anthropic_scheduler import BACKGROUND, request_priority
+from lib.cancellation import check_cancelled
+from lib.metrics import get_registry
+from lib.progress import emit
+
+BATCH_UPDATE_PROJECTS = get_registry().counter(
+    "dartinbot_batch_update_projects_total", "Projects processed by batch updates, by outcome")
+
+
+def select_projects(project_db, selector: str) -> Tuple[List[Dict], List[str]]:
+    """
+    Active projects a batch selector refers to
+
+    Selectors:
+        "all" / "*" (or empty): every active project
+        "search:<query>": projects matching a project search
+        comma-separated repository names or globs, e.g. "api-*, web-frontend"
+
+    Args:
+        project_db: Project database
+        selector: Which projects to update
+
+    Returns:
+        Tuple of (projects, names or globs that matched no active project)
+    """
+    selector = (selector or "").strip()
+    active = project_db.list_active_projects()
+    if selector.lower() in ("", "all", "*"):
+        return active, []
+    if selector.lower().startswith("search:"):
+        active_uuids = {p["uuid"] for p in active}
+        return [p for p in project_db.search_projects(selector[7:].strip()) if p["uuid"] in active_uuids], []
+
+    selected, unmatched = [], []
+    for pattern in (part.strip() for part in selector.split(",")):
+        if not pattern:
+            continue
+        matches = [p for p in active if fnmatch.fnmatchcase(p["repo_name"].lower(), pattern.lower())]
+        if not matches:
+            unmatched.append(pattern)
+        selected.extend(p for p in matches if p not in selected)
+    return selected, unmatched
+
+
+class BatchUpdater:
+    """
+    Runs one user request against a set of projects
+
+    At most max_parallel projects are in progress at once. Within that,
+    Claude streams and GitHub calls still go through the shared schedulers
+    (DARTINBOT_ANTHROPIC_CONCURRENCY, DARTINBOT_GITHUB_CONCURRENCY), and run
+    at background priority so the chat stays responsive. Every project's
+    prompt starts with the same update instructions, sent as a cached
+    prefix; warm_fn writes that prefix to the cache once before the
+    projects start, so they all read it rather than each writing a copy.
+    """
+
+    def __init__(self, update_fn: Callable[..., Dict], project_db, max_parallel: int = None,
+                 warm_fn: Callable[[], bool] = None):
+        """
+        Initialize the updater
+
+        Args:
+            update_fn: ProjectSourceControl.update_project (or a stand-in with its signature)
+            project_db: Project database used to resolve selectors
+            max_parallel: Projects updated at once (default: DARTINBOT_BATCH_CONCURRENCY or 4)
+            warm_fn: Caches the shared prompt prefix (ProjectSourceControl.warm_update_prompt)
+        """
+        self.update_fn = update_fn
+        self.project_db = project_db
+        self.max_parallel = max(1, max_parallel or int(os.getenv("DARTINBOT_BATCH_CONCURRENCY", "4")))
+        self.warm_fn = warm_fn
+
+    def run(self, user_query: str, selector: str = "all") -> Dict:
+        """
+        Update every selected project
+
+        Args:
+            user_query: Change to make in each project
+            selector: Projects to update (see select_projects)
+
+        Returns:
+            Report dict with query, selector, total, succeeded (PR per project),
+            partial (branch pushed, PR failed), failed, unmatched and elapsed_s
+        """
+        start = time.perf_counter()
+        projects, unmatched = select_projects(self.project_db, selector)
+        report = {
+            "query": user_query,
+            "selector": selector,
+            "total": len(projects),
+            "succeeded": [],
+            "partial": [],
+            "failed": [],
+            "unmatched": unmatched,
+        }
+        emit("batch_started", total=len(projects), parallel=min(self.max_parallel, len(projects)))
+        if self.warm_fn is not None and len(projects) > 1 and self.max_parallel > 1:
+            self._warm()
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="dartinbot-batch") as executor:
+            # Each project gets its own copy of the caller's context (progress listener, span)
+            futures = {
+                executor.submit(contextvars.copy_context().run, self._update_one, project, user_query): project
+                for project in projects
+            }
+            for future in as_completed(futures):
+                outcome, entry = future.result()
+                report[outcome].append(entry)
+                done = len(report["succeeded"]) + len(report["partial"]) + len(report["failed"])
+                emit("batch_progress", repo=entry["repo"], status=outcome, done=done, total=len(projects))
+
+        for key in ("succeeded", "partial", "failed"):
+            report[key].sort(key=lambda entry: entry["repo"])
+        report["elapsed_s"] = round(time.perf_counter() - start, 1)
+        return report
+
+    def _warm(self):
+        """Cache the shared prompt prefix; a failure only costs cache misses"""
+        try:
+            with request_priority(BACKGROUND):
+                self.warm_fn()
+        except Exception:
+            pass
+
+    def _update_one(self, project: Dict, user_query: str) -> Tuple[str, Dict]:
+        """Update one project; never raises, so one failure does not stop the batch"""
+        repo_name = project["repo_name"]
+        check_cancelled(f"updating {repo_name}")
+        try:
+            with request_priority(BACKGROUND):
+                result = self.update_fn(
+                    project_root_path=project["local_path"],
+                    repo_name=repo_name,
+                    user_query=user_query,
+                    share_prompt_prefix=True
+                )
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+
+        status = result.get("status")
+        if status == "success":
+            outcome = "succeeded"
+            entry = {"repo": repo_name, "pr_number": result["pr_number"], "pr_url": result["pr_url"],
+                     "changes": result["changes"], "summary": result.get("message", "")}
+        elif status == "partial":
+            outcome = "partial"
+            entry = {"repo": repo_name, "feature_branch": result.get("feature_branch"),
+                     "error": result.get("message", "")}
+        else:
+            outcome = "failed"
+            entry = {"repo": repo_name, "error": result.get("message", "Unknown error")}
+        BATCH_UPDATE_PROJECTS.inc(outcome=outcome)
+        return outcome, entry
+
+
+def format_report(report: Dict) -> str:
+    """
+    Batch report as text for the LLM
+
+    Args:
+        report: BatchUpdater.run output
+
+    Returns:
+        Formatted report
+    """
+    if not report["total"]:
+        response = f"No active projects matched '{report['selector']}'."
+        if report["unmatched"]:
+            response += f" Not found: {', '.join(report['unmatched'])}."
+        return response + " Use list_projects() to see available projects."
+
+    response = (f"Batch update of {report['total']} project(s) finished in {report['elapsed_s']}s: "
+                f"{len(report['succeeded'])} succeeded, {len(report['partial'])} partial, "
+                f"{len(report['failed'])} failed\n\n**Request**: {report['query']}\n")
+    if report["succeeded"]:
+        response += "\n**Pull Requests Created**:\n"
+        for entry in report["succeeded"]:
+            changes = entry["changes"]
+            response += (f"- {entry['repo']}: PR #{entry['pr_number']} {entry['pr_url']} "
+                         f"({changes['modified']} modified, {changes['added']} added, {changes['deleted']} deleted)\n")
+    if report["partial"]:
+        response += "\n**Branch Pushed, PR Failed** (create the PR manually):\n"
+        for entry in report["partial"]:
+            response += f"- {entry['repo']}: branch {entry['feature_branch']} - {entry['error']}\n"
+    if report["failed"]:
+        response += "\n**Failed**:\n"
+        for entry in report["failed"]:
+            response += f"- {entry['repo']}: {entry['error']}\n"
+    if report["unmatched"]:
+        response += f"\n**Not found**: {', '.join(report['unmatched'])}\n"
+    return response
@@ -0,0 +1,329 @@
+"""
+Blob Store - Content-addressed file store shared by every generated project
+Identical files (LICENSE, .gitignore, Dockerfile, config boilerplate) are stored once and linked into each project
+"""
+import errno
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+
+from lib.metrics import get_registry
+
+LINK_MODES = ("auto", "reflink", "hardlink", "copy", "off")
+
+# ioctl(FICLONE): share the blob's extents with a new file (btrfs, XFS); writes then copy on write
+_FICLONE = 0x40049409
+
+BLOB_WRITES = get_registry().counter(
+    "dartinbot_blob_writes_total", "Project files written through the blob store, by how they were materialized")
+BLOB_DEDUP_BYTES = get_registry().counter(
+    "dartinbot_blob_dedup_bytes_total", "Bytes not written because an identical blob was already stored")
+
+
+def content_hash(data: bytes) -> str:
+    """SHA256 of file content; the same hash the change detector records in snapshots"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """
+    Stores file contents once under their SHA256 and materializes project
+    files from them
+
+    By default project files are reflinks (btrfs, XFS): independent, writable
+    inodes that share the blob's extents until one of them is written, so
+    they can be edited in place without touching the blob or any other
+    project. Where reflinks are not supported, files are written plainly and
+    no blob is kept (it would only be one more full copy); deduplication then
+    needs hardlink mode.
+
+    Hardlinks (mode "hardlink") are an explicit opt-in: the file is the blob's
+    inode, so an in-place edit changes the blob and every project linked to
+    it. Writes through the store never modify a file in place (they rename a
+    new file over the old one), but other tools and editors may.
+    """
+
+    def __init__(self, root: str = None, mode: str = None):
+        """
+        Initialize the store
+
+        Args:
+            root: Store directory (default: DARTINBOT_BLOB_DIR or ~/semantic/.dartinbot/blobs);
+                hardlinks need it on the same filesystem as the projects
+            mode: auto (reflink, else plain files), reflink, hardlink, copy (plain
+                files, replaced atomically) or off (default: DARTINBOT_BLOB_STORE or auto)
+        """
+        if root is None:
+            root = os.getenv("DARTINBOT_BLOB_DIR") or Path.home() / "semantic" / ".dartinbot" / "blobs"
+        self.root = Path(root)
+        self.mode = (mode or os.getenv("DARTINBOT_BLOB_STORE", "auto")).lower()
+        if self.mode not in LINK_MODES:
+            raise ValueError(f"Unknown blob store mode '{self.mode}' (expected one of {', '.join(LINK_MODES)})")
+        self.objects = self.root / "objects"
+        if self.enabled:
+            self.objects.mkdir(parents=True, exist_ok=True)
+        # (st_dev, st_ino) -> (hash, st_mtime_ns) for every stored blob, built on first use
+        self._inodes: Optional[Dict[Tuple[int, int], Tuple[str, int]]] = None
+        # None until the first write finds out whether the filesystem supports reflinks
+        self._reflink_ok = None if self.mode in ("auto", "reflink") else False
+        self._hardlink_ok = self.mode == "hardlink"
+        self._lock = threading.Lock()
+        # Held by writes and garbage collection, so a blob cannot vanish between put and link
+        self._store_lock = threading.RLock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def path(self, digest: str) -> Path:
+        """Location of a blob"""
+        return self.objects / digest[:2] / digest[2:]
+
+    # -- storing --------------------------------------------------------------
+
+    def put(self, data: bytes) -> str:
+        """
+        Store content unless an identical blob exists
+
+        Args:
+            data: File content
+
+        Returns:
+            The content's SHA256
+        """
+        digest = content_hash(data)
+        blob = self.path(digest)
+        if blob.exists():
+            BLOB_DEDUP_BYTES.inc(len(data))
+            return digest
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # In hardlink mode the blob is a project file as well, so give it normal permissions;
+            # otherwise it lives only in the store and is kept read-only
+            os.chmod(tmp_path, 0o644 if self.mode == "hardlink" else 0o444)
+            # Concurrent writers of the same content race harmlessly: both blobs are identical
+            os.replace(tmp_path, blob)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._index(blob, digest)
+        return digest
+
+    def _index(self, blob: Path, digest: str):
+        st = blob.stat()
+        with self._lock:
+            if self._inodes is not None:
+                self._inodes[(st.st_dev, st.st_ino)] = (digest, st.st_mtime_ns)
+
+    def _load_index(self) -> Dict[Tuple[int, int], Tuple[str, int]]:
+        if self._inodes is None:
+            with self._lock:
+                if self._inodes is None:
+                    inodes = {}
+                    if self.objects.is_dir():
+                        for prefix in os.scandir(self.objects):
+                            if not prefix.is_dir():
+                                continue
+                            for entry in os.scandir(prefix.path):
+                                if entry.name.startswith(".tmp-"):
+                                    continue
+                                st = entry.stat()
+                                inodes[(st.st_dev, st.st_ino)] = (prefix.name + entry.name, st.st_mtime_ns)
+                    self._inodes = inodes
+        return self._inodes
+
+    # -- materializing ----------------------------------------------------------
+
+    def write(self, file_path: str, content: Union[str, bytes]) -> str:
+        """
+        Write a project file through the store
+
+        Replaces the file atomically (never in place), so other projects
+        linked to the previous content are unaffected. A file already linked
+        to the same blob is left alone: no write I/O at all.
+
+        Args:
+            file_path: Destination path; parent directories must exist
+            content: File content (str is encoded as UTF-8)
+
+        Returns:
+            The content's SHA256
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        if not self.enabled:
+            with open(file_path, "wb") as f:
+                f.write(data)
+            return content_hash(data)
+
+        with self._store_lock:
+            linkable = self._can_link(file_path)
+        if not linkable:
+            # Nothing to share blocks with: a stored blob would only be a second copy
+            self._replace(file_path, lambda tmp_path: self._copy(data, tmp_path))
+            BLOB_WRITES.inc(how="copy")
+            return content_hash(data)
+
+        with self._store_lock:
+            digest = self.put(data)
+            blob = self.path(digest)
+            try:
+                if os.path.samefile(blob, file_path):
+                    BLOB_WRITES.inc(how="unchanged")
+                    return digest
+            except OSError:
+                pass
+
+            how = self._replace(file_path, lambda tmp_path: self._materialize(blob, data, tmp_path))
+        BLOB_WRITES.inc(how=how)
+        return digest
+
+    @staticmethod
+    def _replace(file_path: str, create: Callable[[str], str]) -> str:
+        """Create the new file next to file_path with create(tmp_path), then rename it over file_path"""
+        directory = os.path.dirname(os.path.abspath(file_path))
+        tmp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            how = create(tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return how
+
+    @staticmethod
+    def _copy(data: bytes, tmp_path: str) -> str:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return "copy"
+
+    def _can_link(self, file_path: str) -> bool:
+        """Whether project files can share the blob's storage (reflink or hardlink)"""
+        if self._reflink_ok is None:
+            self._reflink_ok = self._probe_reflink(os.path.dirname(os.path.abspath(file_path)))
+            if not self._reflink_ok and self.mode == "reflink":
+                print("Blob store cannot reflink on this filesystem; writing plain files instead")
+        return self._reflink_ok or self._hardlink_ok
+
+    def _probe_reflink(self, directory: str) -> bool:
+        """Try to reflink a one-byte file from the store into directory"""
+        self.objects.mkdir(parents=True, exist_ok=True)
+        src_fd, src_path = tempfile.mkstemp(dir=self.objects, prefix=".tmp-")
+        dst_fd, dst_path = tempfile.mkstemp(dir=directory, prefix=".reflink-probe-")
+        try:
+            os.write(src_fd, b"\0")
+            import fcntl
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+            return True
+        except (ImportError, OSError):
+            return False
+        finally:
+            for fd, path in ((src_fd, src_path), (dst_fd, dst_path)):
+                os.close(fd)
+                os.remove(path)
+
+    def _materialize(self, blob: Path, data: bytes, tmp_path: str) -> str:
+        """Create tmp_path with the blob's content; returns reflink, hardlink or copy"""
+        if self._reflink_ok:
+            try:
+                import fcntl
+                with open(blob, "rb") as src, open(tmp_path, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return "reflink"
+            except (ImportError, OSError):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                # Not supported by this filesystem: stop trying for this process
+                self._reflink_ok = False
+        if self._hardlink_ok:
+            try:
+                os.link(blob, tmp_path)
+                return "hardlink"
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+                if e.errno != errno.EMLINK:
+                    print(f"Blob store cannot hardlink into {os.path.dirname(tmp_path)} ({e}); copying files instead")
+                    self._hardlink_ok = False
+        return self._copy(data, tmp_path)
+
+    # -- reading ----------------------------------------------------------------
+
+    def known_hash(self, st: os.stat_result) -> Optional[str]:
+        """
+        Hash of a file that is a hardlink to a stored blob, without reading it
+
+        The store never modifies a blob in place; the mtime check catches a
+        hardlinked file edited in place by someone else, in which case the
+        file is simply hashed again.
+
+        Args:
+            st: os.stat() of the file
+
+        Returns:
+            The blob's SHA256, or None if the file has to be hashed
+        """
+        if not self.enabled or st.st_nlink < 2:
+            return None
+        entry = self._load_index().get((st.st_dev, st.st_ino))
+        if entry is None or entry[1] != st.st_mtime_ns:
+            return None
+        return entry[0]
+
+    def collect_garbage(self, referenced: Set[str]) -> int:
+        """
+        Remove blobs nothing refers to any more
+
+        A blob is kept while a stored snapshot refers to its hash (the
+        snapshot history diffs old versions from their blobs) or while a
+        project file is hardlinked to it. Reflinked and copied files do not
+        depend on their blob, so the link count alone says nothing about use.
+
+        Args:
+            referenced: Every hash in the stored snapshots and snapshot histories
+
+        Returns:
+            Number of blobs removed
+        """
+        removed = 0
+        if not self.objects.is_dir():
+            return removed
+        with self._store_lock:
+            for prefix in os.scandir(self.objects):
+                if not prefix.is_dir():
+                    continue
+                for entry in os.scandir(prefix.path):
+                    if entry.name.startswith(".tmp-") or prefix.name + entry.name in referenced:
+                        continue
+                    st = entry.stat()
+                    if st.st_nlink > 1:
+                        continue
+                    os.remove(entry.path)
+                    removed += 1
+                    with self._lock:
+                        if self._inodes is not None:
+                            self._inodes.pop((st.st_dev, st.st_ino), None)
+        return removed
+
+
+# Global instance for easy access
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Get the global blob store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore()
+    return _store
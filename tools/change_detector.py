@@ -6,24 +6,38 @@ import os
 import hashlib
 import json
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
 from github import Github
 
+from lib.github_calls import github_call
+from lib.tracing import span, traced
+from tools.blob_store import get_blob_store
+from tools.git_mirror import GitMirror, GitError, GitRemote, git_mirror_enabled
+from tools.remote_state import RemoteStateFetcher
+from tools.repo_cache import RepoMetadataCache, get_repo_cache
+from tools.snapshot_history import get_snapshot_history
+from tools.snapshots import Snapshot, load_snapshot, store_snapshot
+
 
 class ChangeDetector:
     """Detects changes in local files and GitHub repositories"""
     
-    def __init__(self, gh_client: Github, project_db):
+    def __init__(self, gh_client: Github, project_db, repo_cache: RepoMetadataCache = None):
         """
         Initialize change detector
         
         Args:
             gh_client: Authenticated GitHub client
             project_db: Project database instance
+            repo_cache: Repo metadata cache (default: the process-wide one)
         """
         self.gh_client = gh_client
         self.project_db = project_db
+        self.repo_cache = repo_cache or get_repo_cache(gh_client)
+        self.remote_state = RemoteStateFetcher(gh_client, self.repo_cache)
+        # Optional local bare mirrors (DARTINBOT_GIT_MIRROR=1); the API is the fallback
+        self.mirror = GitMirror(GitRemote(owner=lambda: self.repo_cache.user.login)) if git_mirror_enabled() else None
     
     def compute_file_hash(self, file_path: str) -> str:
         """Compute SHA256 hash of a file"""
@@ -49,6 +63,9 @@ class ChangeDetector:
         if not os.path.exists(project_root):
             return files_info
         
+        # Files hardlinked from the blob store already carry their hash
+        blob_store = get_blob_store()
+        
         for root, dirs, files in os.walk(project_root):
             # Skip hidden directories and common ignore patterns
             dirs[:] = [d for d in dirs if not d.startswith('.') and d not in [
@@ -66,7 +83,7 @@ class ChangeDetector:
                 try:
                     stat_info = os.stat(file_path)
                     files_info[relative_path] = {
-                        'hash': self.compute_file_hash(file_path),
+                        'hash': blob_store.known_hash(stat_info) or self.compute_file_hash(file_path),
                         'size': stat_info.st_size,
                         'mtime': stat_info.st_mtime,
                         'mtime_iso': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
@@ -76,32 +93,76 @@ class ChangeDetector:
         
         return files_info
     
-    def get_github_files(self, repo_name: str, branch: str = "main") -> Dict[str, Dict]:
+    def fetch_remote_state(self, repo_names: List[str], since: Dict[str, str] = None, max_commits: int = 10,
+                           include_tree: bool = True) -> Dict[str, Dict]:
+        """
+        Head, new commits and file tree for several repos, from the local
+        mirrors when enabled and otherwise from batched GraphQL queries
+        
+        Args:
+            repo_names: Repository names
+            since: Map of repo name to the last known commit SHA
+            max_commits: Maximum commits returned per repo
+            include_tree: Fetch file listings as well
+            
+        Returns:
+            Dict mapping repo name to state (see RemoteStateFetcher.fetch); failures carry 'error'
+        """
+        since = since or {}
+        states = {}
+        
+        if self.mirror is not None:
+            for repo_name in repo_names:
+                state = self.mirror.state(repo_name, since.get(repo_name), max_commits, include_tree)
+                if 'error' not in state:
+                    states[repo_name] = state
+        
+        remaining = [name for name in repo_names if name not in states]
+        if remaining:
+            try:
+                states.update(self.remote_state.fetch(remaining, since=since, max_commits=max_commits,
+                                                      include_tree=include_tree))
+            except Exception as e:
+                print(f"Error fetching GitHub state: {e}")
+                states.update({name: {'error': str(e)} for name in remaining})
+        return states
+    
+    def get_github_files(self, repo_name: str, branch: str = None) -> Dict[str, Dict]:
         """
         Get all files from a GitHub repository
         
         Args:
             repo_name: Repository name
-            branch: Branch name (default: main)
+            branch: Branch name (default: the repo's default branch)
             
         Returns:
             Dict mapping paths to file info (sha, size)
         """
         files_info = {}
         
+        if branch is None:
+            # Default branch: the mirror or the batched GraphQL state carries the whole tree
+            state = self.fetch_remote_state([repo_name], max_commits=0)[repo_name]
+            if 'error' in state:
+                print(f"Could not get tree for {repo_name}: {state['error']}")
+                return files_info
+            return state['files']
+        
+        if self.mirror is not None and self.mirror.sync(repo_name):
+            try:
+                return self.mirror.files(repo_name, branch)
+            except GitError as e:
+                print(f"Mirror has no branch {branch} for {repo_name}: {e}")
+        
         try:
-            user = self.gh_client.get_user()
-            repo = user.get_repo(repo_name)
+            repo = self.repo_cache.get_repo(repo_name)
             
-            # Try main first, then master
+            # The trees endpoint resolves the branch name itself, so this stays one fresh request
             try:
-                tree = repo.get_git_tree(branch, recursive=True)
-            except:
-                try:
-                    tree = repo.get_git_tree("master", recursive=True)
-                except Exception as e:
-                    print(f"Could not get tree for {repo_name}: {e}")
-                    return files_info
+                tree = github_call("get_git_tree", repo.get_git_tree, branch, recursive=True)
+            except Exception as e:
+                print(f"Could not get tree for {repo_name}: {e}")
+                return files_info
             
             for item in tree.tree:
                 if item.type == "blob":  # Only files, not directories
@@ -115,74 +176,45 @@ class ChangeDetector:
         
         return files_info
     
-    def compare_local_to_snapshot(self, project_root: str, snapshot: Dict[str, Dict]) -> Dict:
+    def compare_local_to_snapshot(self, project_root: str, snapshot: Union[Snapshot, Dict],
+                                  current_files: Dict[str, Dict] = None) -> Dict:
         """
         Compare current local files to a previous snapshot
         
         Args:
             project_root: Path to project
-            snapshot: Previous file snapshot from database
+            snapshot: Previous file snapshot (Snapshot or the stored database value)
+            current_files: Result of scan_local_files, if already computed
             
         Returns:
             Dict with added, modified, deleted, and unchanged files
         """
-        current_files = self.scan_local_files(project_root)
-        
-        added = []
-        modified = []
-        deleted = []
-        unchanged = []
-        
-        # Check for added and modified files
-        for path, info in current_files.items():
-            if path not in snapshot:
-                added.append({
-                    'path': path,
-                    'size': info['size'],
-                    'hash': info['hash']
-                })
-            elif snapshot[path]['hash'] != info['hash']:
-                modified.append({
-                    'path': path,
-                    'size': info['size'],
-                    'old_hash': snapshot[path]['hash'],
-                    'new_hash': info['hash'],
-                    'old_mtime': snapshot[path].get('mtime_iso', 'Unknown'),
-                    'new_mtime': info['mtime_iso']
-                })
-            else:
-                unchanged.append(path)
+        if current_files is None:
+            current_files = self.scan_local_files(project_root)
         
-        # Check for deleted files
-        for path in snapshot:
-            if path not in current_files:
-                deleted.append({
-                    'path': path,
-                    'old_hash': snapshot[path]['hash']
-                })
-        
-        return {
-            'added': added,
-            'modified': modified,
-            'deleted': deleted,
-            'unchanged': unchanged,
-            'total_changes': len(added) + len(modified) + len(deleted)
-        }
+        # Both sides are sorted path tables, so this is one merge-join pass
+        previous = load_snapshot(snapshot) or Snapshot()
+        return previous.diff(Snapshot.from_files(current_files))
     
-    def compare_local_to_github(self, project_root: str, repo_name: str, branch: str = "main") -> Dict:
+    def compare_local_to_github(self, project_root: str, repo_name: str, branch: str = None,
+                                local_files: Dict[str, Dict] = None, github_files: Dict[str, Dict] = None) -> Dict:
         """
         Compare local files to GitHub repository
         
         Args:
             project_root: Path to local project
             repo_name: GitHub repository name
-            branch: Branch to compare against
+            branch: Branch to compare against (default: the repo's default branch)
+            local_files: Result of scan_local_files, if already computed
+            github_files: Result of get_github_files, if already fetched
             
         Returns:
             Dict with differences between local and GitHub
         """
-        local_files = self.scan_local_files(project_root)
-        github_files = self.get_github_files(repo_name, branch)
+        if local_files is None:
+            local_files = self.scan_local_files(project_root)
+        if github_files is None:
+            github_files = self.get_github_files(repo_name, branch)
         
         only_local = []
         only_github = []
@@ -212,52 +244,29 @@ class ChangeDetector:
         
         Args:
             repo_name: Repository name
-            since_sha: Only get commits after this SHA (optional)
+            since_sha: Only get commits newer than this SHA (optional)
             max_commits: Maximum number of commits to retrieve
             
         Returns:
-            List of commit info dicts
+            List of commit info dicts, newest first
         """
-        commits_info = []
-        
-        try:
-            user = self.gh_client.get_user()
-            repo = user.get_repo(repo_name)
-            
-            commits = repo.get_commits()
-            
-            found_since = since_sha is None
-            count = 0
-            
-            for commit in commits:
-                if count >= max_commits:
-                    break
-                
-                if not found_since:
-                    if commit.sha == since_sha:
-                        found_since = True
-                    continue
-                
-                commits_info.append({
-                    'sha': commit.sha,
-                    'message': commit.commit.message,
-                    'author': commit.commit.author.name,
-                    'date': commit.commit.author.date.isoformat(),
-                    'url': commit.html_url
-                })
-                count += 1
-        
-        except Exception as e:
-            print(f"Error getting commits: {e}")
+        state = self.fetch_remote_state([repo_name], since={repo_name: since_sha} if since_sha else None,
+                                        max_commits=max_commits, include_tree=False)[repo_name]
         
-        return commits_info
+        if 'error' in state:
+            print(f"Error getting commits: {state['error']}")
+            return []
+        return state['commits']
     
-    def detect_changes(self, repo_name: str) -> Dict:
+    @traced("detect_changes")
+    def detect_changes(self, repo_name: str, remote_state: Dict = None) -> Dict:
         """
         Comprehensive change detection for a project
         
         Args:
             repo_name: Repository name to check
+            remote_state: This repo's entry from fetch_remote_state, if
+                already fetched (detect_changes_batch passes it in)
             
         Returns:
             Dict with all detected changes and sync status
@@ -273,20 +282,32 @@ class ChangeDetector:
         
         project_root = project['local_path']
         last_commit_sha = project.get('metadata', {}).get('commit_sha')
-        last_snapshot = project.get('metadata', {}).get('file_snapshot', {})
-        
-        # Scan current state
-        current_files = self.scan_local_files(project_root)
-        github_files = self.get_github_files(repo_name)
+        last_snapshot = load_snapshot(project.get('metadata', {}).get('file_snapshot'))
+        
+        # Scan current state once; every comparison below reuses it
+        with span("detect.scan_local") as s:
+            current_files = self.scan_local_files(project_root)
+            s.set_attribute("files", len(current_files))
+        
+        # Tree and new commits come from the mirror or a single GraphQL request
+        if remote_state is None:
+            with span("detect.remote_state"):
+                since = {repo_name: last_commit_sha} if last_commit_sha else None
+                remote_state = self.fetch_remote_state([repo_name], since=since, max_commits=5)[repo_name]
+        if 'error' in remote_state:
+            print(f"Could not read {repo_name} from GitHub: {remote_state['error']}")
+        github_files = remote_state.get('files', {})
+        github_commits = remote_state.get('commits', [])
         
         # Compare local to last snapshot (detect local changes)
-        local_changes = self.compare_local_to_snapshot(project_root, last_snapshot) if last_snapshot else None
+        with span("detect.compare_snapshot"):
+            local_changes = self.compare_local_to_snapshot(
+                project_root, last_snapshot, current_files=current_files) if last_snapshot else None
         
         # Compare local to GitHub (detect sync status)
-        sync_status = self.compare_local_to_github(project_root, repo_name)
-        
-        # Get recent GitHub commits
-        github_commits = self.get_github_recent_commits(repo_name, since_sha=last_commit_sha, max_commits=5)
+        with span("detect.compare_github"):
+            sync_status = self.compare_local_to_github(
+                project_root, repo_name, local_files=current_files, github_files=github_files)
         
         # Determine overall status
         has_local_changes = local_changes and local_changes['total_changes'] > 0
@@ -321,11 +342,71 @@ class ChangeDetector:
             'local_changes': local_changes,
             'sync_status': sync_status,
             'github_commits': github_commits,
+            'github_commits_truncated': remote_state.get('commits_truncated', False),
             'current_files_count': len(current_files),
             'github_files_count': len(github_files),
             'last_known_commit': last_commit_sha
         }
     
+    def detect_changes_batch(self, repo_names: List[str]) -> Dict[str, Dict]:
+        """
+        Change detection for several projects with one GitHub round trip per
+        REPOS_PER_QUERY repositories (or none, with mirrors) instead of several requests each
+        
+        Args:
+            repo_names: Repository names to check
+            
+        Returns:
+            Dict mapping repo name to its detect_changes result
+        """
+        since = {}
+        for repo_name in repo_names:
+            project = self.project_db.get_project_by_repo(repo_name)
+            if project and project.get('metadata', {}).get('commit_sha'):
+                since[repo_name] = project['metadata']['commit_sha']
+        
+        with span("detect.remote_state") as s:
+            s.set_attribute("repos", len(repo_names))
+            states = self.fetch_remote_state(repo_names, since=since, max_commits=5)
+        
+        return {name: self.detect_changes(name, remote_state=states[name]) for name in repo_names}
+    
+    def get_commit_diff(self, repo_name: str, base_sha: str, head_sha: str = None) -> Dict:
+        """
+        Files and patch changed between two commits
+        
+        Args:
+            repo_name: Repository name
+            base_sha: Older commit
+            head_sha: Newer commit (default: head of the default branch)
+            
+        Returns:
+            Dict with base, head, files (path, status, additions, deletions) and patch; or error
+        """
+        if self.mirror is not None and self.mirror.sync(repo_name):
+            try:
+                if self.mirror.resolve(repo_name, base_sha):
+                    return self.mirror.diff(repo_name, base_sha, head_sha or "HEAD")
+            except GitError as e:
+                print(f"Mirror diff failed for {repo_name}: {e}")
+        
+        try:
+            repo = self.repo_cache.get_repo(repo_name)
+            head_sha = head_sha or self.repo_cache.default_branch(repo_name)
+            comparison = github_call("compare", repo.compare, base_sha, head_sha)
+            files = [{
+                'path': f.filename,
+                'status': f.status,
+                'additions': f.additions,
+                'deletions': f.deletions
+            } for f in comparison.files]
+            patch = "\n".join(
+                f"--- a/{f.filename}\n+++ b/{f.filename}\n{f.patch}" for f in comparison.files if f.patch)
+            return {'base': base_sha, 'head': head_sha, 'files': files, 'patch': patch}
+        except Exception as e:
+            print(f"Error getting diff: {e}")
+            return {'error': str(e)}
+    
     def update_snapshot(self, repo_name: str) -> bool:
         """
         Update the file snapshot in the database for a project
@@ -343,21 +424,19 @@ class ChangeDetector:
             return False
         
         project_root = project['local_path']
-        current_files = self.scan_local_files(project_root)
+        snapshot = Snapshot.from_files(self.scan_local_files(project_root))
         
-        # Update database with new snapshot
-        self.project_db.update_project(
+        # Update database with new snapshot (stored as a delta on the previous one)
+        self.project_db.update_metadata(
             project['uuid'],
-            {
-                'metadata': {
-                    **project.get('metadata', {}),
-                    'file_snapshot': current_files,
-                    'snapshot_updated_at': datetime.now().isoformat()
-                }
+            lambda metadata: {
+                'file_snapshot': store_snapshot(metadata.get('file_snapshot'), snapshot),
+                'snapshot_updated_at': datetime.now().isoformat()
             }
         )
+        get_snapshot_history().record(project['uuid'], snapshot, "manual")
         
-        print(f"Updated snapshot for '{repo_name}' with {len(current_files)} files")
+        print(f"Updated snapshot for '{repo_name}' with {len(snapshot)} files")
         return True
     
     def format_changes_report(self, changes: Dict) -> str:
@@ -421,7 +500,7 @@ class ChangeDetector:
         if changes['github_commits']:
             report += f"""
 📡 GITHUB CHANGES (new commits):
-{len(changes['github_commits'])} new commit(s) since last check
+{len(changes['github_commits'])}{'+' if changes.get('github_commits_truncated') else ''} new commit(s) since last check
 
 """
             for commit in changes['github_commits']:
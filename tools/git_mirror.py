@@ -0,0 +1,352 @@
+"""
+Git Mirror - Local bare mirror of each tracked repository
+Change detection, commit history and diffs are answered with git plumbing instead of the REST API
+"""
+import base64
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lib.tracing import span
+
+# Field and record separators for git log output
+_FIELD = "\x1f"
+_RECORD = "\x1e"
+
+
+def git_mirror_enabled() -> bool:
+    """Mirrors are opt-in: DARTINBOT_GIT_MIRROR=1"""
+    return os.getenv("DARTINBOT_GIT_MIRROR", "0").lower() in ("1", "true", "yes", "on")
+
+
+class GitError(Exception):
+    """A git command failed"""
+
+
+class GitRemote:
+    """
+    Where and how to reach a repository over git transport. The URL comes
+    from a template, so a file:// remote works as well as GitHub.
+    """
+
+    def __init__(self, owner: Callable[[], str] = None, template: str = None, token: str = None):
+        """
+        Initialize the remote
+
+        Args:
+            owner: Returns the repository owner login; only called when the
+                template uses {owner}
+            template: Clone URL with {owner} and {repo} placeholders
+                (default: DARTINBOT_GIT_REMOTE_URL or https://github.com/{owner}/{repo}.git)
+            token: Token sent as HTTP basic auth (default: GITHUB_ACCESS_TOKEN); never written to disk
+        """
+        self.owner = owner
+        self.template = template or os.getenv("DARTINBOT_GIT_REMOTE_URL", "https://github.com/{owner}/{repo}.git")
+        self.token = token if token is not None else os.getenv("GITHUB_ACCESS_TOKEN")
+
+    def url(self, repo_name: str) -> str:
+        """Clone URL for a repository"""
+        owner = self.owner() if self.owner and "{owner}" in self.template else ""
+        return self.template.format(owner=owner, repo=repo_name)
+
+    def auth_env(self, url: str) -> Dict[str, str]:
+        """
+        Environment that authenticates git's requests to url
+
+        The header goes in through GIT_CONFIG_COUNT/KEY/VALUE rather than
+        `-c` on the command line: argv is readable by every local user
+        (ps, /proc/*/cmdline), a process's environment only by its owner.
+        """
+        if not self.token or not url.startswith("https://"):
+            return {}
+        credentials = base64.b64encode(f"x-access-token:{self.token}".encode("utf-8")).decode("ascii")
+        # Appended after any GIT_CONFIG_* entries already in the environment
+        index = int(os.environ.get("GIT_CONFIG_COUNT", "0") or 0)
+        return {
+            "GIT_CONFIG_COUNT": str(index + 1),
+            f"GIT_CONFIG_KEY_{index}": "http.extraHeader",
+            f"GIT_CONFIG_VALUE_{index}": f"Authorization: Basic {credentials}",
+        }
+
+    def commit_url(self, repo_name: str, sha: str) -> str:
+        """Web URL of a commit when the remote is an https forge, else empty"""
+        url = self.url(repo_name)
+        if not url.startswith("https://"):
+            return ""
+        return f"{url[:-len('.git')] if url.endswith('.git') else url}/commit/{sha}"
+
+
+def run_git(args: List[str], cwd: str = None, env: Dict[str, str] = None, input: str = None) -> str:
+    """
+    Run git without ever prompting for credentials
+
+    Returns:
+        stdout
+
+    Raises:
+        GitError: If git exits non-zero
+    """
+    result = subprocess.run(["git", *args], cwd=cwd, input=input, capture_output=True, text=True,
+                            encoding="utf-8", errors="replace",
+                            env={**os.environ, "GIT_TERMINAL_PROMPT": "0", **(env or {})})
+    if result.returncode != 0:
+        command = next((a for a in args if not a.startswith("-") and "=" not in a), "command")
+        raise GitError(f"git {command} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+class GitMirror:
+    """
+    Keeps one bare clone of each repository's branches under
+    ~/semantic/.dartinbot/mirrors and refreshes it with incremental fetches
+
+    Only refs/heads/* is kept: a full `git clone --mirror` would also
+    download every pull request ref, and this bot opens one per update.
+    """
+
+    def __init__(self, remote: GitRemote = None, mirror_root: str = None, ttl: float = None):
+        """
+        Initialize the mirror set
+
+        Args:
+            remote: Where the repositories live (default: GitRemote from the environment)
+            mirror_root: Directory holding the bare mirrors
+            ttl: Seconds a fetch stays fresh (default: DARTINBOT_GIT_MIRROR_TTL or 30)
+        """
+        if mirror_root is None:
+            mirror_root = Path.home() / "semantic" / ".dartinbot" / "mirrors"
+        self.mirror_root = Path(mirror_root)
+        self.mirror_root.mkdir(parents=True, exist_ok=True)
+        self.remote = remote or GitRemote()
+        self.ttl = ttl if ttl is not None else float(os.getenv("DARTINBOT_GIT_MIRROR_TTL", "30"))
+        self._fetched_at: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # -- plumbing -------------------------------------------------------------
+
+    def path(self, repo_name: str) -> Path:
+        """Location of a repository's bare mirror"""
+        return self.mirror_root / f"{repo_name}.git"
+
+    def _lock(self, repo_name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(repo_name, threading.Lock())
+
+    def git(self, repo_name: str, *args: str, auth_url: str = None) -> str:
+        """
+        Run a git command inside a repository's mirror
+
+        Args:
+            repo_name: Repository whose mirror to use
+            *args: git arguments
+            auth_url: Remote URL, when the command talks to the remote
+
+        Returns:
+            stdout
+
+        Raises:
+            GitError: If git exits non-zero
+        """
+        try:
+            return run_git(["--git-dir", str(self.path(repo_name)), *args], env=self.remote.auth_env(auth_url or ""))
+        except GitError as e:
+            raise GitError(f"{e} ({repo_name})") from None
+
+    # -- sync -----------------------------------------------------------------
+
+    def sync(self, repo_name: str, force: bool = False) -> bool:
+        """
+        Clone the mirror on first use, otherwise fetch what changed
+
+        Args:
+            repo_name: Repository name
+            force: Fetch even if the last fetch is still fresh
+
+        Returns:
+            True if the mirror is usable, False if it could not be fetched
+        """
+        with self._lock(repo_name):
+            fetched_at = self._fetched_at.get(repo_name)
+            if not force and fetched_at is not None and time.monotonic() - fetched_at < self.ttl:
+                return True
+
+            url = self.remote.url(repo_name)
+            mirror = self.path(repo_name)
+            with span("git_mirror.sync") as s:
+                s.set_attribute("repo", repo_name)
+                try:
+                    if not (mirror / "HEAD").exists():
+                        s.set_attribute("mode", "clone")
+                        run_git(["clone", "--bare", "--quiet", url, str(mirror)], env=self.remote.auth_env(url))
+                    else:
+                        s.set_attribute("mode", "fetch")
+                        self._drop_mirror_refs(repo_name)
+                        self.git(repo_name, "fetch", "--prune", "--quiet", url,
+                                 "+refs/heads/*:refs/heads/*", auth_url=url)
+                        # The default branch can change; follow the remote's HEAD
+                        head = self.git(repo_name, "ls-remote", "--symref", url, "HEAD", auth_url=url)
+                        for line in head.splitlines():
+                            if line.startswith("ref: ") and line.endswith("\tHEAD"):
+                                self.git(repo_name, "symbolic-ref", "HEAD", line[len("ref: "):-len("\tHEAD")])
+                except GitError as e:
+                    print(f"Could not sync mirror for {repo_name}: {e}")
+                    return False
+
+            self._fetched_at[repo_name] = time.monotonic()
+            return True
+
+    def _drop_mirror_refs(self, repo_name: str):
+        """Delete the pull request refs of a mirror made with `git clone --mirror`"""
+        try:
+            self.git(repo_name, "config", "--get", "remote.origin.mirror")
+        except GitError:
+            return
+        refs = self.git(repo_name, "for-each-ref", "--format=%(refname)", "refs/pull")
+        run_git(["--git-dir", str(self.path(repo_name)), "update-ref", "--stdin"],
+                input="".join(f"delete {ref}\n" for ref in refs.splitlines()))
+        self.git(repo_name, "config", "--unset", "remote.origin.mirror")
+
+    def mark_stale(self, repo_name: str):
+        """Force the next sync to fetch (e.g. after pushing through the API)"""
+        self._fetched_at.pop(repo_name, None)
+
+    def remove(self, repo_name: str):
+        """Delete a repository's mirror (e.g. after the repository was deleted)"""
+        with self._lock(repo_name):
+            self._fetched_at.pop(repo_name, None)
+            shutil.rmtree(self.path(repo_name), ignore_errors=True)
+
+    # -- queries --------------------------------------------------------------
+
+    def default_branch(self, repo_name: str) -> str:
+        """Branch the mirror's HEAD points at"""
+        return self.git(repo_name, "symbolic-ref", "--short", "HEAD").strip()
+
+    def resolve(self, repo_name: str, rev: str) -> Optional[str]:
+        """Commit SHA for a revision, or None if the mirror does not have it"""
+        try:
+            return self.git(repo_name, "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}").strip()
+        except GitError:
+            return None
+
+    def files(self, repo_name: str, rev: str = "HEAD") -> Dict[str, Dict]:
+        """
+        Every file at a revision
+
+        Returns:
+            Dict mapping paths to file info (sha, size), as get_github_files does
+        """
+        files_info = {}
+        output = self.git(repo_name, "ls-tree", "-r", "-l", "-z", rev)
+        for record in output.split("\0"):
+            if not record:
+                continue
+            meta, path = record.split("\t", 1)
+            _, kind, sha, size = meta.split()
+            if kind == "blob":
+                files_info[path] = {'sha': sha, 'size': int(size) if size.isdigit() else None}
+        return files_info
+
+    def log(self, repo_name: str, rev_range: str, max_commits: int) -> List[Dict]:
+        """Commits in a revision range, newest first, in get_github_recent_commits' shape"""
+        output = self.git(repo_name, "log", f"--max-count={max_commits}",
+                          f"--format=%H{_FIELD}%an{_FIELD}%aI{_FIELD}%B{_RECORD}", rev_range)
+        commits = []
+        for record in output.split(_RECORD):
+            record = record.strip("\n")
+            if not record:
+                continue
+            sha, author, date, message = record.split(_FIELD, 3)
+            commits.append({
+                'sha': sha,
+                'message': message.strip(),
+                'author': author,
+                'date': date,
+                'url': self.remote.commit_url(repo_name, sha)
+            })
+        return commits
+
+    def commits_since(self, repo_name: str, since_sha: Optional[str], max_commits: int,
+                      rev: str = "HEAD") -> Tuple[List[Dict], bool]:
+        """
+        Commits newer than since_sha, newest first
+
+        Returns:
+            (commits, truncated) where truncated means more than max_commits exist
+            or since_sha is unknown to the mirror (rewritten history)
+        """
+        if since_sha and self.resolve(repo_name, since_sha):
+            commits = self.log(repo_name, f"{since_sha}..{rev}", max_commits + 1)
+            return commits[:max_commits], len(commits) > max_commits
+        commits = self.log(repo_name, rev, max_commits + 1)
+        return commits[:max_commits], bool(since_sha) or len(commits) > max_commits
+
+    def diff(self, repo_name: str, base: str, head: str = "HEAD", patch: bool = True) -> Dict:
+        """
+        Changes between two commits
+
+        Args:
+            repo_name: Repository name
+            base: Older revision
+            head: Newer revision
+            patch: Include the unified diff text
+
+        Returns:
+            Dict with files (path, status, additions, deletions) and patch
+        """
+        statuses = {}
+        output = self.git(repo_name, "diff", "--name-status", "-z", "--no-renames", base, head)
+        fields = output.split("\0")
+        for status, path in zip(fields[0::2], fields[1::2]):
+            if path:
+                statuses[path] = status
+
+        files = []
+        for record in self.git(repo_name, "diff", "--numstat", "-z", "--no-renames", base, head).split("\0"):
+            if not record:
+                continue
+            additions, deletions, path = record.split("\t", 2)
+            files.append({
+                'path': path,
+                'status': {'A': 'added', 'D': 'removed', 'M': 'modified'}.get(statuses.get(path), 'changed'),
+                'additions': int(additions) if additions.isdigit() else 0,
+                'deletions': int(deletions) if deletions.isdigit() else 0
+            })
+
+        return {
+            'base': base,
+            'head': head,
+            'files': files,
+            'patch': self.git(repo_name, "diff", "--no-renames", base, head) if patch else None
+        }
+
+    def state(self, repo_name: str, since_sha: Optional[str] = None, max_commits: int = 10,
+              include_tree: bool = True) -> Dict:
+        """
+        Remote state in the same shape as RemoteStateFetcher.fetch, from the mirror
+
+        Returns:
+            default_branch, head_sha, tree_sha, files, commits, commits_truncated; or error
+        """
+        if not self.sync(repo_name):
+            return {'error': f"Mirror for '{repo_name}' could not be fetched"}
+        try:
+            head_sha = self.resolve(repo_name, "HEAD")
+            if head_sha is None:
+                return {'error': f"Repository '{repo_name}' has no commits"}
+            commits, truncated = self.commits_since(repo_name, since_sha, max_commits)
+            return {
+                'default_branch': self.default_branch(repo_name),
+                'head_sha': head_sha,
+                'tree_sha': self.git(repo_name, "rev-parse", "HEAD^{tree}").strip(),
+                'files': self.files(repo_name) if include_tree else {},
+                'commits': commits,
+                'commits_truncated': truncated
+            }
+        except GitError as e:
+            return {'error': str(e)}
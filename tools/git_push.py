@@ -0,0 +1,138 @@
+"""
+Git Push - Commit a project with local git and push packfiles over git transport
+Alternative to building commits through the REST Git Database API
+"""
+import os
+from typing import Dict, List
+
+from lib.tracing import span
+from tools.git_mirror import GitRemote, run_git
+
+BACKENDS = ("api", "git")
+
+# Index used for our commits, so the user's own index and working tree are never touched
+INDEX_FILE = "dartinbot-index"
+# Where pushed heads are recorded in the local repository
+TRACKING_PREFIX = "refs/remotes/dartinbot"
+
+
+def default_push_backend() -> str:
+    """Backend for projects that have not chosen one (DARTINBOT_PUSH_BACKEND, default: api)"""
+    backend = os.getenv("DARTINBOT_PUSH_BACKEND", "api").lower()
+    return backend if backend in BACKENDS else "api"
+
+
+class GitPushBackend:
+    """
+    Commits the files of a project directory on top of the remote branch head
+    and pushes them with `git push`, so content travels as a delta-compressed
+    packfile instead of one JSON payload per tree. Uses the git repository in
+    the project directory, creating one if there is none.
+    """
+
+    def __init__(self, remote: GitRemote = None):
+        """
+        Initialize the backend
+
+        Args:
+            remote: Where the repositories live (default: GitRemote from the environment)
+        """
+        self.remote = remote or GitRemote()
+        self.author_name = os.getenv("DARTINBOT_GIT_AUTHOR_NAME", "DartinBot")
+        self.author_email = os.getenv("DARTINBOT_GIT_AUTHOR_EMAIL", "dartinbot@users.noreply.github.com")
+
+    def _git_dir(self, project_root: str) -> str:
+        return os.path.join(project_root, ".git")
+
+    def ensure_repo(self, project_root: str) -> bool:
+        """
+        Use the project's git repository, or initialize one
+
+        Returns:
+            True if the repository was created by us (and so its branches are ours to move)
+        """
+        if os.path.isdir(self._git_dir(project_root)):
+            return run_git(["config", "--get", "--default", "false", "dartinbot.managed"],
+                           cwd=project_root).strip() == "true"
+        run_git(["init", "--quiet", project_root])
+        run_git(["config", "dartinbot.managed", "true"], cwd=project_root)
+        return True
+
+    def _fetch_head(self, project_root: str, url: str, branch: str) -> str:
+        """Fetch a remote branch; returns its commit SHA, or '' if the branch does not exist"""
+        listing = run_git(["ls-remote", url, f"refs/heads/{branch}"], cwd=project_root, env=self.remote.auth_env(url))
+        if not listing.strip():
+            return ""
+        run_git(["fetch", "--quiet", "--no-tags", url, f"+refs/heads/{branch}:{TRACKING_PREFIX}/{branch}"],
+                cwd=project_root, env=self.remote.auth_env(url))
+        return run_git(["rev-parse", f"{TRACKING_PREFIX}/{branch}"], cwd=project_root).strip()
+
+    def commit(self, project_root: str, repo_name: str, paths: List[str], message: str, branch: str,
+               base_branch: str = None, removed_paths: List[str] = ()) -> Dict:
+        """
+        Commit files from the project directory and push them
+
+        The new commit's tree is the base head's tree with `paths` added or
+        replaced from disk and `removed_paths` dropped, the same result the
+        Git Database API path gets with base_tree.
+
+        Args:
+            project_root: Project directory
+            repo_name: Repository name
+            paths: Files to commit, relative to project_root
+            message: Commit message
+            branch: Branch to push to
+            base_branch: Branch whose head is the parent (default: branch itself)
+            removed_paths: Files to delete from the tree
+
+        Returns:
+            Dict with sha, parent_sha and branch
+
+        Raises:
+            GitError: If any git step fails, including a rejected (non fast-forward) push
+        """
+        url = self.remote.url(repo_name)
+        base_branch = base_branch or branch
+        with span("git_push.commit") as s:
+            s.set_attribute("repo", repo_name)
+            s.set_attribute("files", len(paths))
+            managed = self.ensure_repo(project_root)
+
+            with span("git_push.fetch"):
+                parent = self._fetch_head(project_root, url, base_branch)
+
+            # Build the tree in a private index seeded from the parent
+            index_env = {"GIT_INDEX_FILE": os.path.join(self._git_dir(project_root), INDEX_FILE)}
+            if parent:
+                run_git(["read-tree", parent], cwd=project_root, env=index_env)
+            else:
+                run_git(["read-tree", "--empty"], cwd=project_root, env=index_env)
+            if paths:
+                # --force: the file list was already filtered by the caller, .gitignore must not drop any
+                run_git(["add", "--force", "--pathspec-from-file=-", "--pathspec-file-nul"],
+                        cwd=project_root, env=index_env, input="\0".join(paths))
+            if removed_paths:
+                run_git(["rm", "--cached", "--quiet", "--ignore-unmatch", "--pathspec-from-file=-",
+                         "--pathspec-file-nul"], cwd=project_root, env=index_env, input="\0".join(removed_paths))
+            tree = run_git(["write-tree"], cwd=project_root, env=index_env).strip()
+
+            identity = {
+                "GIT_AUTHOR_NAME": self.author_name, "GIT_AUTHOR_EMAIL": self.author_email,
+                "GIT_COMMITTER_NAME": self.author_name, "GIT_COMMITTER_EMAIL": self.author_email
+            }
+            parent_args = ["-p", parent] if parent else []
+            sha = run_git(["commit-tree", tree, *parent_args, "-F", "-"], cwd=project_root,
+                          env=identity, input=message).strip()
+
+            with span("git_push.push"):
+                run_git(["push", "--quiet", url, f"{sha}:refs/heads/{branch}"],
+                        cwd=project_root, env=self.remote.auth_env(url))
+            run_git(["update-ref", f"{TRACKING_PREFIX}/{branch}", sha], cwd=project_root)
+
+            if managed and branch == base_branch:
+                # Our own repository: keep its branch, HEAD and index in step with what was pushed
+                run_git(["update-ref", f"refs/heads/{branch}", sha], cwd=project_root)
+                run_git(["symbolic-ref", "HEAD", f"refs/heads/{branch}"], cwd=project_root)
+                run_git(["read-tree", sha], cwd=project_root)
+
+        return {'sha': sha, 'parent_sha': parent or None, 'branch': branch}
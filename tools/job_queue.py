@@ -0,0 +1,277 @@
+"""
+Job Queue - Local background job scheduler for long running kernel functions
+Lets the chat loop hand off scaffold generation and project updates and keep going
+"""
+import asyncio
+import inspect
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from lib.cancellation import Cancelled, cancel_token
+from lib.metrics import DB_BYTES, DB_OPERATIONS
+from lib.output import redirected_output
+from lib.progress import listening
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, INTERRUPTED)
+
+
+class JobQueue:
+    """asyncio task queue with a worker pool and persistent job records"""
+
+    def __init__(self, db_path: str = None, workers: int = None):
+        """
+        Initialize the job queue
+
+        Args:
+            db_path: Path to the JSON job store. If None, uses default location.
+            workers: Number of concurrent workers (default: DARTINBOT_JOB_WORKERS or 2)
+        """
+        if db_path is None:
+            # Default to .dartinbot/jobs/jobs_db.json next to the project database
+            db_dir = Path.home() / "semantic" / ".dartinbot" / "jobs"
+            db_dir.mkdir(parents=True, exist_ok=True)
+            db_path = db_dir / "jobs_db.json"
+
+        self.db_path = str(db_path)
+        # What a job's tools print goes to logs/<job id>.log, not the terminal
+        self.log_dir = os.path.join(os.path.dirname(self.db_path), "logs")
+        self.workers = workers or int(os.getenv("DARTINBOT_JOB_WORKERS", "2"))
+        self._handlers: Dict[str, Callable] = {}
+        self._jobs: Dict[str, Dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cancel_tokens: Dict[str, threading.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Load job records, marking jobs from a previous process as interrupted"""
+        if not os.path.exists(self.db_path):
+            return
+        try:
+            with open(self.db_path, 'rb') as f:
+                raw = f.read()
+            DB_OPERATIONS.inc(db="jobs", operation="read")
+            DB_BYTES.inc(len(raw), db="jobs", operation="read")
+            jobs = json.loads(raw).get("jobs", [])
+        except Exception as e:
+            print(f"Error reading job database: {e}")
+            return
+
+        for job in jobs:
+            if job.get("status") not in FINISHED_STATES:
+                job["status"] = INTERRUPTED
+                job["finished_at"] = datetime.now().isoformat()
+            self._jobs[job["id"]] = job
+        self._save()
+
+    def _save(self):
+        """Write all job records"""
+        with self._lock:
+            try:
+                tmp_path = f"{self.db_path}.tmp"
+                raw = json.dumps({"jobs": list(self._jobs.values()), "version": "1.0"},
+                                 indent=2, ensure_ascii=False, default=str).encode('utf-8')
+                with open(tmp_path, 'wb') as f:
+                    f.write(raw)
+                os.replace(tmp_path, self.db_path)
+                DB_OPERATIONS.inc(db="jobs", operation="write")
+                DB_BYTES.inc(len(raw), db="jobs", operation="write")
+            except Exception as e:
+                print(f"Error writing job database: {e}")
+
+    def _update(self, job_id: str, **fields):
+        """Update a job record and persist it"""
+        self._jobs[job_id].update(fields)
+        self._save()
+
+    def register_handler(self, kind: str, handler: Callable):
+        """
+        Register the callable that runs jobs of a given kind
+
+        Sync handlers run in a worker thread so they never block the event loop.
+
+        Args:
+            kind: Job kind (e.g. "scaffold", "update")
+            handler: Callable receiving the job params as keyword arguments
+        """
+        self._handlers[kind] = handler
+
+    def _ensure_started(self):
+        """Start the worker pool on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker_tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [loop.create_task(self._worker(i)) for i in range(self.workers)]
+        # Re-queue anything accepted before the pool existed
+        for job in self._jobs.values():
+            if job["status"] == QUEUED:
+                self._queue.put_nowait(job["id"])
+
+    async def _worker(self, index: int):
+        """Pull jobs off the queue and run them"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != QUEUED:
+                    continue
+                task = asyncio.ensure_future(self._run(job))
+                self._tasks[job_id] = task
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise
+            finally:
+                self._tasks.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job: Dict):
+        """Run a single job and record its outcome"""
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            self._update(job["id"], status=FAILED, error=f"No handler for job kind '{job['kind']}'",
+                         finished_at=datetime.now().isoformat())
+            return
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_path = os.path.join(self.log_dir, f"{job['id']}.log")
+        self._update(job["id"], status=RUNNING, started_at=datetime.now().isoformat(), log_path=log_path)
+        token = self._cancel_tokens.setdefault(job["id"], threading.Event())
+        try:
+            # Jobs outlive the chat turn that queued them; keep their progress and output
+            # off the prompt. The handler checks the cancel token between phases (see lib.cancellation)
+            with open(log_path, "a", encoding="utf-8", buffering=1) as log, \
+                    redirected_output(log), listening(None), cancel_token(token):
+                if inspect.iscoroutinefunction(handler):
+                    result = await handler(**job["params"])
+                else:
+                    result = await asyncio.to_thread(handler, **job["params"])
+            # A cancellation requested after the last check came too late to stop anything
+            self._update(job["id"], status=SUCCEEDED, result=result,
+                         finished_at=datetime.now().isoformat())
+        except (asyncio.CancelledError, Cancelled) as e:
+            self._update(job["id"], status=CANCELLED, finished_at=datetime.now().isoformat())
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        except Exception as e:
+            self._update(job["id"], status=FAILED, error=str(e),
+                         finished_at=datetime.now().isoformat())
+        finally:
+            self._cancel_tokens.pop(job["id"], None)
+
+    def submit(self, kind: str, params: Dict[str, Any], description: str = "") -> str:
+        """
+        Queue a job for background execution
+
+        Must be called from inside a running event loop.
+
+        Args:
+            kind: Registered job kind
+            params: Keyword arguments for the handler
+            description: Human readable summary of the job
+
+        Returns:
+            Job ID
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self._ensure_started()
+        job_id = uuid.uuid4().hex[:12]
+        self._jobs[job_id] = {
+            "id": job_id,
+            "kind": kind,
+            "description": description,
+            "params": params,
+            "status": QUEUED,
+            "result": None,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None
+        }
+        self._save()
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job record by ID (or unique ID prefix)"""
+        if job_id in self._jobs:
+            return self._jobs[job_id]
+        matches = [j for jid, j in self._jobs.items() if jid.startswith(job_id)]
+        return matches[0] if len(matches) == 1 else None
+
+    def list_jobs(self, include_finished: bool = True) -> List[Dict]:
+        """Get job records, newest first"""
+        jobs = sorted(self._jobs.values(), key=lambda j: j["created_at"], reverse=True)
+        if not include_finished:
+            jobs = [j for j in jobs if j["status"] not in FINISHED_STATES]
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued job, or ask a running one to stop
+
+        A running job's worker thread cannot be interrupted. It stops at its
+        next cancellation check (before committing or opening a PR); until
+        then the job stays running with cancel_requested set and keeps its
+        worker. A job past its last check finishes normally.
+
+        Returns:
+            True if the job was cancelled or asked to stop
+        """
+        job = self.get_job(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return False
+
+        if job["status"] == QUEUED:
+            self._update(job["id"], status=CANCELLED, finished_at=datetime.now().isoformat())
+            return True
+
+        self._cancel_tokens.setdefault(job["id"], threading.Event()).set()
+        self._update(job["id"], cancel_requested=True)
+        task = self._tasks.get(job["id"])
+        if task is not None and inspect.iscoroutinefunction(self._handlers.get(job["kind"])):
+            # Coroutines stop at their next await; threads are left to reach a check
+            task.cancel()
+        return True
+
+    async def shutdown(self):
+        """Stop the worker pool, cancelling anything still running"""
+        for token in list(self._cancel_tokens.values()):
+            token.set()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for worker in self._worker_tasks:
+            worker.cancel()
+        await asyncio.gather(*self._worker_tasks, *self._tasks.values(), return_exceptions=True)
+        self._worker_tasks = []
+
+
+# Global instance for easy access
+_queue_instance = None
+
+def get_job_queue() -> JobQueue:
+    """Get the global job queue instance"""
+    global _queue_instance
+    if _queue_instance is None:
+        _queue_instance = JobQueue()
+    return _queue_instance
@@ -0,0 +1,428 @@
+"""
+Output Parser - Tolerant JSON extraction and validation for model output
+Recovers the scaffold/update JSON from Claude responses and repairs only the broken parts
+"""
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+SCAFFOLD = "scaffold"
+UPDATE = "update"
+
+UPDATE_ACTIONS = ("modify", "add", "delete")
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class OutputParseError(ValueError):
+    """Raised when model output cannot be turned into a valid document"""
+
+    def __init__(self, message: str, errors: List[str] = None, partial: Dict = None):
+        super().__init__(message)
+        self.errors = errors or []
+        self.partial = partial
+
+
+def _scan(text: str, start: int) -> Tuple[Optional[int], int, str]:
+    """
+    Scan a JSON candidate starting at an opening brace in a single pass
+
+    Args:
+        text: Text to scan
+        start: Index of the opening '{'
+
+    Returns:
+        Tuple of (end index of the balanced object or None if truncated,
+        last safe cut position, open containers at that position)
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    safe_pos, safe_stack = start, ""
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+            safe_pos, safe_stack = i + 1, "".join(stack)
+        elif ch in "}]":
+            if not stack or _CLOSERS[stack[-1]] != ch:
+                return None, safe_pos, safe_stack
+            stack.pop()
+            if not stack:
+                return i + 1, i + 1, ""
+            safe_pos, safe_stack = i + 1, "".join(stack)
+        elif ch == ",":
+            # Everything before a separator is a complete member/element
+            safe_pos, safe_stack = i, "".join(stack)
+
+    return None, safe_pos, safe_stack
+
+
+def extract_json(text: str) -> Dict:
+    """
+    Extract the first complete JSON object from model output
+
+    Code fences and prose around the object are skipped rather than
+    stripped, so fences inside file contents are left untouched. A stray
+    "{" in the prose is skipped as well: every later "{" is tried until
+    one starts a complete object.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        Parsed JSON object
+
+    Raises:
+        OutputParseError: If no complete JSON object can be found
+    """
+    pos = text.find("{")
+    last_error = "No JSON object found in response"
+    unbalanced = False
+
+    while pos != -1:
+        end, _, _ = _scan(text, pos)
+        if end is None:
+            unbalanced = True
+        else:
+            try:
+                value = json.loads(text[pos:end])
+                if isinstance(value, dict):
+                    return value
+            except json.JSONDecodeError as e:
+                last_error = f"Invalid JSON: {e}"
+        pos = text.find("{", pos + 1)
+
+    raise OutputParseError("JSON object is truncated or unbalanced" if unbalanced else last_error)
+
+
+def recover_truncated(text: str) -> Optional[Dict]:
+    """
+    Salvage a truncated JSON object by cutting at the last complete value
+
+    Useful when a long generation hits max_tokens: every file that was
+    fully written is kept and only the unfinished tail is dropped.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        Partially recovered JSON object, or None if nothing usable was found
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    end, safe_pos, safe_stack = _scan(text, start)
+    if end is not None:
+        candidate = text[start:end]
+    else:
+        closers = "".join(_CLOSERS[c] for c in reversed(safe_stack))
+        candidate = text[start:safe_pos] + closers
+
+    try:
+        value = json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def validate_scaffold(data: Dict) -> List[str]:
+    """
+    Validate the scaffold document shape
+
+    Returns:
+        List of error strings (empty when valid)
+    """
+    errors = []
+    if not isinstance(data, dict):
+        return ["root: expected an object"]
+
+    for key in ("project_name", "description"):
+        if not isinstance(data.get(key), str) or not data.get(key).strip():
+            errors.append(f"{key}: expected a non-empty string")
+
+    structure = data.get("structure")
+    if not isinstance(structure, dict):
+        errors.append("structure: expected an object with 'folders' and 'files'")
+        return errors
+
+    folders = structure.get("folders")
+    if not isinstance(folders, list) or not all(isinstance(f, str) for f in folders):
+        errors.append("structure.folders: expected a list of strings")
+
+    files = structure.get("files")
+    if not isinstance(files, dict) or not files:
+        errors.append("structure.files: expected a non-empty object of path -> content")
+    else:
+        for path, content in files.items():
+            if not isinstance(content, str):
+                errors.append(f"structure.files[{path}]: expected string content")
+
+    return errors
+
+
+def validate_update(data: Dict) -> List[str]:
+    """
+    Validate the update document shape
+
+    Returns:
+        List of error strings (empty when valid)
+    """
+    errors = []
+    if not isinstance(data, dict):
+        return ["root: expected an object"]
+
+    if not isinstance(data.get("summary"), str) or not data.get("summary").strip():
+        errors.append("summary: expected a non-empty string")
+
+    changes = data.get("changes")
+    if not isinstance(changes, list):
+        errors.append("changes: expected a list")
+        return errors
+
+    for i, change in enumerate(changes):
+        if not isinstance(change, dict):
+            errors.append(f"changes[{i}]: expected an object")
+            continue
+        if not isinstance(change.get("path"), str) or not change.get("path"):
+            errors.append(f"changes[{i}].path: expected a non-empty string")
+        if change.get("action") not in UPDATE_ACTIONS:
+            errors.append(f"changes[{i}].action: expected one of {', '.join(UPDATE_ACTIONS)}")
+        if change.get("action") != "delete" and not isinstance(change.get("content"), str):
+            errors.append(f"changes[{i}].content: expected string content")
+
+    return errors
+
+
+VALIDATORS = {
+    SCAFFOLD: validate_scaffold,
+    UPDATE: validate_update,
+}
+
+
+def _drop_invalid(kind: str, data: Dict) -> Tuple[Dict, List[str]]:
+    """
+    Remove the individual entries that failed validation
+
+    Returns:
+        Tuple of (document with only valid entries, identifiers of dropped entries)
+    """
+    dropped = []
+    if kind == SCAFFOLD:
+        files = data.get("structure", {}).get("files")
+        if isinstance(files, dict):
+            for path in [p for p, c in files.items() if not isinstance(c, str)]:
+                del files[path]
+                dropped.append(path)
+    elif kind == UPDATE and isinstance(data.get("changes"), list):
+        kept = []
+        for change in data["changes"]:
+            if validate_update({"summary": "-", "changes": [change]}):
+                path = change.get("path") if isinstance(change, dict) else None
+                if path:
+                    dropped.append(path)
+            else:
+                kept.append(change)
+        data["changes"] = kept
+    return data, dropped
+
+
+def build_repair_prompt(kind: str, partial: Dict, errors: List[str], missing: List[str]) -> str:
+    """
+    Build a prompt that asks only for the malformed or missing part of a document
+
+    Args:
+        kind: SCAFFOLD or UPDATE
+        partial: What was recovered so far
+        errors: Validation errors found
+        missing: Paths that have to be regenerated
+
+    Returns:
+        Repair prompt text
+    """
+    if kind == SCAFFOLD:
+        received = sorted(partial.get("structure", {}).get("files", {}).keys())
+        return f"""Your previous response for this project scaffold was malformed or cut off.
+
+PROBLEMS:
+{json.dumps(errors, indent=2)}
+
+FILES ALREADY RECEIVED (do NOT repeat these):
+{json.dumps(received, indent=2)}
+
+FILES TO REGENERATE:
+{json.dumps(missing, indent=2)}
+
+Return ONLY valid JSON (no code fences) in this exact format, containing the
+files listed above plus any remaining files the project still needs:
+
+{{
+  "project_name": "{partial.get('project_name', '')}",
+  "description": "short description",
+  "folders": ["folder1", "folder2"],
+  "files": {{
+    "path/to/file.ext": "complete file content"
+  }}
+}}
+"""
+
+    received = [c.get("path") for c in partial.get("changes", []) if isinstance(c, dict)]
+    return f"""Your previous response with project changes was malformed or cut off.
+
+PROBLEMS:
+{json.dumps(errors, indent=2)}
+
+CHANGES ALREADY RECEIVED (do NOT repeat these):
+{json.dumps(received, indent=2)}
+
+CHANGES TO REGENERATE:
+{json.dumps(missing, indent=2)}
+
+Return ONLY valid JSON (no code fences) in this exact format, containing the
+changes listed above plus any remaining changes still needed:
+
+{{
+  "changes": [
+    {{"path": "relative/path", "action": "modify|add|delete", "content": "full file content"}}
+  ],
+  "summary": "Brief description of changes made"
+}}
+"""
+
+
+def merge_repair(kind: str, partial: Dict, repair: Dict) -> Dict:
+    """
+    Merge a repair response into the partially recovered document
+
+    Args:
+        kind: SCAFFOLD or UPDATE
+        partial: Partially recovered document
+        repair: Parsed repair response
+
+    Returns:
+        Merged document
+    """
+    if kind == SCAFFOLD:
+        for key in ("project_name", "description"):
+            if not partial.get(key) and repair.get(key):
+                partial[key] = repair[key]
+        structure = partial.setdefault("structure", {})
+        if not isinstance(structure.get("folders"), list):
+            structure["folders"] = []
+        if not isinstance(structure.get("files"), dict):
+            structure["files"] = {}
+
+        source = repair.get("structure", repair)
+        for folder in source.get("folders", []) or []:
+            if folder not in structure["folders"]:
+                structure["folders"].append(folder)
+        for path, content in (source.get("files", {}) or {}).items():
+            structure["files"][path] = content
+        return partial
+
+    if not isinstance(partial.get("changes"), list):
+        partial["changes"] = []
+    known = {c.get("path"): i for i, c in enumerate(partial["changes"])}
+    for change in repair.get("changes", []) or []:
+        path = change.get("path") if isinstance(change, dict) else None
+        if path in known:
+            partial["changes"][known[path]] = change
+        else:
+            partial["changes"].append(change)
+    if not partial.get("summary") and repair.get("summary"):
+        partial["summary"] = repair["summary"]
+    return partial
+
+
+def _extract(text: str, validate: Callable[[Dict], List[str]]) -> Tuple[Dict, bool]:
+    """
+    The document in model output and whether it was cut off
+
+    extract_json skips past an unbalanced "{", so in a truncated document it
+    can return a complete object nested inside it (e.g. one change). When the
+    truncated document recovered from the first "{" is a different object and
+    validates at least as well, that is the answer instead.
+
+    Raises:
+        OutputParseError: If neither a complete nor a truncated object is found
+    """
+    try:
+        data = extract_json(text)
+    except OutputParseError:
+        data = recover_truncated(text)
+        if data is None:
+            raise
+        return data, True
+
+    errors = validate(data)
+    if errors:
+        recovered = recover_truncated(text)
+        if recovered is not None and recovered != data and len(validate(recovered)) <= len(errors):
+            return recovered, True
+    return data, False
+
+
+def parse_model_output(text: str, kind: str,
+                       repair_fn: Optional[Callable[[str], str]] = None,
+                       max_repairs: int = 2, logger=None) -> Dict:
+    """
+    Parse and validate model output, repairing only the broken portion
+
+    Args:
+        text: Raw model output
+        kind: SCAFFOLD or UPDATE
+        repair_fn: Callable that sends a repair prompt to the model and returns its text
+        max_repairs: Maximum number of repair round trips
+        logger: Optional logger for repair diagnostics
+
+    Returns:
+        Validated document
+
+    Raises:
+        OutputParseError: If the document is still invalid after all repairs
+    """
+    validate = VALIDATORS[kind]
+
+    data, truncated = _extract(text, validate)
+    if truncated and logger:
+        logger.warning(f"Recovered truncated {kind} output")
+
+    errors = validate(data)
+    attempts = 0
+    while (errors or truncated) and repair_fn and attempts < max_repairs:
+        attempts += 1
+        data, missing = _drop_invalid(kind, data)
+        if truncated:
+            errors = errors + ["response was truncated before the JSON object was complete"]
+        if logger:
+            logger.info(f"Requesting {kind} repair {attempts}/{max_repairs}: {len(errors)} problem(s)")
+
+        repair_text = repair_fn(build_repair_prompt(kind, data, errors, missing))
+        try:
+            repair, truncated = _extract(repair_text, validate)
+        except OutputParseError:
+            repair, truncated = {}, False
+
+        data = merge_repair(kind, data, repair)
+        errors = validate(data)
+
+    if errors:
+        raise OutputParseError(
+            f"Model output failed {kind} validation: {'; '.join(errors[:5])}",
+            errors=errors,
+            partial=data,
+        )
+    return data
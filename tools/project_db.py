@@ -1,13 +1,29 @@
 """
 Project Database - Simple JSON-based database for tracking projects
 """
+import copy
+import functools
 import json
 import os
+import threading
 import uuid
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Union
 from pathlib import Path
 
+from lib.metrics import DB_BYTES, DB_OPERATIONS
+from tools.search_index import SearchIndex
+
+
+def _locked(method):
+    """Run a database method under the instance lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class ProjectDatabase:
     """Manages project metadata in a JSON database"""
     
@@ -26,6 +42,12 @@ class ProjectDatabase:
             db_path = db_dir / "projects_db.json"
         
         self.db_path = str(db_path)
+        # Search index lives next to the database: projects_db.index.json (+ .index.log journal)
+        self.index_path = os.path.splitext(self.db_path)[0] + ".index.json"
+        self._index = None
+        self._projects_by_uuid = None
+        # Tool calls run in parallel threads; read-modify-write cycles and the index go one at a time
+        self._lock = threading.RLock()
         self._ensure_db_exists()
     
     def _ensure_db_exists(self):
@@ -36,8 +58,11 @@ class ProjectDatabase:
     def _read_db(self) -> Dict:
         """Read the entire database"""
         try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(self.db_path, 'rb') as f:
+                raw = f.read()
+            DB_OPERATIONS.inc(db="projects", operation="read")
+            DB_BYTES.inc(len(raw), db="projects", operation="read")
+            return json.loads(raw)
         except Exception as e:
             print(f"Error reading database: {e}")
             return {"projects": [], "version": "1.0"}
@@ -45,11 +70,65 @@ class ProjectDatabase:
     def _write_db(self, data: Dict):
         """Write the entire database"""
         try:
-            with open(self.db_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            raw = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+            # Write then rename, so a concurrent reader never sees a half-written file
+            tmp_path = f"{self.db_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_path, self.db_path)
+            DB_OPERATIONS.inc(db="projects", operation="write")
+            DB_BYTES.inc(len(raw), db="projects", operation="write")
         except Exception as e:
             print(f"Error writing database: {e}")
     
+    def _signature(self) -> List[int]:
+        """(mtime_ns, size) of the database file, used to spot changes made behind the index"""
+        try:
+            stat = os.stat(self.db_path)
+            return [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            return [0, 0]
+    
+    def _search_index(self) -> SearchIndex:
+        """The search index, loaded on first use and rebuilt if it does not match the database"""
+        signature = self._signature()
+        if self._index is not None and self._index.signature == signature:
+            return self._index
+        index = SearchIndex(self.index_path)
+        if not index.load(signature):
+            index.rebuild(self._read_db()["projects"], signature)
+        self._index = index
+        return index
+    
+    def _update_index(self, previous_signature: List[int], put: List[Dict] = (), delete: List[str] = ()):
+        """
+        Apply one database write to the search index
+        
+        Args:
+            previous_signature: Database signature from before the write
+            put: Projects added or changed
+            delete: UUIDs removed
+        """
+        try:
+            if self._index is None or self._index.signature != previous_signature:
+                if not os.path.exists(self.index_path):
+                    # Never built; the first search builds it
+                    return
+                index = SearchIndex(self.index_path)
+                if not index.load(previous_signature):
+                    # Already stale; the next search rebuilds it
+                    return
+                self._index = index
+            signature = self._signature()
+            for project in put:
+                self._index.put(project, signature)
+            for project_uuid in delete:
+                self._index.delete(project_uuid, signature)
+        except Exception as e:
+            print(f"Error updating search index: {e}")
+            self._index = None
+    
+    @_locked
     def add_project(self, name: str, repo_name: str, local_path: str, 
                    description: str = "", repo_url: str = "", 
                    additional_metadata: Dict = None) -> str:
@@ -89,8 +168,10 @@ class ProjectDatabase:
             "metadata": additional_metadata or {}
         }
         
+        previous_signature = self._signature()
         db["projects"].append(project)
         self._write_db(db)
+        self._update_index(previous_signature, put=[project])
         
         print(f"Added project '{name}' with UUID: {project_uuid}")
         return project_uuid
@@ -129,6 +210,7 @@ class ProjectDatabase:
         db = self._read_db()
         return [p for p in db["projects"] if p.get("status") == "active"]
     
+    @_locked
     def update_project(self, project_uuid: str, updates: Dict) -> bool:
         """
         Update a project's metadata
@@ -152,14 +234,42 @@ class ProjectDatabase:
                 # Always update the timestamp
                 project["updated_at"] = datetime.now().isoformat()
                 
+                previous_signature = self._signature()
                 db["projects"][i] = project
                 self._write_db(db)
+                self._update_index(previous_signature, put=[project])
                 print(f"Updated project: {project_uuid}")
                 return True
         
         print(f"Project not found: {project_uuid}")
         return False
     
+    @_locked
+    def update_metadata(self, project_uuid: str, patch: Union[Dict, Callable[[Dict], Dict]]) -> bool:
+        """
+        Merge keys into a project's metadata
+
+        The current metadata is read under the database lock, so concurrent
+        tool calls and jobs updating different keys do not overwrite each other.
+
+        Args:
+            project_uuid: UUID of the project to update
+            patch: Keys to set, or a function from the current metadata to the keys
+                to set (for values derived from the stored ones, like file_snapshot)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        project = self.get_project(project_uuid)
+        if project is None:
+            print(f"Project not found: {project_uuid}")
+            return False
+        metadata = project.get("metadata", {})
+        if callable(patch):
+            patch = patch(metadata)
+        return self.update_project(project_uuid, {"metadata": {**metadata, **patch}})
+    
+    @_locked
     def delete_project(self, project_uuid: str) -> bool:
         """
         Delete a project from the database (soft delete by default)
@@ -177,14 +287,17 @@ class ProjectDatabase:
                 # Soft delete - mark as deleted
                 project["status"] = "deleted"
                 project["deleted_at"] = datetime.now().isoformat()
+                previous_signature = self._signature()
                 db["projects"][i] = project
                 self._write_db(db)
+                self._update_index(previous_signature, delete=[project_uuid])
                 print(f"Deleted project: {project_uuid}")
                 return True
         
         print(f"Project not found: {project_uuid}")
         return False
     
+    @_locked
     def hard_delete_project(self, project_uuid: str) -> bool:
         """
         Permanently delete a project from the database
@@ -201,38 +314,38 @@ class ProjectDatabase:
         db["projects"] = [p for p in db["projects"] if p["uuid"] != project_uuid]
         
         if len(db["projects"]) < original_count:
+            previous_signature = self._signature()
             self._write_db(db)
+            self._update_index(previous_signature, delete=[project_uuid])
             print(f"Permanently deleted project: {project_uuid}")
             return True
         
         print(f"Project not found: {project_uuid}")
         return False
     
-    def search_projects(self, query: str) -> List[Dict]:
+    @_locked
+    def search_projects(self, query: str, limit: int = None) -> List[Dict]:
         """
-        Search projects by name, description, or repo_name
+        Search projects by name, repo_name, description, metadata and tracked
+        file paths, ranked with BM25; words also match as prefixes
         
         Args:
             query: Search query string
+            limit: Maximum number of results (default: all matches)
             
         Returns:
-            List of matching projects
+            List of matching projects, best match first
         """
-        db = self._read_db()
-        query_lower = query.lower()
-        
-        results = []
-        for project in db["projects"]:
-            if project.get("status") == "deleted":
-                continue
-            
-            # Search in name, description, and repo_name
-            if (query_lower in project["name"].lower() or
-                query_lower in project.get("description", "").lower() or
-                query_lower in project["repo_name"].lower()):
-                results.append(project)
+        index = self._search_index()
+        ranked = index.search(query, limit)
+        if not ranked:
+            return []
         
-        return results
+        # Parsed projects are kept per database signature; callers get copies
+        if self._projects_by_uuid is None or self._projects_by_uuid[0] != index.signature:
+            self._projects_by_uuid = (index.signature, {p["uuid"]: p for p in self._read_db()["projects"]})
+        projects = self._projects_by_uuid[1]
+        return [copy.deepcopy(projects[project_uuid]) for project_uuid, _ in ranked if project_uuid in projects]
     
     def get_summary(self) -> str:
         """Get a summary of all projects for LLM context"""
@@ -295,10 +408,13 @@ Last Updated: {project.get('updated_at', 'Unknown')}
 
 # Global instance for easy access
 _db_instance = None
+_db_lock = threading.Lock()
 
 def get_db() -> ProjectDatabase:
     """Get the global database instance"""
     global _db_instance
     if _db_instance is None:
-        _db_instance = ProjectDatabase()
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = ProjectDatabase()
     return _db_instance
@@ -0,0 +1,170 @@
+"""
+Remote State - Batched GitHub GraphQL fetch of head commit, recent commits and file tree
+One query answers change detection for any number of repositories
+"""
+import json
+from typing import Dict, List, Optional
+
+from github import Github
+
+from lib.github_calls import github_call
+from tools.repo_cache import RepoMetadataCache
+
+# Tree levels expanded inside the query; deeper folders are fetched with one REST call each
+TREE_DEPTH = 8
+# Repositories per GraphQL request, to stay under GitHub's query complexity limits
+REPOS_PER_QUERY = 10
+
+
+def _tree_selection(depth: int) -> str:
+    """Nested TreeEntry selection; GraphQL fragments cannot recurse, so expand it in text"""
+    selection = "path type oid size"
+    if depth > 1:
+        selection += " object { ... on Tree { entries { " + _tree_selection(depth - 1) + " } } }"
+    return selection
+
+
+def build_query(repos: List[tuple], history_size: int, tree_depth: int = TREE_DEPTH,
+                include_tree: bool = True) -> str:
+    """
+    Build one query with an aliased repository block per repo
+
+    Args:
+        repos: (owner, name) pairs
+        history_size: Commits to read back from each head
+        tree_depth: Levels of the tree to expand
+        include_tree: Whether to fetch tree entries at all
+    """
+    tree = f"tree {{ oid entries {{ {_tree_selection(tree_depth)} }} }}" if include_tree else "tree { oid }"
+    blocks = []
+    for index, (owner, name) in enumerate(repos):
+        blocks.append(
+            f"r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{ "
+            f"defaultBranchRef {{ name target {{ ... on Commit {{ oid {tree} "
+            f"history(first: {history_size}) {{ nodes {{ oid message committedDate url author {{ name date }} }} }} "
+            f"}} }} }} }}"
+        )
+    return "query { " + " ".join(blocks) + " }"
+
+
+class RemoteStateFetcher:
+    """Fetches what change detection needs from GitHub in a constant number of requests"""
+
+    def __init__(self, gh_client: Github, repo_cache: RepoMetadataCache, tree_depth: int = TREE_DEPTH):
+        """
+        Initialize the fetcher
+
+        Args:
+            gh_client: Authenticated GitHub client
+            repo_cache: Shared repo metadata cache (owner login, REST fallbacks)
+            tree_depth: Tree levels expanded in the GraphQL query
+        """
+        self.gh_client = gh_client
+        self.repo_cache = repo_cache
+        self.tree_depth = tree_depth
+
+    def _query(self, query: str) -> Dict:
+        requester = self.gh_client.requester
+        # Posted directly rather than via graphql_query, which raises on any error and
+        # would throw away the other repos' data when one repo in the batch is missing
+        _, data = github_call("graphql", requester.requestJsonAndCheck, "POST", requester.graphql_url,
+                              input={"query": query, "variables": {}})
+        if not data.get("data") and data.get("errors"):
+            raise Exception(f"GraphQL query failed: {data['errors'][0].get('message')}")
+        return data.get("data") or {}
+
+    def _flatten_tree(self, repo_name: str, entries: List[Dict], depth: int, files: Dict[str, Dict]):
+        for entry in entries:
+            if entry["type"] == "blob":
+                files[entry["path"]] = {'sha': entry["oid"], 'size': entry.get("size")}
+            elif entry["type"] == "tree":
+                subtree = entry.get("object")
+                if depth > 1 and subtree is not None:
+                    self._flatten_tree(repo_name, subtree.get("entries") or [], depth - 1, files)
+                else:
+                    # Deeper than the query expanded; one recursive REST call for the subtree
+                    repo = self.repo_cache.get_repo(repo_name)
+                    tree = github_call("get_git_tree", repo.get_git_tree, entry["oid"], recursive=True)
+                    for item in tree.tree:
+                        if item.type == "blob":
+                            files[f"{entry['path']}/{item.path}"] = {'sha': item.sha, 'size': item.size}
+
+    def _commits_since(self, repo_name: str, head: Dict, since_sha: Optional[str],
+                       max_commits: int) -> tuple:
+        """Commits newer than since_sha (newest first) and whether the list was cut short"""
+        commits = []
+        found = since_sha is None
+        for node in head["history"]["nodes"]:
+            if node["oid"] == since_sha:
+                found = True
+                break
+            commits.append({
+                'sha': node["oid"],
+                'message': node["message"],
+                'author': (node.get("author") or {}).get("name"),
+                'date': node["committedDate"],
+                'url': node["url"]
+            })
+
+        if found:
+            return commits[:max_commits], len(commits) > max_commits
+
+        # since_sha is older than the history window: ask compare how far ahead head is
+        repo = self.repo_cache.get_repo(repo_name)
+        try:
+            comparison = github_call("compare", repo.compare, since_sha, head["oid"])
+        except Exception:
+            # since_sha is gone (force push, rewritten history); report what we have
+            return commits[:max_commits], True
+        return commits[:max_commits], comparison.ahead_by > max_commits
+
+    def fetch(self, repo_names: List[str], since: Dict[str, str] = None, max_commits: int = 10,
+              include_tree: bool = True) -> Dict[str, Dict]:
+        """
+        Fetch head, commits since a known SHA and the file tree for several repos
+
+        Args:
+            repo_names: Repositories owned by the authenticated user
+            since: Map of repo name to the last known commit SHA
+            max_commits: Maximum commits returned per repo
+            include_tree: Fetch file listings as well
+
+        Returns:
+            Dict mapping repo name to state: default_branch, head_sha, tree_sha,
+            files (path -> sha, size), commits, commits_truncated; or error
+        """
+        since = since or {}
+        owner = self.repo_cache.user.login
+        # Read one past the limit so since_sha sitting just outside is still found
+        history_size = max_commits + 1
+        states = {}
+
+        for start in range(0, len(repo_names), REPOS_PER_QUERY):
+            batch = repo_names[start:start + REPOS_PER_QUERY]
+            query = build_query([(owner, name) for name in batch], history_size, self.tree_depth, include_tree)
+            data = self._query(query)
+
+            for index, repo_name in enumerate(batch):
+                repository = data.get(f"r{index}")
+                if repository is None:
+                    states[repo_name] = {'error': f"Repository '{repo_name}' not found"}
+                    continue
+                branch_ref = repository.get("defaultBranchRef")
+                if branch_ref is None:
+                    states[repo_name] = {'error': f"Repository '{repo_name}' has no commits"}
+                    continue
+
+                head = branch_ref["target"]
+                files = {}
+                if include_tree:
+                    self._flatten_tree(repo_name, head["tree"].get("entries") or [], self.tree_depth, files)
+                commits, truncated = self._commits_since(repo_name, head, since.get(repo_name), max_commits)
+                states[repo_name] = {
+                    'default_branch': branch_ref["name"],
+                    'head_sha': head["oid"],
+                    'tree_sha': head["tree"]["oid"],
+                    'files': files,
+                    'commits': commits,
+                    'commits_truncated': truncated
+                }
+        return states
@@ -0,0 +1,146 @@
+"""
+Repo Cache - Short-lived cache of GitHub repository metadata
+Keeps the authenticated user, repo objects, default branches and branch heads between operations
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from github import Github
+from github.GitCommit import GitCommit
+from github.GitRef import GitRef
+from github.Repository import Repository
+
+from lib.github_calls import github_call
+
+
+class RepoMetadataCache:
+    """
+    Caches what every commit/update/detect used to re-fetch: the user login,
+    the repo object (which carries default_branch) and the head ref/commit of
+    each branch. Entries expire after a short TTL and are refreshed or dropped
+    explicitly after our own pushes.
+    """
+
+    def __init__(self, gh_client: Github, ttl: float = None):
+        """
+        Initialize the cache
+
+        Args:
+            gh_client: Authenticated GitHub client
+            ttl: Seconds an entry stays fresh (default: DARTINBOT_REPO_CACHE_TTL or 60)
+        """
+        self.gh_client = gh_client
+        self.ttl = ttl if ttl is not None else float(os.getenv("DARTINBOT_REPO_CACHE_TTL", "60"))
+        self._user = None
+        self._repos: Dict[str, Tuple[Repository, float]] = {}
+        self._heads: Dict[Tuple[str, str], Tuple[GitRef, GitCommit, float]] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, fetched_at: float) -> bool:
+        return time.monotonic() - fetched_at < self.ttl
+
+    @property
+    def user(self):
+        """The authenticated user, with its login resolved once per process"""
+        if self._user is None:
+            user = self.gh_client.get_user()
+            # AuthenticatedUser is lazy; resolving login here saves a /user call per get_repo
+            github_call("get_user", lambda: user.login)
+            self._user = user
+        return self._user
+
+    def get_repo(self, repo_name: str) -> Repository:
+        """
+        Get a repository object, from cache when fresh
+
+        Raises:
+            GithubException: If the repository does not exist
+        """
+        with self._lock:
+            cached = self._repos.get(repo_name)
+        if cached and self._fresh(cached[1]):
+            return cached[0]
+        repo = github_call("get_repo", self.user.get_repo, repo_name)
+        self.put_repo(repo)
+        return repo
+
+    def put_repo(self, repo: Repository):
+        """Store a repo object we already have (e.g. just created)"""
+        with self._lock:
+            self._repos[repo.name] = (repo, time.monotonic())
+
+    def default_branch(self, repo_name: str) -> str:
+        """Default branch from the repo payload; no extra request"""
+        return self.get_repo(repo_name).default_branch or "main"
+
+    def head(self, repo_name: str, branch: str = None) -> Tuple[str, GitRef, GitCommit]:
+        """
+        Resolve a branch to its ref and head commit
+
+        Args:
+            repo_name: Repository name
+            branch: Branch name (default: the repo's default branch)
+
+        Returns:
+            (branch, ref, commit)
+
+        Raises:
+            GithubException: If the branch does not exist (e.g. an empty repo)
+        """
+        branch = branch or self.default_branch(repo_name)
+        key = (repo_name, branch)
+        with self._lock:
+            cached = self._heads.get(key)
+        if cached and self._fresh(cached[2]):
+            return branch, cached[0], cached[1]
+
+        repo = self.get_repo(repo_name)
+        ref = github_call("get_git_ref", repo.get_git_ref, f"heads/{branch}")
+        commit = github_call("get_git_commit", repo.get_git_commit, ref.object.sha)
+        with self._lock:
+            self._heads[key] = (ref, commit, time.monotonic())
+        return branch, ref, commit
+
+    def update_head(self, repo_name: str, branch: str, ref: GitRef, commit: GitCommit):
+        """Record a branch head we just pushed, so the next operation needs no lookup"""
+        with self._lock:
+            self._heads[(repo_name, branch)] = (ref, commit, time.monotonic())
+
+    def invalidate(self, repo_name: str, branch: Optional[str] = None):
+        """
+        Drop cached state for a repo (or only one of its branches)
+
+        Args:
+            repo_name: Repository name
+            branch: Only forget this branch head; None forgets the repo entirely
+        """
+        with self._lock:
+            if branch is None:
+                self._repos.pop(repo_name, None)
+            for key in [k for k in self._heads if k[0] == repo_name and (branch is None or k[1] == branch)]:
+                del self._heads[key]
+
+
+# Global instance for easy access
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_repo_cache(gh_client: Github) -> RepoMetadataCache:
+    """
+    Get the process-wide repo metadata cache
+
+    Every ProjectSourceControl (chat plugin, background jobs, scaffolder)
+    shares it, so a push or invalidation by one is seen by all of them.
+
+    Args:
+        gh_client: Client used for lookups if this call creates the cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RepoMetadataCache(gh_client)
+    return _cache
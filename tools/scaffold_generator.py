@@ -1,5 +1,4 @@
 import os
-import json
 
 from semantic_kernel.functions import kernel_function
 
@@ -7,9 +6,16 @@ from  lib.CONSTANTS import (
     SCAFFOLD_PROMPT_FILE,
     SCAFFOLD_DIRECTORY
     )
+from lib.cancellation import check_cancelled
 from lib.claude_details import AnthropicDetails
 from lib.log_client import logClient
+from lib.metrics import timed
+from lib.progress import emit
+from lib.tracing import span, traced
+from tools.blob_store import get_blob_store
+from tools.output_parser import SCAFFOLD, OutputParseError, parse_model_output
 from tools.source_control import ProjectSourceControl
+from tools.template_library import get_template_library, templates_enabled
 
 class ProjectScaffold:
     """
@@ -19,48 +25,55 @@ class ProjectScaffold:
         self.anthropic_details = AnthropicDetails()
         self.anthropic_client = self.anthropic_details.anthropic_client()
         self.logger = logClient(__name__)
+        self._source_control = None
+
+    @property
+    def source_control(self) -> ProjectSourceControl:
+        """GitHub client wrapper, created on first use and reused afterwards"""
+        if self._source_control is None:
+            self._source_control = ProjectSourceControl()
+        return self._source_control
+
+    def _stream_text(self, query: str, task: str = "scaffold") -> str:
+        """Send a prompt to Claude and collect the streamed response text"""
+        return self.anthropic_details.stream_text(query, client=self.anthropic_client, task=task)
 
     def project_scaffolder(self, user_query: str) -> dict:
-        client = self.anthropic_client
-        with open(SCAFFOLD_PROMPT_FILE, "r") as file:
-            prompt = file.read()
-            file.close()
-        query = user_query + "\n" + prompt
-        
-        # Stream is required for large responses
-        response = client.messages.create(
-            model=self.anthropic_details.claude_sonnet_latest(),
-            max_tokens=64000,
-            stream=True,
-            messages=[
-                {
-                "role": "user",
-                "content": query,
-                }
-                ]
-                )
-        
-        # Collect the full response text from streaming chunks
-        full_text = ""
-        with response as stream:
-            for event in stream:
-                if event.type == "content_block_delta":
-                    if hasattr(event.delta, "text"):
-                        full_text += event.delta.text
+        # Common stacks start from a local base template, so Claude only
+        # writes the project-specific files instead of all the boilerplate
+        library = get_template_library()
+        template = library.match(user_query) if templates_enabled() else None
+        if template is not None:
+            self.logger.info(f"Using base template {template.ref} for scaffold")
+            query = library.build_prompt(template, user_query)
+        else:
+            with open(SCAFFOLD_PROMPT_FILE, "r") as file:
+                prompt = file.read()
+                file.close()
+            query = user_query + "\n" + prompt
         
-        # Extract JSON from the response
-        json_start = full_text.find('{')
-        json_end = full_text.rfind('}') + 1
-        json_str = full_text[json_start:json_end]
+        full_text = self._stream_text(query)
         
-        # Parse and return the JSON
-        return json.loads(json_str)
+        # Parse and validate the JSON, re-asking only for malformed files
+        scaffold = parse_model_output(
+            full_text,
+            SCAFFOLD,
+            repair_fn=lambda repair_prompt: self._stream_text(
+                f"PROJECT REQUEST: {user_query}\n\n{repair_prompt}", task="repair"
+            ),
+            logger=self.logger
+        )
+        if template is not None:
+            scaffold = library.merge(template, scaffold)
+        return scaffold
      
     @kernel_function(
             description="""
 Generate Project Scaffold and commit to GitHub
 """
     )
+    @timed("generate_scaffold")
+    @traced("generate_scaffold")
     def generate_scaffold(self, query: str) -> str:
         """
         Generates a project scaffold from user query and automatically commits to GitHub.
@@ -72,64 +85,78 @@ Generate Project Scaffold and commit to GitHub
             Status message with project details and GitHub URL
         """
         logger = self.logger
-        create = ProjectScaffold()
+        create = self
 
         # Generate the scaffold once and reuse it
         logger.info(f"Generating scaffold for query: {query}")
-        scaffold = create.project_scaffolder(query)
+        try:
+            scaffold = create.project_scaffolder(query)
+        except OutputParseError as e:
+            logger.error(f"Scaffold output could not be parsed: {e}")
+            return f"Failed to generate scaffold: {e}"
 
         project_name = scaffold['project_name']
         project_desc = scaffold['description']
         
         print(f"\nCreating project: {project_name}")
-        print(f"Description: {project_desc}\n")
+        print(f"Description: {project_desc}")
+        if scaffold.get("template"):
+            print(f"Base template: {scaffold['template']}")
+        print()
 
+        check_cancelled("writing the project")
         # Create project directory path
         project_path = os.path.join(SCAFFOLD_DIRECTORY, project_name)
         os.makedirs(project_path, exist_ok=True)
         logger.info(f"Created project directory: {project_path}")
 
-        # Create all folders
-        print("Creating directories...")
-        folders = scaffold["structure"]["folders"]
-        for dir in folders:
-            try:
-                full_path = os.path.join(project_path, dir)
-                os.makedirs(full_path, exist_ok=True)
-                print(f"  [SUCCESS] {dir}")
-            except Exception as e:
-                logger.error(f"Error creating directory {dir}: {e}")
-                print(f"  [ERROR] Error creating {dir}: {e}")
+        # Materialize the scaffold on disk
+        with span("scaffold.materialize", project=project_name) as s:
+            # Create all folders
+            print("Creating directories...")
+            folders = scaffold["structure"]["folders"]
+            for dir in folders:
+                try:
+                    full_path = os.path.join(project_path, dir)
+                    os.makedirs(full_path, exist_ok=True)
+                    print(f"  [SUCCESS] {dir}")
+                except Exception as e:
+                    logger.error(f"Error creating directory {dir}: {e}")
+                    print(f"  [ERROR] Error creating {dir}: {e}")
 
-        # Create all files
-        print("\nCreating files...")
-        files = scaffold["structure"]["files"]
-        file_count = 0
-        for file_path, content in files.items():
-            try:
-                full_path = os.path.join(project_path, file_path)
+            # Create all files
+            print("\nCreating files...")
+            files = scaffold["structure"]["files"]
+            file_count = 0
+            # Boilerplate shared with earlier projects is linked from the blob store, not rewritten
+            blob_store = get_blob_store()
+            for file_path, content in files.items():
+                try:
+                    full_path = os.path.join(project_path, file_path)
         
-                # Create parent directory if it doesn't exist
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    # Create parent directory if it doesn't exist
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
         
-                # Write file content
-                with open(full_path, "w", encoding="utf-8") as f:
-                    f.write(content)
+                    # Write file content
+                    blob_store.write(full_path, content)
                     print(f"  [SUCCESS] {file_path}")
                     file_count += 1
-            except Exception as e:
-                logger.error(f"Error creating file {file_path}: {e}")
-                print(f"  [ERROR] Error creating {file_path}: {e}")
+                except Exception as e:
+                    logger.error(f"Error creating file {file_path}: {e}")
+                    print(f"  [ERROR] Error creating {file_path}: {e}")
+            s.set_attributes(folders=len(folders), files=file_count)
+        emit("files_written", project=project_name, count=file_count)
 
         print(f"\n[SUCCESS] Project '{project_name}' created successfully!")
         print(f"Location: {project_path}")
         print(f"Total files: {file_count}")
         
         # Automatically commit to GitHub
+        check_cancelled("creating the GitHub repository")
         print("\nCommitting to GitHub...")
         logger.info(f"Initiating GitHub commit for project: {project_name}")
         
-        source_control = ProjectSourceControl()
+        source_control = self.source_control
         commit_result = source_control.commit_project(
             project_root_path=project_path,
             repo_name=project_name,
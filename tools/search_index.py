@@ -0,0 +1,307 @@
+"""
+Search Index - Persistent inverted index with BM25 ranking for the project database
+Indexes names, descriptions, metadata and tracked file paths; updated per project, not rebuilt
+"""
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from tools.snapshots import load_snapshot
+
+# Field weights: a hit in the name counts for more than one in a file path
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "repo_name": 3.0,
+    "description": 1.5,
+    "metadata": 1.0,
+    "paths": 0.5
+}
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# A query term that only matches as a prefix scores this fraction of an exact match
+PREFIX_WEIGHT = 0.5
+# Journal entries replayed on load before the index is rewritten as one snapshot
+COMPACT_AFTER = 200
+
+# Metadata keys that hold hashes or bulky structures rather than searchable text
+_SKIP_METADATA = {"file_snapshot", "commit_sha", "snapshot_created_at", "snapshot_updated_at"}
+
+_TOKEN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split on punctuation and camelCase, lowercased: 'src/apiClient.py' -> src, api, client, py"""
+    return [t.lower() for t in _TOKEN.findall(text or "")]
+
+
+def _metadata_text(value, key: str = "") -> List[str]:
+    if key in _SKIP_METADATA or key.endswith("_sha") or key.endswith("uuid"):
+        return []
+    if isinstance(value, dict):
+        return [t for k, v in value.items() for t in _metadata_text(v, k)]
+    if isinstance(value, list):
+        return [t for v in value for t in _metadata_text(v)]
+    if isinstance(value, str):
+        return [value]
+    return []
+
+
+def document_fields(project: Dict) -> Dict[str, List[str]]:
+    """Tokens per field for one project"""
+    metadata = project.get("metadata") or {}
+    return {
+        "name": tokenize(project.get("name", "")),
+        "repo_name": tokenize(project.get("repo_name", "")),
+        "description": tokenize(project.get("description", "")),
+        "metadata": [t for text in _metadata_text(metadata) for t in tokenize(text)],
+        "paths": [t for path in (load_snapshot(metadata.get("file_snapshot")) or ()) for t in tokenize(path)]
+    }
+
+
+def build_document(project: Dict) -> Dict:
+    """Weighted term frequencies and length of one project"""
+    tf: Dict[str, float] = {}
+    length = 0.0
+    for field, tokens in document_fields(project).items():
+        weight = FIELD_WEIGHTS[field]
+        length += weight * len(tokens)
+        for token in tokens:
+            tf[token] = tf.get(token, 0.0) + weight
+    return {"len": length, "tf": tf}
+
+
+class SearchIndex:
+    """
+    Inverted index over projects, persisted as a snapshot plus an append-only
+    journal so each change writes one line instead of the whole index.
+    The database file's (mtime, size) is recorded with every write; if the
+    database changed behind the index's back, the index is rebuilt.
+    """
+
+    def __init__(self, index_path: str):
+        """
+        Initialize the index
+
+        Args:
+            index_path: Snapshot file; the journal sits next to it with a .log suffix
+        """
+        self.index_path = index_path
+        self.journal_path = os.path.splitext(index_path)[0] + ".log"
+        self.docs: Dict[str, Dict] = {}
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.signature: Optional[List[int]] = None
+        self._total_len = 0.0
+        self._terms: List[str] = []
+        self._terms_dirty = True
+        self._journal_entries = 0
+        # BM25 length normalisation per document; valid until the next add or remove
+        self._norms: Optional[Dict[str, float]] = None
+
+    # -- in-memory index ------------------------------------------------------
+
+    def _add(self, project_uuid: str, doc: Dict):
+        self._remove(project_uuid)
+        self._norms = None
+        self.docs[project_uuid] = doc
+        self._total_len += doc["len"]
+        for term, tf in doc["tf"].items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self._terms_dirty = True
+            postings[project_uuid] = tf
+
+    def _remove(self, project_uuid: str):
+        doc = self.docs.pop(project_uuid, None)
+        if doc is None:
+            return
+        self._norms = None
+        self._total_len -= doc["len"]
+        for term in doc["tf"]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(project_uuid, None)
+                if not postings:
+                    del self.postings[term]
+                    self._terms_dirty = True
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Index terms a query term matches, with their match weight"""
+        matches = [(term, 1.0)] if term in self.postings else []
+        if len(term) < 2:
+            return matches
+        if self._terms_dirty:
+            self._terms = sorted(self.postings)
+            self._terms_dirty = False
+        position = bisect.bisect_left(self._terms, term)
+        while position < len(self._terms) and self._terms[position].startswith(term):
+            if self._terms[position] != term:
+                matches.append((self._terms[position], PREFIX_WEIGHT))
+            position += 1
+        return matches
+
+    def _doc_norms(self) -> Dict[str, float]:
+        if self._norms is None:
+            count = len(self.docs)
+            avg_len = self._total_len / count if count and self._total_len > 0 else 1.0
+            self._norms = {u: K1 * (1 - B + B * doc["len"] / avg_len) for u, doc in self.docs.items()}
+        return self._norms
+
+    def _score_term(self, expansions: List[Tuple[str, float, float]],
+                    only: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        BM25 contribution of one query term per document, taking the best
+        expansion per document so a prefix matching many terms is not counted repeatedly
+
+        Args:
+            expansions: (index term, match weight, idf) for the query term
+            only: Score just these documents instead of every posting
+        """
+        norms = self._doc_norms()
+        best: Dict[str, float] = {}
+        for candidate, weight, idf in expansions:
+            postings = self.postings[candidate]
+            if only is not None:
+                postings = {u: postings[u] for u in only if u in postings}
+            factor = weight * idf * (K1 + 1)
+            if len(expansions) == 1:
+                return {u: factor * tf / (tf + norms[u]) for u, tf in postings.items()}
+            for project_uuid, tf in postings.items():
+                score = factor * tf / (tf + norms[project_uuid])
+                if score > best.get(project_uuid, 0.0):
+                    best[project_uuid] = score
+        return best
+
+    def search(self, query: str, limit: int = None) -> List[Tuple[str, float]]:
+        """
+        Rank projects for a query with BM25; each query term also matches as a prefix
+
+        Args:
+            query: Free text query
+            limit: Maximum results (default: all matches)
+
+        Returns:
+            (project uuid, score) pairs, best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs:
+            return []
+        count = len(self.docs)
+
+        # Per query term: its expansions, how many postings they cover and the most it can add to a score
+        groups = []
+        for term in terms:
+            expansions, size, bound = [], 0, 0.0
+            for candidate, weight in self._expand(term):
+                df = len(self.postings[candidate])
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                expansions.append((candidate, weight, idf))
+                size += df
+                bound = max(bound, weight * idf * (K1 + 1))
+            if expansions:
+                groups.append((size, bound, expansions))
+        # Rare terms first: they pick the candidates, common terms mostly just re-rank them
+        groups.sort(key=lambda group: group[0])
+        remaining_bound = sum(group[1] for group in groups)
+
+        scores: Dict[str, float] = {}
+        for size, bound, expansions in groups:
+            only = None
+            if limit and len(scores) >= limit:
+                kth = heapq.nlargest(limit, scores.values())[-1]
+                # No document outside the candidates can catch up: score the candidates only
+                if kth >= remaining_bound:
+                    only = scores
+            for project_uuid, score in self._score_term(expansions, only).items():
+                scores[project_uuid] = scores.get(project_uuid, 0.0) + score
+            remaining_bound -= bound
+
+        if limit:
+            return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    # -- persistence ----------------------------------------------------------
+
+    def load(self, signature: List[int]) -> bool:
+        """
+        Load snapshot and journal
+
+        Args:
+            signature: Current (mtime_ns, size) of the database file
+
+        Returns:
+            True if the index matches the database; False means it must be rebuilt
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for project_uuid, doc in snapshot.get("docs", {}).items():
+            self._add(project_uuid, doc)
+        self.signature = snapshot.get("signature")
+
+        self._journal_entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash; the signature check below catches the gap
+                        break
+                    if "put" in entry:
+                        self._add(entry["put"], entry["doc"])
+                    else:
+                        self._remove(entry["del"])
+                    self.signature = entry["signature"]
+                    self._journal_entries += 1
+        return self.signature == list(signature)
+
+    def rebuild(self, projects: List[Dict], signature: List[int]):
+        """Index every non-deleted project from scratch and write a fresh snapshot"""
+        self.docs, self.postings, self._total_len, self._terms_dirty = {}, {}, 0.0, True
+        for project in projects:
+            if project.get("status") != "deleted":
+                self._add(project["uuid"], build_document(project))
+        self.compact(signature)
+
+    def compact(self, signature: List[int]):
+        """Write the whole index as a snapshot and drop the journal"""
+        self.signature = list(signature)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "signature": self.signature, "docs": self.docs}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_entries = 0
+
+    def _journal(self, entry: Dict, signature: List[int]):
+        self.signature = list(signature)
+        entry["signature"] = self.signature
+        if self._journal_entries >= COMPACT_AFTER:
+            self.compact(signature)
+            return
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._journal_entries += 1
+
+    def put(self, project: Dict, signature: List[int]):
+        """Index (or re-index) one project after the database was written"""
+        if project.get("status") == "deleted":
+            self.delete(project["uuid"], signature)
+            return
+        doc = build_document(project)
+        self._add(project["uuid"], doc)
+        self._journal({"put": project["uuid"], "doc": doc}, signature)
+
+    def delete(self, project_uuid: str, signature: List[int]):
+        """Drop one project after the database was written"""
+        self._remove(project_uuid)
+        self._journal({"del": project_uuid}, signature)
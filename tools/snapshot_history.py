@@ -0,0 +1,300 @@
+"""
+Snapshot History - Every file snapshot of a project, linked to its commit and PR
+Answers "what changed between any two snapshots (or a snapshot and disk)" locally, without GitHub calls
+"""
+import difflib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+
+from tools.blob_store import get_blob_store
+from tools.snapshots import Snapshot
+
+# Every KEYFRAME_EVERY-th entry stores a full snapshot; the ones between are deltas on their parent
+KEYFRAME_EVERY = 16
+# Characters of patch text kept per diff report
+MAX_PATCH_CHARS = 20000
+
+
+class SnapshotHistory:
+    """
+    Per-project snapshot log under ~/semantic/.dartinbot/snapshots/<project uuid>.jsonl
+
+    One JSON line per snapshot:
+        {"id", "taken_at", "reason", "commit_sha", "pr_number", "pr_url", "branch", "summary", "files",
+         "base": <encoded snapshot>}                       (keyframe)
+        {..., "parent": <id>, "removed": [...], "upserts": <encoded snapshot>}   (delta)
+
+    Retention keeps the newest DARTINBOT_SNAPSHOT_HISTORY entries and drops
+    entries older than DARTINBOT_SNAPSHOT_MAX_AGE_DAYS; the oldest kept entry
+    is rewritten as a keyframe so the log never depends on dropped entries.
+    """
+
+    def __init__(self, history_dir: str = None, keep: int = None, max_age_days: float = None):
+        """
+        Initialize the history
+
+        Args:
+            history_dir: Directory holding the logs (default: ~/semantic/.dartinbot/snapshots)
+            keep: Snapshots kept per project (default: DARTINBOT_SNAPSHOT_HISTORY or 100)
+            max_age_days: Drop snapshots older than this, 0 to keep regardless of age
+                (default: DARTINBOT_SNAPSHOT_MAX_AGE_DAYS or 0)
+        """
+        if history_dir is None:
+            history_dir = Path.home() / "semantic" / ".dartinbot" / "snapshots"
+        self.history_dir = Path(history_dir)
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self.keep = max(1, keep or int(os.getenv("DARTINBOT_SNAPSHOT_HISTORY", "100")))
+        self.max_age_days = max_age_days if max_age_days is not None else \
+            float(os.getenv("DARTINBOT_SNAPSHOT_MAX_AGE_DAYS", "0"))
+        self._lock = threading.RLock()
+
+    def _path(self, project_uuid: str) -> Path:
+        return self.history_dir / f"{project_uuid}.jsonl"
+
+    def entries(self, project_uuid: str) -> List[Dict]:
+        """All stored entries of a project, oldest first"""
+        path = self._path(project_uuid)
+        if not path.exists():
+            return []
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append; the rest is intact
+                    print(f"Skipping unreadable snapshot history line in {path}")
+        return entries
+
+    # -- recording --------------------------------------------------------------
+
+    def record(self, project_uuid: str, snapshot: Snapshot, reason: str, **links) -> int:
+        """
+        Append a snapshot to a project's history
+
+        Args:
+            project_uuid: Project the snapshot belongs to
+            snapshot: The files at this point
+            reason: What took it: commit, update or manual
+            **links: commit_sha, pr_number, pr_url, branch, summary
+
+        Returns:
+            The new snapshot's id
+        """
+        with self._lock:
+            entries = self.entries(project_uuid)
+            entry = {
+                "id": entries[-1]["id"] + 1 if entries else 1,
+                "taken_at": datetime.now().isoformat(),
+                "reason": reason,
+                **{k: v for k, v in links.items() if v is not None},
+                "files": len(snapshot),
+            }
+            if not entries or entry["id"] % KEYFRAME_EVERY == 0:
+                entry["base"] = snapshot.encode()
+            else:
+                removed, upserts = self._materialize(entries, len(entries) - 1).delta(snapshot)
+                entry.update(parent=entries[-1]["id"], removed=removed, upserts=upserts.encode())
+            entries.append(entry)
+
+            if len(entries) > self.keep or self._expired(entries[0]):
+                self._rewrite(project_uuid, self._retain(entries))
+            else:
+                with open(self._path(project_uuid), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            return entry["id"]
+
+    def _expired(self, entry: Dict) -> bool:
+        if not self.max_age_days:
+            return False
+        taken_at = datetime.fromisoformat(entry["taken_at"]).timestamp()
+        return time.time() - taken_at > self.max_age_days * 86400
+
+    def _retain(self, entries: List[Dict]) -> List[Dict]:
+        """Apply the retention policy; the first kept entry becomes a keyframe"""
+        kept_from = max(0, len(entries) - self.keep)
+        while kept_from < len(entries) - 1 and self._expired(entries[kept_from]):
+            kept_from += 1
+        if kept_from == 0:
+            return entries
+        first = dict(entries[kept_from])
+        if "base" not in first:
+            first["base"] = self._materialize(entries, kept_from).encode()
+            for key in ("parent", "removed", "upserts"):
+                first.pop(key, None)
+        return [first] + entries[kept_from + 1:]
+
+    def _rewrite(self, project_uuid: str, entries: List[Dict]):
+        path = self._path(project_uuid)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, path)
+
+    def referenced_hashes(self) -> Set[str]:
+        """Every file hash any kept snapshot of any project refers to (blobs the patches need)"""
+        hashes = set()
+        with self._lock:
+            for path in self.history_dir.glob("*.jsonl"):
+                for entry in self.entries(path.stem):
+                    hashes |= Snapshot.decode(entry["base"] if "base" in entry else entry["upserts"]).hashes()
+        return hashes
+
+    def delete(self, project_uuid: str):
+        """Forget a project's history"""
+        with self._lock:
+            path = self._path(project_uuid)
+            if path.exists():
+                os.remove(path)
+
+    # -- reading ----------------------------------------------------------------
+
+    @staticmethod
+    def _materialize(entries: List[Dict], index: int) -> Snapshot:
+        """Snapshot of entries[index]: the nearest keyframe before it plus the deltas after that"""
+        start = index
+        while "base" not in entries[start]:
+            start -= 1
+        snapshot = Snapshot.decode(entries[start]["base"])
+        for entry in entries[start + 1:index + 1]:
+            snapshot = snapshot.apply(entry["removed"], Snapshot.decode(entry["upserts"]))
+        return snapshot
+
+    @staticmethod
+    def resolve(entries: List[Dict], ref: Union[str, int]) -> Optional[int]:
+        """
+        Position in entries of a snapshot reference
+
+        References:
+            "latest" (or empty): the newest snapshot
+            "-N" or "~N": N snapshots before the newest
+            "N" / "#N": snapshot id N
+            "pr:N": the snapshot taken when PR N was opened
+            a hex commit SHA (7+ characters): the snapshot of that commit
+
+        Returns:
+            Index into entries, or None if nothing matches
+        """
+        ref = str(ref).strip().lower()
+        if not entries:
+            return None
+        if ref in ("", "latest", "head", "0", "-0", "~0"):
+            return len(entries) - 1
+        if ref[0] in "-~" and ref[1:].isdigit():
+            index = len(entries) - 1 - int(ref[1:])
+            return index if index >= 0 else None
+        if ref.lstrip("#").isdigit() and len(ref.lstrip("#")) < 7:
+            snapshot_id = int(ref.lstrip("#"))
+            return next((i for i, e in enumerate(entries) if e["id"] == snapshot_id), None)
+        if ref.startswith("pr:") or ref.startswith("pr#"):
+            number = ref[3:]
+            return next((i for i in range(len(entries) - 1, -1, -1)
+                         if str(entries[i].get("pr_number")) == number), None)
+        return next((i for i in range(len(entries) - 1, -1, -1)
+                     if entries[i].get("commit_sha", "").lower().startswith(ref)), None)
+
+    def snapshot(self, project_uuid: str, ref: Union[str, int] = "latest") -> Optional[Snapshot]:
+        """A project's snapshot by reference (see resolve), or None"""
+        entries = self.entries(project_uuid)
+        index = self.resolve(entries, ref)
+        return None if index is None else self._materialize(entries, index)
+
+    def diff(self, project_uuid: str, from_ref: str = "", to_ref: str = "latest",
+             disk_files: Dict[str, Dict] = None, include_patch: bool = True) -> Dict:
+        """
+        Files changed between two snapshots, or between a snapshot and disk
+
+        Args:
+            project_uuid: Project to query
+            from_ref: Older snapshot (default: the snapshot before to_ref)
+            to_ref: Newer snapshot, or "disk" for the files now on disk
+            disk_files: scan_local_files output, required when a side is "disk"
+            include_patch: Add a unified diff for text files whose versions are both in the blob store
+
+        Returns:
+            Dict with from, to (entry summaries), added, modified, deleted,
+            unchanged, total_changes and patch; or error
+        """
+        entries = self.entries(project_uuid)
+        if not entries:
+            return {"error": "No snapshot history for this project"}
+
+        def side(ref: str):
+            if str(ref).strip().lower() == "disk":
+                if disk_files is None:
+                    return None, None
+                return {"id": "disk", "reason": "files on disk now"}, Snapshot.from_files(disk_files)
+            index = self.resolve(entries, ref)
+            if index is None:
+                return None, None
+            return self._summary(entries[index]), self._materialize(entries, index)
+
+        to_entry, newer = side(to_ref)
+        if newer is None:
+            return {"error": f"No snapshot matches '{to_ref}'"}
+        if not from_ref:
+            # Default: what the to_ref snapshot changed relative to the one before it
+            to_index = len(entries) if to_entry["id"] == "disk" else self.resolve(entries, to_ref)
+            from_ref = str(entries[to_index - 1]["id"]) if to_index > 0 else None
+            if from_ref is None:
+                return {"error": f"Snapshot {to_entry['id']} is the oldest one kept; pass from_snapshot"}
+        from_entry, older = side(from_ref)
+        if older is None:
+            return {"error": f"No snapshot matches '{from_ref}'"}
+
+        result = older.diff(newer)
+        result["from"] = from_entry
+        result["to"] = to_entry
+        result["patch"] = self._patch(result["modified"]) if include_patch else ""
+        return result
+
+    @staticmethod
+    def _summary(entry: Dict) -> Dict:
+        return {k: v for k, v in entry.items() if k not in ("base", "removed", "upserts", "parent")}
+
+    @staticmethod
+    def _patch(modified: List[Dict]) -> str:
+        """Unified diff of modified files whose old and new content are both in the blob store"""
+        store = get_blob_store()
+        if not store.enabled:
+            return ""
+        chunks, size = [], 0
+        for change in modified:
+            try:
+                old = store.path(change["old_hash"]).read_text(encoding="utf-8")
+                new = store.path(change["new_hash"]).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError, ValueError):
+                continue
+            chunk = "".join(difflib.unified_diff(
+                old.splitlines(keepends=True), new.splitlines(keepends=True),
+                fromfile=f"a/{change['path']}", tofile=f"b/{change['path']}"))
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > MAX_PATCH_CHARS:
+                break
+        patch = "\n".join(chunks)
+        return patch if len(patch) <= MAX_PATCH_CHARS else patch[:MAX_PATCH_CHARS] + "\n... (truncated)"
+
+
+# Global instance for easy access
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_snapshot_history() -> SnapshotHistory:
+    """Get the global snapshot history"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = SnapshotHistory()
+    return _history
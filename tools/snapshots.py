@@ -0,0 +1,374 @@
+"""
+Snapshots - Compact columnar file snapshots with delta chains
+A snapshot is a sorted path table with binary digests and array-backed sizes and mtimes; updates store only what changed
+"""
+import base64
+import bisect
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+# Stored under metadata.file_snapshot in the project database
+SNAPSHOT_FORMAT = "dartinbot-snapshot/1"
+# A chain is folded back into one full snapshot after this many deltas,
+# or once the deltas together touch more than half of the base's files
+MAX_DELTAS = 16
+
+_DIGEST_SIZE = 32
+_EMPTY_DIGEST = bytes(_DIGEST_SIZE)
+_HEADER = struct.Struct("<II")
+
+
+def _le(column: array) -> bytes:
+    """Array bytes in little-endian order, whatever the platform"""
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+def _mtime_iso(mtime: float) -> str:
+    return datetime.fromtimestamp(mtime).isoformat()
+
+
+class Snapshot:
+    """
+    Files of a project at one point in time, stored column by column
+
+    paths is sorted; row i of the other columns belongs to paths[i]:
+        digests: 32 raw SHA256 bytes per file (all zero when the file could not be hashed)
+        sizes: array of int64 byte counts
+        mtimes: array of int64 microseconds since the epoch
+    """
+
+    __slots__ = ("paths", "digests", "sizes", "mtimes")
+
+    def __init__(self, paths: List[str] = None, digests: bytes = b"",
+                 sizes: array = None, mtimes: array = None):
+        self.paths = paths or []
+        self.digests = digests
+        self.sizes = sizes if sizes is not None else array("q")
+        self.mtimes = mtimes if mtimes is not None else array("q")
+
+    @classmethod
+    def from_files(cls, files: Dict[str, Dict]) -> "Snapshot":
+        """
+        Build a snapshot from scan_local_files output (path -> hash, size, mtime)
+
+        Args:
+            files: Dict mapping relative paths to file info
+
+        Returns:
+            Snapshot
+        """
+        paths = sorted(files)
+        digests = bytearray()
+        sizes = array("q")
+        mtimes = array("q")
+        for path in paths:
+            info = files[path]
+            digests += bytes.fromhex(info["hash"]) if info.get("hash") else _EMPTY_DIGEST
+            sizes.append(int(info.get("size", 0)))
+            mtimes.append(int(round(float(info.get("mtime", 0)) * 1_000_000)))
+        return cls(paths, bytes(digests), sizes, mtimes)
+
+    # -- row access -------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return self.index(path) is not None
+
+    def index(self, path: str) -> Optional[int]:
+        """Row of a path (binary search), or None"""
+        i = bisect.bisect_left(self.paths, path)
+        if i < len(self.paths) and self.paths[i] == path:
+            return i
+        return None
+
+    def digest(self, i: int) -> bytes:
+        return self.digests[i * _DIGEST_SIZE:(i + 1) * _DIGEST_SIZE]
+
+    def hash(self, i: int) -> str:
+        """Hex SHA256 of row i ("" if the file could not be hashed)"""
+        digest = self.digest(i)
+        return "" if digest == _EMPTY_DIGEST else digest.hex()
+
+    def mtime(self, i: int) -> float:
+        return self.mtimes[i] / 1_000_000
+
+    def entry(self, i: int) -> Dict:
+        """Row i in the scan_local_files shape"""
+        mtime = self.mtime(i)
+        return {"hash": self.hash(i), "size": self.sizes[i], "mtime": mtime, "mtime_iso": _mtime_iso(mtime)}
+
+    def get(self, path: str) -> Optional[Dict]:
+        """File info for a path, or None"""
+        i = self.index(path)
+        return None if i is None else self.entry(i)
+
+    def hashes(self) -> Set[str]:
+        """Hex SHA256 of every hashed file"""
+        return {self.hash(i) for i in range(len(self.paths))} - {""}
+
+    def to_files(self) -> Dict[str, Dict]:
+        """The whole snapshot in the scan_local_files shape"""
+        return {path: self.entry(i) for i, path in enumerate(self.paths)}
+
+    def _take(self, rows: List[int]) -> "Snapshot":
+        digests = b"".join(self.digest(i) for i in rows)
+        return Snapshot([self.paths[i] for i in rows], digests,
+                        array("q", (self.sizes[i] for i in rows)), array("q", (self.mtimes[i] for i in rows)))
+
+    # -- comparison ---------------------------------------------------------------
+
+    def _join(self, newer: "Snapshot") -> Iterator[Tuple[Optional[int], Optional[int]]]:
+        """Merge-join of two sorted path tables: (row in self or None, row in newer or None)"""
+        i = j = 0
+        old_paths, new_paths = self.paths, newer.paths
+        while i < len(old_paths) or j < len(new_paths):
+            if j == len(new_paths) or (i < len(old_paths) and old_paths[i] < new_paths[j]):
+                yield i, None
+                i += 1
+            elif i == len(old_paths) or new_paths[j] < old_paths[i]:
+                yield None, j
+                j += 1
+            else:
+                yield i, j
+                i += 1
+                j += 1
+
+    def diff(self, newer: "Snapshot") -> Dict:
+        """
+        What changed from this snapshot to a newer one, in one merge-join pass
+
+        Args:
+            newer: The later snapshot (e.g. the files on disk now)
+
+        Returns:
+            Dict with added, modified, deleted, unchanged and total_changes,
+            in the compare_local_to_snapshot shape
+        """
+        added, modified, deleted, unchanged = [], [], [], []
+        for i, j in self._join(newer):
+            if i is None:
+                added.append({'path': newer.paths[j], 'size': newer.sizes[j], 'hash': newer.hash(j)})
+            elif j is None:
+                deleted.append({'path': self.paths[i], 'old_hash': self.hash(i)})
+            elif self.digest(i) != newer.digest(j):
+                modified.append({
+                    'path': newer.paths[j],
+                    'size': newer.sizes[j],
+                    'old_hash': self.hash(i),
+                    'new_hash': newer.hash(j),
+                    'old_mtime': _mtime_iso(self.mtime(i)),
+                    'new_mtime': _mtime_iso(newer.mtime(j))
+                })
+            else:
+                unchanged.append(newer.paths[j])
+        return {
+            'added': added,
+            'modified': modified,
+            'deleted': deleted,
+            'unchanged': unchanged,
+            'total_changes': len(added) + len(modified) + len(deleted)
+        }
+
+    def delta(self, newer: "Snapshot") -> Tuple[List[str], "Snapshot"]:
+        """
+        Changes from this snapshot to a newer one
+
+        Returns:
+            Tuple of (removed paths, snapshot of the added or changed rows)
+        """
+        removed, upserts = [], []
+        for i, j in self._join(newer):
+            if j is None:
+                removed.append(self.paths[i])
+            elif i is None or self.digest(i) != newer.digest(j) or self.sizes[i] != newer.sizes[j] \
+                    or self.mtimes[i] != newer.mtimes[j]:
+                upserts.append(j)
+        return removed, newer._take(upserts)
+
+    def apply(self, removed: List[str], upserts: "Snapshot") -> "Snapshot":
+        """
+        The snapshot a delta leads to (merge-join of this snapshot and the upserts)
+
+        Args:
+            removed: Paths that no longer exist
+            upserts: Added or changed rows
+
+        Returns:
+            New snapshot
+        """
+        gone = set(removed)
+        paths, digests, sizes, mtimes = [], bytearray(), array("q"), array("q")
+        for i, j in self._join(upserts):
+            source, row = (upserts, j) if j is not None else (self, i)
+            path = source.paths[row]
+            if path in gone:
+                continue
+            paths.append(path)
+            digests += source.digest(row)
+            sizes.append(source.sizes[row])
+            mtimes.append(source.mtimes[row])
+        return Snapshot(paths, bytes(digests), sizes, mtimes)
+
+    # -- serialization ------------------------------------------------------------
+
+    def encode(self) -> str:
+        """Compressed binary form, base64 so it fits in the JSON database"""
+        path_table = "\0".join(self.paths).encode("utf-8")
+        raw = b"".join((
+            _HEADER.pack(len(self.paths), len(path_table)),
+            path_table,
+            self.digests,
+            _le(self.sizes),
+            _le(self.mtimes),
+        ))
+        return base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+
+    @classmethod
+    def decode(cls, data: str) -> "Snapshot":
+        """Inverse of encode"""
+        raw = zlib.decompress(base64.b64decode(data))
+        count, table_size = _HEADER.unpack_from(raw)
+        pos = _HEADER.size
+        paths = raw[pos:pos + table_size].decode("utf-8").split("\0") if count else []
+        pos += table_size
+        digests = raw[pos:pos + count * _DIGEST_SIZE]
+        pos += count * _DIGEST_SIZE
+        sizes = _from_le("q", raw[pos:pos + count * 8])
+        pos += count * 8
+        mtimes = _from_le("q", raw[pos:pos + count * 8])
+        return cls(paths, digests, sizes, mtimes)
+
+
+class SnapshotChain:
+    """
+    A full base snapshot plus the deltas that lead to the current one
+
+    Serialized form (metadata.file_snapshot):
+        {"format": SNAPSHOT_FORMAT, "files": <count>, "base": <encoded snapshot>,
+         "deltas": [{"removed": [paths], "upserts": <encoded snapshot>}, ...]}
+    """
+
+    def __init__(self, base: Snapshot, deltas: List[Dict] = None):
+        self.base = base
+        self.deltas = deltas or []
+        self._current: Optional[Snapshot] = None
+
+    @property
+    def current(self) -> Snapshot:
+        """The latest snapshot (base with every delta applied)"""
+        if self._current is None:
+            snapshot = self.base
+            for delta in self.deltas:
+                snapshot = snapshot.apply(delta["removed"], Snapshot.decode(delta["upserts"]))
+            self._current = snapshot
+        return self._current
+
+    def append(self, snapshot: Snapshot) -> "SnapshotChain":
+        """
+        Record a newer snapshot as a delta, or as a new base once the chain is long
+
+        Args:
+            snapshot: The new snapshot
+
+        Returns:
+            The chain to store (self, or a new chain based on snapshot)
+        """
+        removed, upserts = self.current.delta(snapshot)
+        touched = len(removed) + len(upserts) + sum(len(d["removed"]) + d.get("changed", 0) for d in self.deltas)
+        if len(self.deltas) >= MAX_DELTAS or touched > len(self.base) // 2:
+            return SnapshotChain(snapshot)
+        self.deltas.append({"removed": removed, "changed": len(upserts), "upserts": upserts.encode()})
+        self._current = snapshot
+        return self
+
+    def to_json(self) -> Dict:
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "files": len(self.current),
+            "base": self.base.encode(),
+            "deltas": self.deltas,
+        }
+
+    @classmethod
+    def from_json(cls, value: Dict) -> "SnapshotChain":
+        return cls(Snapshot.decode(value["base"]), list(value.get("deltas", [])))
+
+
+def load_snapshot(value: Union[Dict, Snapshot, None]) -> Optional[Snapshot]:
+    """
+    The current snapshot from a stored metadata.file_snapshot value
+
+    Accepts the chain format and the older path -> info dict.
+
+    Args:
+        value: Stored value (or an already loaded Snapshot)
+
+    Returns:
+        Snapshot, or None if nothing is stored
+    """
+    if value is None or isinstance(value, Snapshot):
+        return value
+    if not value:
+        return None
+    if value.get("format") == SNAPSHOT_FORMAT:
+        return SnapshotChain.from_json(value).current
+    return Snapshot.from_files(value)
+
+
+def stored_hashes(value: Optional[Dict]) -> Set[str]:
+    """
+    Every file hash a stored metadata.file_snapshot value refers to
+
+    Includes the base and every delta, not just the current snapshot.
+
+    Args:
+        value: Stored value (chain, legacy dict or None)
+
+    Returns:
+        Set of hex SHA256 hashes
+    """
+    if not value:
+        return set()
+    if value.get("format") != SNAPSHOT_FORMAT:
+        return Snapshot.from_files(value).hashes()
+    hashes = Snapshot.decode(value["base"]).hashes()
+    for delta in value.get("deltas", []):
+        hashes |= Snapshot.decode(delta["upserts"]).hashes()
+    return hashes
+
+
+def store_snapshot(previous: Optional[Dict], files: Union[Dict[str, Dict], Snapshot]) -> Dict:
+    """
+    The metadata.file_snapshot value after taking a new snapshot
+
+    Args:
+        previous: The stored value so far (chain, legacy dict or None)
+        files: scan_local_files output or a Snapshot
+
+    Returns:
+        Chain to store: the previous chain plus a delta, or a new full snapshot
+    """
+    snapshot = files if isinstance(files, Snapshot) else Snapshot.from_files(files)
+    if previous and previous.get("format") == SNAPSHOT_FORMAT:
+        return SnapshotChain.from_json(previous).append(snapshot).to_json()
+    return SnapshotChain(snapshot).to_json()
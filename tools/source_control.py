@@ -1,6 +1,7 @@
 import os
 import json
 from datetime import datetime
+from pathlib import Path
 
 from github import (
     Auth,
@@ -9,11 +10,26 @@ from github import (
 )
 from semantic_kernel.functions import kernel_function
 
+from lib.cancellation import check_cancelled
 from lib.log_client import logClient
 from lib.CONSTANTS import SCAFFOLD_PROMPT_FILE
 from lib.claude_details import AnthropicDetails
+from lib.github_calls import github_call
+from lib.metrics import timed
+from lib.progress import emit
+from lib.tracing import traced
 from tools.project_db import get_db
+from tools.batch_update import BatchUpdater, format_report
+from tools.blob_store import get_blob_store
 from tools.change_detector import ChangeDetector
+from tools.git_mirror import GitError, GitRemote
+from tools.git_push import BACKENDS, GitPushBackend, default_push_backend
+from tools.repo_cache import get_repo_cache
+from tools.output_parser import UPDATE, parse_model_output
+from tools.snapshot_history import get_snapshot_history
+from tools.snapshots import Snapshot, store_snapshot, stored_hashes
+
+UPDATE_PROMPT_FILE = Path(__file__).parent / "prompts" / "updatePrompt.md"
 
 class ProjectSourceControl:
     """
@@ -23,12 +39,25 @@ class ProjectSourceControl:
     def __init__(self, ):
         self.GITHUB_PAT = os.getenv("GITHUB_ACCESS_TOKEN")
         self.AUTH = Auth.Token(self.GITHUB_PAT)
-        self.gh_client = Github(auth=self.AUTH)
+        # GITHUB_API_URL points at GitHub Enterprise or a local stand-in.
+        # Pacing and retries are done per operation by lib.github_scheduler, so the
+        # client's fixed sleeps and blind transport retries (which repeat POSTs) are off
+        self.gh_client = Github(
+            auth=self.AUTH,
+            base_url=os.getenv("GITHUB_API_URL", "https://api.github.com"),
+            retry=None,
+            seconds_between_requests=None,
+            seconds_between_writes=None
+        )
         self.logger = logClient(__name__)
         self.anthropic_details = AnthropicDetails()
         self.anthropic_client = self.anthropic_details.anthropic_client()
         self.project_db = get_db()  # Initialize project database
-        self.change_detector = ChangeDetector(self.gh_client, self.project_db)  # Initialize change detector
+        self.repo_cache = get_repo_cache(self.gh_client)  # Repo objects, default branches and heads, shared process-wide
+        self.change_detector = ChangeDetector(self.gh_client, self.project_db, self.repo_cache)  # Initialize change detector
+        self.git_push = GitPushBackend(GitRemote(owner=lambda: self.repo_cache.user.login))  # git transport commits
+        self.blob_store = get_blob_store()  # Content-addressed storage shared by all projects
+        self.snapshot_history = get_snapshot_history()  # Every snapshot, linked to commits and PRs
         logger = self.logger
         if self.GITHUB_PAT is None:
             logger.error("""
@@ -44,18 +73,33 @@ class ProjectSourceControl:
                              Could not Authenticate with the loaded Personal Acces Token".
                              Ensure your Github PAT has sufficient permissions""")
 
+    def _stream_text(self, prompt: str, task: str = "update", cache_prefix: str = None) -> str:
+        """Send a prompt to Claude and collect the streamed response text"""
+        return self.anthropic_details.stream_text(prompt, client=self.anthropic_client, task=task,
+                                                  cache_prefix=cache_prefix)
+
+    def _update_instructions(self) -> str:
+        """Update instructions and JSON format, the stable start of every update prompt"""
+        with open(UPDATE_PROMPT_FILE, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def warm_update_prompt(self) -> bool:
+        """Cache the update instructions before a batch sends them in parallel"""
+        return self.anthropic_details.warm_prompt_cache(self._update_instructions(), client=self.anthropic_client)
+
     @kernel_function(
             description="list all user Github Repositories"
     )
-    async def list_repos(self, ) -> str:
+    @timed("list_repos")
+    def list_repos(self, ) -> str:
         logger = self.logger
         logger.info("Triggering Github List repos LLM function")
         all_repos = []
         try:
             user = self.gh_client.get_user()
             logger.info("Gihub List repos LLM fuction trigger successfully")
-            for repo in user.get_repos():
-                all_repos.append(repo.name)
+            # Pagination requests happen while iterating, so schedule the whole listing
+            all_repos = github_call("get_repos", lambda: [repo.name for repo in user.get_repos()])
             
             logger.info(f"Total repositories found: {len(all_repos)}")
             return f"You have {len(all_repos)} repositories: " + ", ".join([f"**{r}**" for r in all_repos])
@@ -68,7 +112,7 @@ Issue with LLM function call: {e}
     @kernel_function(
             description="List all tracked projects from the project database with their details including UUID, name, repository, location, and status"
     )
-    async def list_projects(self, ) -> str:
+    def list_projects(self, ) -> str:
         """Lists all tracked projects from the database"""
         logger = self.logger
         logger.info("Listing all tracked projects from database")
@@ -80,10 +124,31 @@ Issue with LLM function call: {e}
             logger.error(f"Failed to list projects: {e}")
             return f"Failed to list projects: {e}"
     
+    @kernel_function(
+            description="Search tracked projects by keywords across names, descriptions, metadata and file paths; results are ranked by relevance and partial words match. Use this to find a project when the exact repository name is unknown."
+    )
+    def search_projects(self, query: str, limit: int = 10) -> str:
+        """Search tracked projects"""
+        logger = self.logger
+        logger.info(f"Searching projects for: {query}")
+        try:
+            results = self.project_db.search_projects(query, limit=limit)
+            if not results:
+                return f"No projects match '{query}'"
+            report = f"Found {len(results)} project(s) matching '{query}':\n\n"
+            for project in results:
+                report += f"**{project['name']}** (repo: {project['repo_name']})\n"
+                report += f"  - Description: {project.get('description') or 'No description'}\n"
+                report += f"  - Location: {project['local_path']}\n"
+            return report
+        except Exception as e:
+            logger.error(f"Failed to search projects: {e}")
+            return f"Failed to search projects: {e}"
+    
     @kernel_function(
             description="Get detailed context about a specific project by repository name. Use this to check if a project exists before creating it."
     )
-    async def get_project_info(self, repo_name: str) -> str:
+    def get_project_info(self, repo_name: str) -> str:
         """Get detailed information about a specific project"""
         logger = self.logger
         logger.info(f"Getting project info for: {repo_name}")
@@ -102,7 +167,8 @@ Issue with LLM function call: {e}
     @kernel_function(
             description="Detect changes in a project - checks for modifications made locally (by user or other agents) and on GitHub since last check. Use this to understand what changed in a project."
     )
-    async def detect_project_changes(self, repo_name: str) -> str:
+    @timed("detect_project_changes")
+    def detect_project_changes(self, repo_name: str) -> str:
         """Detect and report changes in a project"""
         logger = self.logger
         logger.info(f"Detecting changes for: {repo_name}")
@@ -118,7 +184,7 @@ Issue with LLM function call: {e}
     @kernel_function(
             description="Update the file snapshot for a project in the database. Use this after making changes to track the new baseline state."
     )
-    async def update_project_snapshot(self, repo_name: str) -> str:
+    def update_project_snapshot(self, repo_name: str) -> str:
         """Update the file snapshot for a project"""
         logger = self.logger
         logger.info(f"Updating snapshot for: {repo_name}")
@@ -133,10 +199,121 @@ Issue with LLM function call: {e}
             logger.error(f"Failed to update snapshot: {e}")
             return f"Failed to update snapshot: {e}"
 
+    @kernel_function(
+            description="Show the diff of a project's repository between two commits. Leave base_sha empty to diff from the last commit the chatbot recorded, and head_sha empty for the latest commit on the default branch."
+    )
+    def get_project_diff(self, repo_name: str, base_sha: str = "", head_sha: str = "") -> str:
+        """Report files and patch changed between two commits"""
+        logger = self.logger
+        logger.info(f"Diffing {repo_name}: {base_sha or 'last known'}..{head_sha or 'HEAD'}")
+        if not base_sha:
+            project = self.project_db.get_project_by_repo(repo_name)
+            base_sha = (project or {}).get('metadata', {}).get('commit_sha', "")
+            if not base_sha:
+                return f"No recorded commit for '{repo_name}'; pass base_sha explicitly"
+        
+        diff = self.change_detector.get_commit_diff(repo_name, base_sha, head_sha or None)
+        if 'error' in diff:
+            logger.error(f"Failed to diff {repo_name}: {diff['error']}")
+            return f"Failed to get diff: {diff['error']}"
+        
+        if not diff['files']:
+            return f"No changes between {base_sha[:7]} and {diff['head'][:7]}"
+        report = f"📝 {len(diff['files'])} file(s) changed between {base_sha[:7]} and {diff['head'][:7]}:\n"
+        for f in diff['files']:
+            report += f"  - {f['path']} ({f['status']}, +{f['additions']}/-{f['deletions']})\n"
+        if diff['patch']:
+            # Keep the patch within what is useful in a chat reply
+            patch = diff['patch'] if len(diff['patch']) <= 20000 else diff['patch'][:20000] + "\n... (truncated)"
+            report += f"\n```diff\n{patch}\n```"
+        return report
+
+    @kernel_function(
+            description="List a project's saved file snapshots (newest first) with their ids, commits, PRs and summaries. Use the ids or refs with diff_project_snapshots."
+    )
+    def list_project_snapshots(self, repo_name: str, limit: int = 10) -> str:
+        """Report the newest snapshots in a project's history"""
+        project = self.project_db.get_project_by_repo(repo_name)
+        if not project:
+            return f"No project found with repository name: {repo_name}"
+        entries = self.snapshot_history.entries(project['uuid'])
+        if not entries:
+            return f"No snapshot history for '{repo_name}' yet"
+        
+        report = f"📸 {len(entries)} snapshot(s) of '{repo_name}' (newest first):\n"
+        for entry in reversed(entries[-max(1, limit):]):
+            line = f"  - #{entry['id']} {entry['taken_at'][:19]} {entry['reason']}, {entry['files']} files"
+            if entry.get('commit_sha'):
+                line += f", commit {entry['commit_sha'][:7]}"
+            if entry.get('pr_number'):
+                line += f", PR #{entry['pr_number']}"
+            if entry.get('summary'):
+                line += f": {entry['summary']}"
+            report += line + "\n"
+        return report
+
+    @kernel_function(
+            description="Show which files changed between two saved snapshots of a project, or between a snapshot and the files on disk, without calling GitHub. Refs: 'latest', '-N' (N snapshots back), a snapshot id like '5', 'pr:12', a commit SHA, or 'disk'. Leave from_snapshot empty to see what to_snapshot changed relative to the snapshot before it, e.g. to_snapshot='-2' for the change two updates ago."
+    )
+    @timed("diff_project_snapshots")
+    def diff_project_snapshots(self, repo_name: str, from_snapshot: str = "", to_snapshot: str = "latest") -> str:
+        """Report the files (and, when available, the patch) changed between two snapshots"""
+        logger = self.logger
+        project = self.project_db.get_project_by_repo(repo_name)
+        if not project:
+            return f"No project found with repository name: {repo_name}"
+        
+        sides = (str(from_snapshot).strip().lower(), str(to_snapshot).strip().lower())
+        disk_files = self.change_detector.scan_local_files(project['local_path']) if "disk" in sides else None
+        diff = self.snapshot_history.diff(project['uuid'], from_snapshot, to_snapshot, disk_files=disk_files)
+        if 'error' in diff:
+            logger.warning(f"Snapshot diff for {repo_name} failed: {diff['error']}")
+            return f"Cannot diff snapshots of '{repo_name}': {diff['error']}"
+        
+        def label(entry: dict) -> str:
+            if entry['id'] == "disk":
+                return "disk"
+            text = f"#{entry['id']} ({entry['reason']}"
+            if entry.get('pr_number'):
+                text += f", PR #{entry['pr_number']}"
+            return text + ")"
+        
+        span_text = f"{label(diff['from'])} → {label(diff['to'])}"
+        if not diff['total_changes']:
+            return f"No file changes between {span_text}"
+        report = f"📝 {diff['total_changes']} file(s) changed between {span_text}:\n"
+        if diff['to'].get('summary'):
+            report += f"Summary: {diff['to']['summary']}\n"
+        for f in diff['added']:
+            report += f"  - {f['path']} (added)\n"
+        for f in diff['modified']:
+            report += f"  - {f['path']} (modified)\n"
+        for f in diff['deleted']:
+            report += f"  - {f['path']} (deleted)\n"
+        if diff['patch']:
+            report += f"\n```diff\n{diff['patch']}\n```"
+        return report
+
+    @kernel_function(
+            description="Choose how a project's commits are pushed: 'git' commits locally and pushes over git (fast for large projects), 'api' builds commits through the GitHub API."
+    )
+    def set_project_push_backend(self, repo_name: str, backend: str) -> str:
+        """Save the push backend for a project"""
+        logger = self.logger
+        backend = backend.strip().lower()
+        if backend not in BACKENDS:
+            return f"Unknown push backend '{backend}'; use one of: {', '.join(BACKENDS)}"
+        project = self.project_db.get_project_by_repo(repo_name)
+        if not project:
+            return f"No project found with repository name: {repo_name}"
+        self.project_db.update_metadata(project['uuid'], {"push_backend": backend})
+        logger.info(f"Push backend for {repo_name} set to {backend}")
+        return f"✅ '{repo_name}' will push with the {backend} backend"
+
     @kernel_function(
             description="Create Github Repo"
     )  
-    async def create_repo(self, repo_name: str,
+    def create_repo(self, repo_name: str,
                     project_description: str) -> str:
         """
         Creates a GitHub repository without initializing it with files.
@@ -147,12 +324,13 @@ Issue with LLM function call: {e}
         
         user = self.gh_client.get_user()
         try:
-            new_repo = user.create_repo(
+            new_repo = github_call("create_repo", user.create_repo,
                 name=repo_name,
                 description=project_description,
                 auto_init=False  # Don't auto-initialize with README
             )
             logger.info(f"LLM function create GH repo {new_repo.name} successfully")
+            self.repo_cache.put_repo(new_repo)
             return new_repo.name
         except Exception as e:
             logger.error(f"Error: Unable to create github repo: {e}")
@@ -176,19 +354,119 @@ Issue with LLM function call: {e}
         
         user = self.gh_client.get_user()
         try:
-            new_repo = user.create_repo(
+            new_repo = github_call("create_repo", user.create_repo,
                 name=repo_name,
                 description=project_description,
                 auto_init=True  # Initialize with README to create initial commit
             )
             logger.info(f"Successfully created repository: {new_repo.name}")
+            self.repo_cache.put_repo(new_repo)
             return new_repo
         except Exception as e:
             logger.error(f"Error creating GitHub repository: {e}")
             return None
     
+    def _push_backend(self, repo_name: str, requested: str = None) -> str:
+        """
+        Pick how commits reach GitHub for a project
+        
+        Args:
+            repo_name: Repository name
+            requested: Explicit choice for this call ("api" or "git")
+            
+        Returns:
+            The requested backend, else the project's saved one, else DARTINBOT_PUSH_BACKEND
+        """
+        if requested in BACKENDS:
+            return requested
+        project = self.project_db.get_project_by_repo(repo_name)
+        saved = (project or {}).get('metadata', {}).get('push_backend')
+        return saved if saved in BACKENDS else default_push_backend()
+    
+    def _commit_files_api(self, repo, repo_name: str, files_to_commit: list, commit_message: str):
+        """
+        Commit files through the Git Database API on top of the default branch
+        
+        Returns:
+            (commit sha, branch name)
+        """
+        logger = self.logger
+        # Create blobs for all files using InputGitTreeElement
+        tree_elements = []
+        for file_info in files_to_commit:
+            # Create InputGitTreeElement for each file
+            element = InputGitTreeElement(
+                path=file_info['path'],
+                mode='100644',  # Regular file
+                type='blob',
+                content=file_info['content']
+            )
+            tree_elements.append(element)
+            logger.debug("Added tree element: %s", file_info["path"])
+        
+        logger.info(f"Created {len(tree_elements)} tree elements successfully")
+        
+        # Get the default branch and parent commit (since repo was initialized with auto_init=True)
+        try:
+            branch_name, ref, parent_commit = self.repo_cache.head(repo_name)
+            base_tree = parent_commit.tree
+            logger.info(f"Found {branch_name} branch with base tree: {base_tree.sha}")
+        except Exception as e:
+            # No commits yet; this shouldn't happen with auto_init=True, but handle it
+            logger.warning(f"No default branch found: {e}")
+            parent_commit = None
+            base_tree = None
+            branch_name = repo.default_branch or "main"
+        
+        # Create tree with base tree from parent commit
+        try:
+            if base_tree:
+                tree = github_call("create_git_tree", repo.create_git_tree, tree_elements, base_tree)
+                logger.info(f"Created tree with base: {tree.sha}")
+            else:
+                tree = github_call("create_git_tree", repo.create_git_tree, tree_elements)
+                logger.info(f"Created tree without base: {tree.sha}")
+        except Exception as tree_error:
+            logger.error(f"Failed to create git tree: {type(tree_error).__name__}: {str(tree_error)}")
+            # Log more details about the error
+            if hasattr(tree_error, 'data'):
+                logger.error(f"Error data: {tree_error.data}")
+            if hasattr(tree_error, 'status'):
+                logger.error(f"Error status: {tree_error.status}")
+            raise Exception(f"Git tree creation failed: {type(tree_error).__name__}: {str(tree_error)}")
+        emit("tree_created", repo=repo_name, sha=tree.sha, files=len(tree_elements))
+        
+        # Create commit with parent (to replace the auto-generated README commit)
+        if parent_commit:
+            commit = github_call("create_git_commit", repo.create_git_commit,
+                message=commit_message,
+                tree=tree,
+                parents=[parent_commit]
+            )
+            logger.info(f"Created commit with parent: {commit.sha}")
+        else:
+            commit = github_call("create_git_commit", repo.create_git_commit,
+                message=commit_message,
+                tree=tree,
+                parents=[]
+            )
+            logger.info(f"Created commit without parent: {commit.sha}")
+        
+        # Update branch reference
+        if parent_commit:
+            github_call("update_ref", ref.edit, commit.sha)
+            # ref.edit refreshes the ref in place; remember the new head
+            self.repo_cache.update_head(repo_name, branch_name, ref, commit)
+        else:
+            github_call("create_git_ref", repo.create_git_ref, f"refs/heads/{branch_name}", commit.sha)
+            self.repo_cache.invalidate(repo_name, branch_name)
+        emit("commit_created", repo=repo_name, branch=branch_name, sha=commit.sha)
+        return commit.sha, branch_name
+    
+    @traced("commit_project")
     def commit_project(self, project_root_path: str, repo_name: str, 
-                      project_description: str, commit_message: str = "Initial commit"):
+                      project_description: str, commit_message: str = "Initial commit",
+                      push_backend: str = None):
         """
         Commits an entire project directory to a GitHub repository.
         Creates the repo if it doesn't exist, then commits all files.
@@ -198,6 +476,8 @@ Issue with LLM function call: {e}
             repo_name: Name of the GitHub repository
             project_description: Description of the repository
             commit_message: Commit message (default: "Initial commit")
+            push_backend: "api" (Git Database API) or "git" (local commit + git push);
+                default: the project's saved choice, then DARTINBOT_PUSH_BACKEND
             
         Returns:
             dict with status and repository URL, or error message
@@ -219,8 +499,7 @@ Issue with LLM function call: {e}
         
         # Check if repository already exists, if not create it
         try:
-            user = self.gh_client.get_user()
-            repo = user.get_repo(repo_name)
+            repo = self.repo_cache.get_repo(repo_name)
             logger.info(f"Repository '{repo_name}' already exists, will push to existing repo")
         except:
             # Repository doesn't exist, create it
@@ -254,7 +533,7 @@ Issue with LLM function call: {e}
                             'path': relative_path,
                             'content': content
                         })
-                        logger.info(f"Added file: {relative_path}")
+                        logger.debug("Added file: %s", relative_path)
                     except Exception as e:
                         logger.warning(f"Could not read file {relative_path}: {e}")
             
@@ -262,88 +541,25 @@ Issue with LLM function call: {e}
                 logger.warning("No files found to commit")
                 return {"status": "warning", "message": "No files found to commit", "repo_url": repo.html_url}
             
-            # Create blobs for all files using InputGitTreeElement
-            tree_elements = []
-            for file_info in files_to_commit:
-                # Create InputGitTreeElement for each file
-                element = InputGitTreeElement(
-                    path=file_info['path'],
-                    mode='100644',  # Regular file
-                    type='blob',
-                    content=file_info['content']
-                )
-                tree_elements.append(element)
-                logger.info(f"Added tree element: {file_info['path']}")
-            
-            logger.info(f"Created {len(tree_elements)} tree elements successfully")
-            
-            # Get the current branch and parent commit (since repo was initialized with auto_init=True)
-            try:
-                # Try to get main branch first
-                ref = repo.get_git_ref("heads/main")
-                parent_commit = repo.get_git_commit(ref.object.sha)
-                base_tree = parent_commit.tree
-                branch_name = "main"
-                logger.info(f"Found main branch with base tree: {base_tree.sha}")
-            except Exception as e:
-                # Fall back to master if main doesn't exist
-                try:
-                    ref = repo.get_git_ref("heads/master")
-                    parent_commit = repo.get_git_commit(ref.object.sha)
-                    base_tree = parent_commit.tree
-                    branch_name = "master"
-                    logger.info(f"Found master branch with base tree: {base_tree.sha}")
-                except Exception as e2:
-                    # If neither exists, this shouldn't happen with auto_init=True, but handle it
-                    logger.warning(f"No default branch found: {e}, {e2}")
-                    parent_commit = None
-                    base_tree = None
-                    branch_name = "main"
-            
-            # Create tree with base tree from parent commit
-            try:
-                if base_tree:
-                    tree = repo.create_git_tree(tree_elements, base_tree)
-                    logger.info(f"Created tree with base: {tree.sha}")
-                else:
-                    tree = repo.create_git_tree(tree_elements)
-                    logger.info(f"Created tree without base: {tree.sha}")
-            except Exception as tree_error:
-                logger.error(f"Failed to create git tree: {type(tree_error).__name__}: {str(tree_error)}")
-                # Log more details about the error
-                if hasattr(tree_error, 'data'):
-                    logger.error(f"Error data: {tree_error.data}")
-                if hasattr(tree_error, 'status'):
-                    logger.error(f"Error status: {tree_error.status}")
-                raise Exception(f"Git tree creation failed: {type(tree_error).__name__}: {str(tree_error)}")
-            
-            # Create commit with parent (to replace the auto-generated README commit)
-            if parent_commit:
-                commit = repo.create_git_commit(
-                    message=commit_message,
-                    tree=tree,
-                    parents=[parent_commit]
-                )
-                logger.info(f"Created commit with parent: {commit.sha}")
+            push_backend = self._push_backend(repo_name, push_backend)
+            if push_backend == "git":
+                pushed = self.git_push.commit(project_root_path, repo_name, [f['path'] for f in files_to_commit],
+                                              commit_message, branch=repo.default_branch or "main")
+                commit_sha, branch_name = pushed['sha'], pushed['branch']
+                self.repo_cache.invalidate(repo_name, branch_name)
+                logger.info(f"Pushed commit {commit_sha} to {branch_name} over git")
+                emit("commit_created", repo=repo_name, branch=branch_name, sha=commit_sha)
             else:
-                commit = repo.create_git_commit(
-                    message=commit_message,
-                    tree=tree,
-                    parents=[]
-                )
-                logger.info(f"Created commit without parent: {commit.sha}")
-            
-            # Update branch reference
-            if parent_commit:
-                ref.edit(commit.sha)
-            else:
-                repo.create_git_ref(f"refs/heads/{branch_name}", commit.sha)
+                commit_sha, branch_name = self._commit_files_api(repo, repo_name, files_to_commit, commit_message)
+            if self.change_detector.mirror is not None:
+                self.change_detector.mirror.mark_stale(repo_name)
             
             logger.info(f"Successfully committed {len(files_to_commit)} files to {repo_name}")
             
             # Create file snapshot for change detection
-            file_snapshot = self.change_detector.scan_local_files(project_root_path)
-            logger.info(f"Created file snapshot with {len(file_snapshot)} files")
+            snapshot = Snapshot.from_files(self.change_detector.scan_local_files(project_root_path))
+            file_snapshot = store_snapshot(None, snapshot)
+            logger.info(f"Created file snapshot with {len(snapshot)} files")
             
             # Add or update project in database
             try:
@@ -354,15 +570,18 @@ Issue with LLM function call: {e}
                     description=project_description,
                     repo_url=repo.html_url,
                     additional_metadata={
-                        "commit_sha": commit.sha,
+                        "commit_sha": commit_sha,
                         "commit_message": commit_message,
                         "branch": branch_name,
+                        "push_backend": push_backend,
                         "files_count": len(files_to_commit),
                         "file_snapshot": file_snapshot,
                         "snapshot_created_at": datetime.now().isoformat()
                     }
                 )
                 logger.info(f"Added project to database with UUID: {project_uuid}")
+                self.snapshot_history.record(project_uuid, snapshot, "commit", commit_sha=commit_sha,
+                                             branch=branch_name, summary=commit_message.splitlines()[0])
             except Exception as db_error:
                 logger.warning(f"Failed to add project to database: {db_error}")
             
@@ -371,7 +590,7 @@ Issue with LLM function call: {e}
                 "message": f"Successfully committed {len(files_to_commit)} files",
                 "repo_url": repo.html_url,
                 "repo_name": repo.name,
-                "commit_sha": commit.sha,
+                "commit_sha": commit_sha,
                 "project_uuid": project_uuid if 'project_uuid' in locals() else None
             }
             
@@ -382,10 +601,25 @@ Issue with LLM function call: {e}
     @kernel_function(
             description="Update an existing project with AI-generated changes. Analyzes the project, generates intelligent file updates based on user requirements, creates a feature branch, and submits a pull request. Use this when the user wants to modify, enhance, or add features to an existing project."
     )
-    async def update_project_ai(self, repo_name: str, user_query: str) -> str:
+    @timed("update_project_ai")
+    def update_project_ai(self, repo_name: str, user_query: str) -> str:
         """
         LLM-callable function to update a project with AI assistance.
         
+        Args:
+            repo_name: Name of the GitHub repository to update
+            user_query: Description of what changes to make
+            
+        Returns:
+            Formatted string with update results including PR URL
+        """
+        return self.run_project_update(repo_name, user_query)
+    
+    def run_project_update(self, repo_name: str, user_query: str) -> str:
+        """
+        Looks up a tracked project, updates it and formats the result for the LLM.
+        Shared by update_project_ai and the background job queue.
+        
         Args:
             repo_name: Name of the GitHub repository to update
             user_query: Description of what changes to make
@@ -460,8 +694,48 @@ The branch was created but the PR failed. You may need to create the PR manually
             logger.error(error_msg)
             return error_msg
     
+    @kernel_function(
+            description="Apply the same update to many projects at once: one feature branch and pull request per project, several projects in parallel. selector is 'all', comma-separated repository names or globs (e.g. 'api-*,web-app'), or 'search:<query>'. Returns every PR URL and every failure."
+    )
+    @timed("batch_update_projects")
+    def batch_update_projects(self, user_query: str, selector: str = "all", max_parallel: int = 0) -> str:
+        """
+        LLM-callable function to update several projects with one request.
+        
+        Args:
+            user_query: Description of what changes to make in each project
+            selector: Projects to update: all, names/globs, or search:<query>
+            max_parallel: Projects updated at once (0 = DARTINBOT_BATCH_CONCURRENCY)
+            
+        Returns:
+            Formatted report with a PR URL per project and the failures
+        """
+        return self.run_batch_update(user_query, selector, max_parallel)
+    
+    def run_batch_update(self, user_query: str, selector: str = "all", max_parallel: int = 0) -> str:
+        """
+        Updates every selected project and formats the aggregated report for the LLM.
+        Shared by batch_update_projects and the background job queue.
+        
+        Args:
+            user_query: Description of what changes to make in each project
+            selector: Projects to update: all, names/globs, or search:<query>
+            max_parallel: Projects updated at once (0 = DARTINBOT_BATCH_CONCURRENCY)
+            
+        Returns:
+            Formatted report with a PR URL per project and the failures
+        """
+        logger = self.logger
+        logger.info(f"Batch update of '{selector}': {user_query}")
+        report = BatchUpdater(self.update_project, self.project_db, max_parallel or None,
+                              warm_fn=self.warm_update_prompt).run(user_query, selector)
+        logger.info(f"Batch update finished: {len(report['succeeded'])} succeeded, "
+                    f"{len(report['partial'])} partial, {len(report['failed'])} failed")
+        return format_report(report)
+    
+    @traced("update_project")
     def update_project(self, project_root_path: str, repo_name: str, 
-                      user_query: str, commit_message: str = None):
+                      user_query: str, commit_message: str = None, share_prompt_prefix: bool = False):
         """
         Updates an existing project based on user requirements.
         Uses Claude AI to generate updated files, then commits to GitHub.
@@ -471,6 +745,8 @@ The branch was created but the PR failed. You may need to create the PR manually
             repo_name: Name of the existing GitHub repository
             user_query: User's description of what changes to make
             commit_message: Optional custom commit message (auto-generated if None)
+            share_prompt_prefix: Send the update instructions as a cached prompt
+                prefix (batch updates send the same prefix for every project)
             
         Returns:
             dict with status and repository URL, or error message
@@ -493,8 +769,7 @@ The branch was created but the PR failed. You may need to create the PR manually
         
         # Get the existing repository
         try:
-            user = self.gh_client.get_user()
-            repo = user.get_repo(repo_name)
+            repo = self.repo_cache.get_repo(repo_name)
             logger.info(f"Found repository: {repo.name}")
         except Exception as e:
             error_msg = f"Repository '{repo_name}' not found: {e}"
@@ -521,67 +796,49 @@ The branch was created but the PR failed. You may need to create the PR manually
         
         logger.info(f"Read {len(project_files)} existing files")
         
-        # Build prompt for Claude to generate updates
-        update_prompt = f"""You are an expert software engineer. The user wants to update an existing project.
+        # With a local mirror the recent history costs no API calls, so give it to Claude as context
+        recent_history = ""
+        mirror = self.change_detector.mirror
+        if mirror is not None and mirror.sync(repo_name):
+            try:
+                recent_history = "\n".join(
+                    f"- {c['sha'][:7]} {(c['message'].splitlines() or [''])[0]}"
+                    for c in mirror.log(repo_name, "HEAD", 5)
+                )
+            except GitError as e:
+                logger.warning(f"Could not read history from mirror: {e}")
+        recent_section = f"\nRECENT COMMITS (newest first):\n{recent_history}\n" if recent_history else ""
+        
+        # Build prompt for Claude to generate updates. The instructions are the
+        # same for every update, so a batch sends them as a cached prefix and
+        # only the request and the project part vary
+        update_instructions = self._update_instructions()
+        project_context = f"""USER REQUEST: {user_query}
 
 PROJECT LOCATION: {project_root_path}
 REPOSITORY: {repo_name}
 
-USER REQUEST: {user_query}
-
 EXISTING PROJECT FILES:
 {json.dumps(list(project_files.keys()), indent=2)}
-
-CRITICAL INSTRUCTIONS:
-1. Analyze the user's request carefully
-2. Determine which files need to be modified, added, or deleted
-3. Generate the complete updated file contents
-4. Return ONLY valid JSON in this exact format (NO markdown, NO code fences):
-
-{{
-  "changes": [
-    {{
-      "path": "relative/path/to/file",
-      "action": "modify|add|delete",
-      "content": "full file content here (empty string for delete)"
-    }}
-  ],
-  "summary": "Brief description of changes made"
-}}
-
-RULES:
-- Include COMPLETE file content, not snippets
-- Use proper file paths relative to project root
-- action must be: "modify", "add", or "delete"
-- For "delete" action, content must be empty string ""
-- Return ONLY JSON, no explanations outside JSON
-- Do NOT wrap JSON in markdown code fences
-"""
+{recent_section}"""
 
         # Call Claude to generate updates
         try:
             logger.info("Requesting updates from Claude AI...")
-            response = self.anthropic_client.messages.create(
-                model=self.anthropic_details.claude_sonnet_latest(),
-                max_tokens=64000,
-                stream=True,
-                messages=[{"role": "user", "content": update_prompt}]
-            )
-            
-            # Collect streaming response
-            full_text = ""
-            with response as stream:
-                for event in stream:
-                    if event.type == "content_block_delta":
-                        if hasattr(event.delta, "text"):
-                            full_text += event.delta.text
-            
-            # Extract JSON from response
-            json_start = full_text.find('{')
-            json_end = full_text.rfind('}') + 1
-            json_str = full_text[json_start:json_end]
+            if share_prompt_prefix:
+                full_text = self._stream_text(project_context, cache_prefix=update_instructions)
+            else:
+                full_text = self._stream_text(update_instructions + "\n" + project_context)
             
-            update_data = json.loads(json_str)
+            # Parse and validate JSON, re-asking only for malformed changes
+            update_data = parse_model_output(
+                full_text,
+                UPDATE,
+                repair_fn=lambda repair_prompt: self._stream_text(
+                    f"REPOSITORY: {repo_name}\nUSER REQUEST: {user_query}\n\n{repair_prompt}", task="repair"
+                ),
+                logger=logger
+            )
             logger.info(f"Claude generated {len(update_data['changes'])} file changes")
             logger.info(f"Summary: {update_data['summary']}")
             
@@ -591,6 +848,7 @@ RULES:
             return {"status": "error", "message": error_msg}
         
         # Apply changes to local files
+        check_cancelled("applying changes")
         files_modified = []
         files_added = []
         files_deleted = []
@@ -610,9 +868,8 @@ RULES:
                     # Create directory if needed
                     os.makedirs(os.path.dirname(file_path), exist_ok=True)
                     
-                    # Write file content
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(change['content'])
+                    # Write file content through the blob store (replaces, never edits a shared link in place)
+                    self.blob_store.write(file_path, change['content'])
                     
                     if action == "modify":
                         files_modified.append(change['path'])
@@ -622,6 +879,8 @@ RULES:
                         logger.info(f"Added: {change['path']}")
             
             logger.info(f"Applied changes locally: {len(files_modified)} modified, {len(files_added)} added, {len(files_deleted)} deleted")
+            emit("files_written", project=repo_name, count=len(files_modified) + len(files_added),
+                 deleted=len(files_deleted))
             
         except Exception as e:
             error_msg = f"Failed to apply changes locally: {e}"
@@ -647,35 +906,34 @@ RULES:
                 except Exception as e:
                     logger.warning(f"Could not read file {relative_path}: {e}")
         
+        push_backend = self._push_backend(repo_name)
+        check_cancelled("committing")
+        
         # Create tree elements
         tree_elements = []
-        for file_info in files_to_commit:
-            element = InputGitTreeElement(
-                path=file_info['path'],
-                mode='100644',
-                type='blob',
-                content=file_info['content']
-            )
-            tree_elements.append(element)
+        if push_backend == "api":
+            for file_info in files_to_commit:
+                element = InputGitTreeElement(
+                    path=file_info['path'],
+                    mode='100644',
+                    type='blob',
+                    content=file_info['content']
+                )
+                tree_elements.append(element)
         
-        logger.info(f"Prepared {len(tree_elements)} files for commit")
+        logger.info(f"Prepared {len(files_to_commit)} files for commit")
         
-        # Get base branch (main or master) and parent commit
+        # Get base (default) branch and parent commit; git push fetches the parent itself
         try:
-            base_ref = repo.get_git_ref("heads/main")
-            parent_commit = repo.get_git_commit(base_ref.object.sha)
-            base_tree = parent_commit.tree
-            base_branch = "main"
-        except:
-            try:
-                base_ref = repo.get_git_ref("heads/master")
-                parent_commit = repo.get_git_commit(base_ref.object.sha)
+            if push_backend == "git":
+                base_branch = self.repo_cache.default_branch(repo_name)
+            else:
+                base_branch, base_ref, parent_commit = self.repo_cache.head(repo_name)
                 base_tree = parent_commit.tree
-                base_branch = "master"
-            except Exception as e:
-                error_msg = f"Could not find main or master branch: {e}"
-                logger.error(error_msg)
-                return {"status": "error", "message": error_msg}
+        except Exception as e:
+            error_msg = f"Could not find default branch: {e}"
+            logger.error(error_msg)
+            return {"status": "error", "message": error_msg}
         
         # Create feature branch name from summary
         import re
@@ -689,8 +947,6 @@ RULES:
         
         # Create tree and commit
         try:
-            tree = repo.create_git_tree(tree_elements, base_tree)
-            
             # Generate commit message if not provided
             if not commit_message:
                 commit_message = f"Update: {update_data['summary']}\n\nChanges:\n"
@@ -707,25 +963,57 @@ RULES:
                 if files_deleted:
                     commit_message += f"- Deleted: {', '.join(files_deleted)}\n"
             
-            # Create commit
-            commit = repo.create_git_commit(
-                message=commit_message,
-                tree=tree,
-                parents=[parent_commit]
-            )
-            
-            logger.info(f"Created commit: {commit.sha}")
-            
-            # Create feature branch reference
-            try:
-                feature_ref = repo.create_git_ref(f"refs/heads/{feature_branch_name}", commit.sha)
-                logger.info(f"Created feature branch: {feature_branch_name}")
-            except Exception as e:
-                error_msg = f"Failed to create feature branch: {e}"
-                logger.error(error_msg)
-                return {"status": "error", "message": error_msg}
+            if push_backend == "git":
+                # One local commit and a push that creates the feature branch
+                try:
+                    pushed = self.git_push.commit(
+                        project_root_path, repo_name, [f['path'] for f in files_to_commit], commit_message,
+                        branch=feature_branch_name, base_branch=base_branch, removed_paths=files_deleted
+                    )
+                    commit_sha = pushed['sha']
+                    logger.info(f"Pushed commit {commit_sha} to feature branch: {feature_branch_name}")
+                    emit("commit_created", repo=repo_name, branch=feature_branch_name, sha=commit_sha)
+                except GitError as e:
+                    error_msg = f"Failed to push feature branch: {e}"
+                    logger.error(error_msg)
+                    return {"status": "error", "message": error_msg}
+            else:
+                if files_deleted:
+                    # A null sha removes the path from base_tree, as the git backend's removed_paths does.
+                    # GitHub rejects deleting a path the tree lacks, so only files it has are listed
+                    remote_paths = {e.path for e in github_call(
+                        "get_git_tree", repo.get_git_tree, base_tree.sha, recursive=True).tree}
+                    tree_elements.extend(
+                        InputGitTreeElement(path=path.replace(os.sep, '/'), mode='100644', type='blob', sha=None)
+                        for path in files_deleted if path.replace(os.sep, '/') in remote_paths
+                    )
+                tree = github_call("create_git_tree", repo.create_git_tree, tree_elements, base_tree)
+                emit("tree_created", repo=repo_name, sha=tree.sha, files=len(tree_elements))
+                
+                # Create commit
+                commit = github_call("create_git_commit", repo.create_git_commit,
+                    message=commit_message,
+                    tree=tree,
+                    parents=[parent_commit]
+                )
+                commit_sha = commit.sha
+                
+                logger.info(f"Created commit: {commit_sha}")
+                
+                # Create feature branch reference
+                try:
+                    feature_ref = github_call("create_git_ref", repo.create_git_ref, f"refs/heads/{feature_branch_name}", commit_sha)
+                    logger.info(f"Created feature branch: {feature_branch_name}")
+                    emit("commit_created", repo=repo_name, branch=feature_branch_name, sha=commit_sha)
+                except Exception as e:
+                    error_msg = f"Failed to create feature branch: {e}"
+                    logger.error(error_msg)
+                    return {"status": "error", "message": error_msg}
+            if self.change_detector.mirror is not None:
+                self.change_detector.mirror.mark_stale(repo_name)
             
             # Create pull request
+            check_cancelled("opening the pull request")
             try:
                 pr_title = f"Update: {update_data['summary']}"
                 pr_body = f"""## Changes
@@ -758,9 +1046,9 @@ RULES:
                     for f in files_deleted:
                         pr_body += f"- `{f}`\n"
                 
-                pr_body += f"\n---\n*Generated by AI-powered project updater*\n*Commit: {commit.sha[:7]}*"
+                pr_body += f"\n---\n*Generated by AI-powered project updater*\n*Commit: {commit_sha[:7]}*"
                 
-                pull_request = repo.create_pull(
+                pull_request = github_call("create_pull", repo.create_pull,
                     title=pr_title,
                     body=pr_body,
                     head=feature_branch_name,
@@ -768,38 +1056,40 @@ RULES:
                 )
                 
                 logger.info(f"Created pull request: {pull_request.html_url}")
+                emit("pr_opened", repo=repo_name, number=pull_request.number, url=pull_request.html_url)
                 
                 # Create updated file snapshot
-                file_snapshot = self.change_detector.scan_local_files(project_root_path)
-                logger.info(f"Created updated file snapshot with {len(file_snapshot)} files")
+                snapshot = Snapshot.from_files(self.change_detector.scan_local_files(project_root_path))
+                logger.info(f"Created updated file snapshot with {len(snapshot)} files")
                 
                 # Update project in database
                 try:
                     project = self.project_db.get_project_by_repo(repo_name)
                     if project:
-                        self.project_db.update_project(
+                        self.project_db.update_metadata(
                             project['uuid'],
-                            {
-                                "metadata": {
-                                    **project.get('metadata', {}),
-                                    "last_update": {
-                                        "commit_sha": commit.sha,
-                                        "pr_number": pull_request.number,
-                                        "pr_url": pull_request.html_url,
-                                        "feature_branch": feature_branch_name,
-                                        "summary": update_data['summary'],
-                                        "changes": {
-                                            "modified": len(files_modified),
-                                            "added": len(files_added),
-                                            "deleted": len(files_deleted)
-                                        }
-                                    },
-                                    "file_snapshot": file_snapshot,
-                                    "snapshot_updated_at": datetime.now().isoformat()
-                                }
+                            lambda metadata: {
+                                "last_update": {
+                                    "commit_sha": commit_sha,
+                                    "pr_number": pull_request.number,
+                                    "pr_url": pull_request.html_url,
+                                    "feature_branch": feature_branch_name,
+                                    "summary": update_data['summary'],
+                                    "changes": {
+                                        "modified": len(files_modified),
+                                        "added": len(files_added),
+                                        "deleted": len(files_deleted)
+                                    }
+                                },
+                                # Stored as a delta on the previous snapshot
+                                "file_snapshot": store_snapshot(metadata.get('file_snapshot'), snapshot),
+                                "snapshot_updated_at": datetime.now().isoformat()
                             }
                         )
                         logger.info(f"Updated project in database: {project['uuid']}")
+                        self.snapshot_history.record(
+                            project['uuid'], snapshot, "update", commit_sha=commit_sha, branch=feature_branch_name,
+                            pr_number=pull_request.number, pr_url=pull_request.html_url, summary=update_data['summary'])
                 except Exception as db_error:
                     logger.warning(f"Failed to update project in database: {db_error}")
                 
@@ -808,7 +1098,7 @@ RULES:
                     "message": update_data['summary'],
                     "repo_url": repo.html_url,
                     "repo_name": repo.name,
-                    "commit_sha": commit.sha,
+                    "commit_sha": commit_sha,
                     "feature_branch": feature_branch_name,
                     "base_branch": base_branch,
                     "pr_number": pull_request.number,
@@ -830,7 +1120,7 @@ RULES:
                     "message": f"Branch created but PR failed: {e}",
                     "repo_url": repo.html_url,
                     "repo_name": repo.name,
-                    "commit_sha": commit.sha,
+                    "commit_sha": commit_sha,
                     "feature_branch": feature_branch_name,
                     "base_branch": base_branch,
                     "changes": {
@@ -848,7 +1138,7 @@ RULES:
     @kernel_function(
             description="Delete a project locally and/or from GitHub. Can delete just local files, just the GitHub repository, or both. Use when user wants to remove or clean up a project."
     )
-    async def delete_project_ai(self, repo_name: str, delete_local: bool = True, delete_remote: bool = True) -> str:
+    def delete_project_ai(self, repo_name: str, delete_local: bool = True, delete_remote: bool = True) -> str:
         """
         LLM-callable function to delete a project.
         
@@ -961,10 +1251,12 @@ RULES:
         # Delete GitHub repository
         if delete_remote:
             try:
-                user = self.gh_client.get_user()
-                repo = user.get_repo(repo_name)
+                repo = self.repo_cache.get_repo(repo_name)
                 repo_url = repo.html_url
-                repo.delete()
+                github_call("delete_repo", repo.delete)
+                self.repo_cache.invalidate(repo_name)
+                if self.change_detector.mirror is not None:
+                    self.change_detector.mirror.remove(repo_name)
                 logger.info(f"Deleted GitHub repository: {repo_name}")
                 results["remote_deleted"] = True
                 results["messages"].append(f"GitHub repository deleted: {repo_url}")
@@ -984,6 +1276,7 @@ RULES:
                 if delete_local and delete_remote:
                     # Hard delete if both local and remote are deleted
                     self.project_db.hard_delete_project(project['uuid'])
+                    self.snapshot_history.delete(project['uuid'])
                     logger.info(f"Removed project from database: {project['uuid']}")
                     results["messages"].append("Project removed from database")
                 else:
@@ -995,6 +1288,18 @@ RULES:
             logger.warning(f"Failed to update project in database: {db_error}")
             results["messages"].append(f"Warning: Failed to update database: {db_error}")
         
+        # Drop blobs no remaining snapshot or history refers to
+        if results["local_deleted"]:
+            try:
+                referenced = self.snapshot_history.referenced_hashes()
+                for other in self.project_db.list_all_projects():
+                    referenced |= stored_hashes(other.get('metadata', {}).get('file_snapshot'))
+                removed = self.blob_store.collect_garbage(referenced)
+                if removed:
+                    logger.info(f"Removed {removed} unreferenced blobs")
+            except Exception as e:
+                logger.warning(f"Failed to collect unreferenced blobs: {e}")
+        
         # Set final status
         if not results["local_deleted"] and not results["remote_deleted"]:
             results["status"] = "error"
@@ -0,0 +1,240 @@
+"""
+Template Library - Versioned base templates for common project stacks
+Boilerplate (Dockerfile, .gitignore, CI, setup files, README skeleton) comes from disk; Claude only writes the project-specific files
+"""
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from lib.metrics import get_registry
+
+# Templates shipped with the bot; DARTINBOT_TEMPLATE_DIR adds or overrides templates by name
+BUILTIN_TEMPLATE_DIR = Path(__file__).parent / "templates"
+TEMPLATE_PROMPT_FILE = Path(__file__).parent / "prompts" / "templatePrompt.md"
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([a-z_][a-z0-9_]*)\s*\}\}")
+_WORD = re.compile(r"[a-z0-9][a-z0-9+#.\-]*")
+
+SCAFFOLD_TEMPLATE_USES = get_registry().counter(
+    "dartinbot_scaffold_template_total", "Scaffolds generated from a base template, by template")
+
+
+class Template:
+    """
+    One base template: a manifest (template.json) plus a files/ tree
+
+    Manifest fields:
+        name, version, description: Identity shown to the model and recorded on the scaffold
+        keywords: Words in a request that select this template
+        exclude: Words that rule it out (e.g. "native" for React)
+        params: Parameter name -> {"description", "default"}; files use {{name}} placeholders
+        folders: Extra empty folders to create
+    """
+
+    def __init__(self, root: Path):
+        """
+        Load a template from its directory
+
+        Args:
+            root: Directory holding template.json and files/
+        """
+        with open(root / "template.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.root = root
+        self.name = manifest["name"]
+        self.version = str(manifest["version"])
+        self.description = manifest.get("description", "")
+        self.keywords = [k.lower() for k in manifest.get("keywords", [])]
+        self.exclude = [k.lower() for k in manifest.get("exclude", [])]
+        self.params: Dict[str, Dict] = manifest.get("params", {})
+        self.folders: List[str] = manifest.get("folders", [])
+        self.files: Dict[str, str] = {}
+        files_root = root / "files"
+        for path in sorted(files_root.rglob("*")):
+            # Skip bytecode compiled from template sources (e.g. by compileall)
+            if path.is_file() and "__pycache__" not in path.parts:
+                self.files[path.relative_to(files_root).as_posix()] = path.read_text(encoding="utf-8")
+
+    @property
+    def ref(self) -> str:
+        """name@version, recorded on scaffolds built from this template"""
+        return f"{self.name}@{self.version}"
+
+    def score(self, words: set) -> int:
+        """Number of keywords in the request, 0 if an excluded word appears"""
+        if any(word in words for word in self.exclude):
+            return 0
+        return sum(1 for keyword in self.keywords if keyword in words)
+
+    def render(self, params: Dict[str, str]) -> Dict:
+        """
+        Fill the template's parameters
+
+        Only declared parameters are substituted, so other brace syntax
+        (GitHub Actions expressions, JSX) passes through untouched.
+
+        Args:
+            params: Parameter values; missing ones use the manifest default
+
+        Returns:
+            Dict with folders and files, in the scaffold "structure" shape
+        """
+        values = {name: spec.get("default", "") for name, spec in self.params.items()}
+        values.update({k: str(v) for k, v in (params or {}).items() if k in values and v is not None})
+
+        def fill(text: str) -> str:
+            return _PLACEHOLDER.sub(lambda m: values[m.group(1)] if m.group(1) in values else m.group(0), text)
+
+        files = {fill(path): fill(content) for path, content in self.files.items()}
+        folders = list(self.folders)
+        for path in files:
+            parent = os.path.dirname(path)
+            if parent and parent not in folders:
+                folders.append(parent)
+        return {"folders": folders, "files": files}
+
+
+class TemplateLibrary:
+    """
+    Picks a base template for a scaffold request and merges it with the model's files
+    """
+
+    def __init__(self, template_dirs: List[str] = None):
+        """
+        Initialize the library
+
+        Args:
+            template_dirs: Directories of templates, later ones overriding earlier ones by name
+                (default: the built-in templates, then DARTINBOT_TEMPLATE_DIR)
+        """
+        if template_dirs is None:
+            template_dirs = [BUILTIN_TEMPLATE_DIR]
+            if os.getenv("DARTINBOT_TEMPLATE_DIR"):
+                template_dirs.append(os.getenv("DARTINBOT_TEMPLATE_DIR"))
+        self.template_dirs = [Path(d) for d in template_dirs]
+        self._templates: Optional[Dict[str, Template]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def templates(self) -> Dict[str, Template]:
+        """Templates by name, loaded on first use"""
+        if self._templates is None:
+            with self._lock:
+                if self._templates is None:
+                    templates = {}
+                    for template_dir in self.template_dirs:
+                        if not template_dir.is_dir():
+                            continue
+                        for root in sorted(template_dir.iterdir()):
+                            if not (root / "template.json").is_file():
+                                continue
+                            try:
+                                template = Template(root)
+                                templates[template.name] = template
+                            except Exception as e:
+                                print(f"Error loading template {root}: {e}")
+                    self._templates = templates
+        return self._templates
+
+    def match(self, query: str) -> Optional[Template]:
+        """
+        Base template for a request, or None to let the model write everything
+
+        The template with the most keywords in the request wins. A tie (e.g.
+        "FastAPI backend with a React frontend") returns None: one base
+        template would only cover half of such a project.
+
+        Args:
+            query: The user's project request
+
+        Returns:
+            The matching template or None
+        """
+        # "next.js" and "c++" keep their inner punctuation; a sentence's final "." does not count
+        words = {word.rstrip(".-") for word in _WORD.findall(query.lower())}
+        scored = sorted(((t.score(words), t) for t in self.templates.values()),
+                        key=lambda pair: pair[0], reverse=True)
+        if not scored or scored[0][0] == 0:
+            return None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None
+        return scored[0][1]
+
+    def build_prompt(self, template: Template, user_query: str) -> str:
+        """
+        Prompt asking only for parameters and project-specific files
+
+        Args:
+            template: The matched template
+            user_query: The user's project request
+
+        Returns:
+            Prompt text
+        """
+        with open(TEMPLATE_PROMPT_FILE, "r", encoding="utf-8") as f:
+            prompt = f.read()
+        params = "\n".join(
+            f"- {name}: {spec.get('description', '')} (default: {json.dumps(spec.get('default', ''))})"
+            for name, spec in template.params.items()
+        )
+        provided = "\n".join(f"- {path}" for path in template.files)
+        return prompt.format(
+            user_query=user_query,
+            template=template.ref,
+            template_description=template.description,
+            provided_files=provided,
+            params=params or "- (none)",
+        )
+
+    @staticmethod
+    def merge(template: Template, scaffold: Dict) -> Dict:
+        """
+        Merge the model's scaffold onto the rendered template
+
+        project_name and description are template parameters as well. Files
+        the model returned replace the template's file at the same path.
+
+        Args:
+            template: The matched template
+            scaffold: Validated scaffold document from the model, with optional "params"
+
+        Returns:
+            The scaffold with the template's folders and files merged into "structure"
+        """
+        # params comes from the model; anything but an object is ignored
+        params = scaffold.get("params")
+        params = dict(params) if isinstance(params, dict) else {}
+        params.setdefault("project_name", scaffold["project_name"])
+        params.setdefault("description", scaffold["description"])
+        base = template.render(params)
+
+        structure = scaffold["structure"]
+        folders = base["folders"] + [f for f in structure.get("folders", []) if f not in base["folders"]]
+        files = {**base["files"], **structure["files"]}
+        scaffold["structure"] = {"folders": folders, "files": files}
+        scaffold["template"] = template.ref
+        SCAFFOLD_TEMPLATE_USES.inc(template=template.name)
+        return scaffold
+
+
+# Global instance for easy access
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_template_library() -> TemplateLibrary:
+    """Get the global template library"""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = TemplateLibrary()
+    return _library
+
+
+def templates_enabled() -> bool:
+    """Whether scaffolds may start from a base template (DARTINBOT_TEMPLATES, default 1)"""
+    return os.getenv("DARTINBOT_TEMPLATES", "1").lower() not in ("0", "false", "no")